@@ -0,0 +1,8 @@
+"""
+Benchmarks for echopype conversion and processing.
+
+The benchmarks follow the conventions of `airspeed velocity <https://asv.readthedocs.io>`_
+and run on synthetic files written by ``benchmarks/synthetic.py``, so that no sample data
+have to be downloaded. Run them across commits with ``asv run`` from the repository root,
+or once against the working tree with ``python -m benchmarks``.
+"""
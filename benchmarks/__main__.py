@@ -0,0 +1,68 @@
+"""
+Run each benchmark once against the working tree without asv::
+
+    python -m benchmarks [name_filter]
+
+Times are reported in seconds, peak memory as the peak of traced allocations in MB,
+and tracked values in their units.
+"""
+
+import os
+import sys
+import time
+import inspect
+import tempfile
+import tracemalloc
+from . import bench_convert, bench_process
+
+
+def run_benchmark(cls, name_filter=''):
+    methods = [name for name, _ in inspect.getmembers(cls, inspect.isfunction)
+               if name.startswith(('time_', 'peakmem_', 'track_')) and name_filter in f'{cls.__name__}.{name}']
+    if not methods:
+        return
+    bench = cls()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            cache = bench.setup_cache()
+            for name in methods:
+                bench.setup(cache)
+                func = getattr(bench, name)
+                try:
+                    result, unit = measure(name, func, cache)
+                    print(f'{cls.__name__}.{name:<30} {result:10.3f} {unit}')
+                except Exception as err:
+                    print(f'{cls.__name__}.{name:<30} failed: {err!r}')
+                if hasattr(bench, 'teardown'):
+                    bench.teardown(cache)
+        finally:
+            os.chdir(cwd)
+
+
+def measure(name, func, cache):
+    if name.startswith('time_'):
+        start = time.perf_counter()
+        func(cache)
+        return time.perf_counter() - start, 's'
+    elif name.startswith('peakmem_'):
+        tracemalloc.start()
+        try:
+            func(cache)
+            return tracemalloc.get_traced_memory()[1] / 1e6, 'MB'
+        finally:
+            tracemalloc.stop()
+    else:
+        return func(cache), func.unit
+
+
+def main(name_filter=''):
+    for module in (bench_convert, bench_process):
+        for name, cls in inspect.getmembers(module, inspect.isclass):
+            if not name.startswith('_') and cls.__module__ == module.__name__:
+                run_benchmark(cls, name_filter)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2])
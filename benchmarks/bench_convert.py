@@ -0,0 +1,96 @@
+"""
+Benchmarks for converting raw files to .nc and .zarr.
+"""
+
+import os
+import time
+import shutil
+import tempfile
+from echopype.convert import Convert
+from . import synthetic
+
+
+class _ConvertBenchmark:
+    """Time conversion and track its throughput in MB/s and pings/s."""
+    timeout = 600
+    model = 'EK60'
+    n_pings = 1000
+
+    def write(self):
+        raise NotImplementedError
+
+    def setup_cache(self):
+        raw_path, xml_path = self.write()
+        return raw_path, xml_path, os.path.getsize(raw_path)
+
+    def setup(self, cache):
+        self.raw_path, self.xml_path, self.file_size = cache
+        self.save_path = tempfile.mkdtemp()
+
+    def teardown(self, cache):
+        shutil.rmtree(self.save_path, ignore_errors=True)
+
+    def convert(self, file_format):
+        tmp = Convert(self.raw_path, self.xml_path, model=self.model)
+        getattr(tmp, 'raw2' + file_format)(save_path=self.save_path, overwrite=True)
+
+    def elapsed(self, file_format):
+        start = time.perf_counter()
+        self.convert(file_format)
+        return time.perf_counter() - start
+
+    def time_raw2nc(self, cache):
+        self.convert('nc')
+
+    def time_raw2zarr(self, cache):
+        self.convert('zarr')
+
+    def peakmem_raw2nc(self, cache):
+        self.convert('nc')
+
+    def track_raw2nc_MB_per_s(self, cache):
+        return self.file_size / 1e6 / self.elapsed('nc')
+    track_raw2nc_MB_per_s.unit = 'MB/s'
+
+    def track_raw2nc_pings_per_s(self, cache):
+        return self.n_pings / self.elapsed('nc')
+    track_raw2nc_pings_per_s.unit = 'pings/s'
+
+
+class ConvertEK60(_ConvertBenchmark):
+    model = 'EK60'
+
+    def write(self):
+        raw_path = os.path.abspath(synthetic.raw_filename('ek60'))
+        synthetic.write_ek60_raw(raw_path, n_pings=self.n_pings, n_channels=3, n_range_bins=2000)
+        return raw_path, ''
+
+
+class ConvertEK60RangeChange(_ConvertBenchmark):
+    """EK60 file with channels of different lengths and a change of range in the middle."""
+    model = 'EK60'
+
+    def write(self):
+        raw_path = os.path.abspath(synthetic.raw_filename('ek60_range'))
+        synthetic.write_ek60_raw(raw_path, n_pings=self.n_pings, n_channels=3, n_range_bins=[2000, 1500, 1000],
+                                 range_bin_change=(self.n_pings // 2, 1200))
+        return raw_path, ''
+
+
+class ConvertEK80(_ConvertBenchmark):
+    model = 'EK80'
+    n_pings = 200
+
+    def write(self):
+        raw_path = os.path.abspath(synthetic.raw_filename('ek80'))
+        synthetic.write_ek80_raw(raw_path, n_pings=self.n_pings, n_channels=3, n_cw_channels=1, n_range_bins=2000)
+        return raw_path, ''
+
+
+class ConvertAZFP(_ConvertBenchmark):
+    model = 'AZFP'
+
+    def write(self):
+        raw_path = os.path.abspath('18021116.01A')
+        synthetic.write_azfp_01A(raw_path, n_pings=self.n_pings, n_channels=4, n_range_bins=1000)
+        return raw_path, raw_path[:-4] + '.XML'
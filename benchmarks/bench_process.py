@@ -0,0 +1,99 @@
+"""
+Benchmarks for calibration, noise removal, MVBS and EK80 pulse compression.
+"""
+
+import os
+import time
+from echopype.convert import Convert
+from echopype.process import Process
+from . import synthetic
+
+
+class _ProcessBenchmark:
+    """Time the processing steps of a converted file and track calibration throughput in pings/s."""
+    timeout = 600
+    n_pings = 1000
+    noise_est_range_bin_size = 5
+    noise_est_ping_size = 20
+    MVBS_range_bin_size = 5
+    MVBS_ping_size = 20
+
+    def convert(self):
+        raise NotImplementedError
+
+    def setup_cache(self):
+        nc_path = self.convert()
+        # Saved Sv is the source of remove_noise and get_MVBS
+        Process(nc_path).calibrate(save=True)
+        return nc_path
+
+    def setup(self, nc_path):
+        self.process = Process(nc_path)
+
+    def teardown(self, nc_path):
+        self.process.close()
+
+    def time_calibrate(self, nc_path):
+        self.process.calibrate()
+
+    def peakmem_calibrate(self, nc_path):
+        self.process.calibrate()
+
+    def time_get_MVBS(self, nc_path):
+        self.process.get_MVBS(MVBS_range_bin_size=self.MVBS_range_bin_size, MVBS_ping_size=self.MVBS_ping_size)
+
+    def track_calibrate_pings_per_s(self, nc_path):
+        start = time.perf_counter()
+        self.process.calibrate()
+        return self.n_pings / (time.perf_counter() - start)
+    track_calibrate_pings_per_s.unit = 'pings/s'
+
+
+class _RemoveNoiseBenchmark(_ProcessBenchmark):
+
+    def time_remove_noise(self, nc_path):
+        self.process.remove_noise(noise_est_range_bin_size=self.noise_est_range_bin_size,
+                                  noise_est_ping_size=self.noise_est_ping_size)
+
+
+class ProcessEK60(_RemoveNoiseBenchmark):
+
+    def convert(self):
+        raw_path = os.path.abspath(synthetic.raw_filename('ek60'))
+        synthetic.write_ek60_raw(raw_path, n_pings=self.n_pings, n_channels=3, n_range_bins=2000)
+        tmp = Convert(raw_path)
+        tmp.raw2nc()
+        return tmp.nc_path
+
+
+class ProcessEK80(_ProcessBenchmark):
+    # remove_noise is not timed since the pulse compressed broadband Sv
+    # has more range_bin than the range calculated from the raw data
+    n_pings = 200
+
+    def convert(self):
+        raw_path = os.path.abspath(synthetic.raw_filename('ek80'))
+        synthetic.write_ek80_raw(raw_path, n_pings=self.n_pings, n_channels=3, n_range_bins=2000)
+        tmp = Convert(raw_path, model='EK80')
+        tmp.raw2nc()
+        return tmp.nc_path
+
+    def setup(self, nc_path):
+        super().setup(nc_path)
+        self.process.calc_transmit_signal()
+
+    def time_pulse_compression(self, nc_path):
+        self.process.pulse_compression()
+
+    def peakmem_pulse_compression(self, nc_path):
+        self.process.pulse_compression()
+
+
+class ProcessAZFP(_RemoveNoiseBenchmark):
+
+    def convert(self):
+        raw_path = os.path.abspath('18021116.01A')
+        synthetic.write_azfp_01A(raw_path, n_pings=self.n_pings, n_channels=4, n_range_bins=1000)
+        tmp = Convert(raw_path, raw_path[:-4] + '.XML')
+        tmp.raw2nc()
+        return tmp.nc_path
@@ -0,0 +1,379 @@
+"""
+Synthetic echosounder data files for the benchmarks.
+
+EK60 and EK80 ``.raw`` files are written datagram by datagram with the ``to_string``
+methods of the parsers in ``echopype/convert/utils/ek_raw_parsers.py`` that echopype
+reads them with. AZFP ``.01A`` files are written with the structured ping layout
+of ``ConvertAZFP`` together with a matching ``.XML`` file.
+
+The size of the files is set by the number of pings, channels and range_bin.
+The number of range_bin can differ between channels and change in the middle of a file,
+as in files recorded with different ranges.
+"""
+
+import os
+import datetime
+import numpy as np
+from echopype.convert.azfp import ConvertAZFP
+from echopype.convert.utils.ek_date_conversion import unix_to_nt
+from echopype.convert.utils.ek_raw_parsers import (SimradConfigParser, SimradRawParser, SimradNMEAParser,
+                                                   SimradMRUParser, SimradXMLParser, SimradFILParser)
+
+START_TIME = datetime.datetime(2018, 2, 11, 16, 40, 25)
+EK60_FREQUENCIES = [18000, 38000, 70000, 120000, 200000, 333000]
+EK80_FREQUENCIES = [(18000, 16000, 20000), (38000, 34000, 45000), (70000, 55000, 90000),
+                    (120000, 95000, 160000), (200000, 160000, 260000), (333000, 283000, 383000)]
+AZFP_FREQUENCIES = [38, 125, 200, 455]   # [kHz]
+PULSE_LENGTH_TABLE = [0.000256, 0.000512, 0.001024, 0.002048, 0.004096]
+INDEX2POWER = 10 * np.log10(2) / 256
+EK80_RX_SAMPLE_FREQUENCY = 1.5e6   # [Hz]
+EK80_DECIMATION = (6, 2)           # WBT and PC filter decimation factors
+EK80_N_COMPLEX = 4                 # number of transducer quadrants
+
+
+def raw_filename(prefix, start_time=START_TIME):
+    """Return a ``.raw`` filename with the timestamp pattern echopype parses."""
+    return '%s-D%s-T%s.raw' % (prefix, start_time.strftime('%Y%m%d'), start_time.strftime('%H%M%S'))
+
+
+def get_range_bins(n_pings, n_channels, n_range_bins, range_bin_change=None):
+    """Return the number of range_bin of each ping and channel.
+
+    Parameters
+    ----------
+    n_pings : int
+        number of pings
+    n_channels : int
+        number of channels
+    n_range_bins : int or list of int
+        number of range_bin, the same for all channels or of each channel
+    range_bin_change : tuple, optional
+        ``(ping, n_range_bins)``: the number of range_bin changes to ``n_range_bins``
+        (int or list of int) from this ping on
+
+    Returns
+    -------
+    Array of int of shape ``(n_pings, n_channels)``
+    """
+    range_bins = np.empty((n_pings, n_channels), dtype=int)
+    range_bins[:] = np.broadcast_to(n_range_bins, n_channels)
+    if range_bin_change is not None:
+        ping, n_range_bins_new = range_bin_change
+        range_bins[ping:] = np.broadcast_to(n_range_bins_new, n_channels)
+    return range_bins
+
+
+def _nt_dates(timestamp):
+    low_date, high_date = unix_to_nt(timestamp)
+    return dict(low_date=low_date, high_date=high_date)
+
+
+def _nmea_gga(timestamp, ping):
+    """Return a GGA sentence with a valid checksum for a ship moving north-east."""
+    lat = 4730.0 + ping * 0.001
+    lon = 12215.0 + ping * 0.001
+    body = 'GPGGA,%s,%.4f,N,%.4f,W,1,10,1.0,0.0,M,0.0,M,,' % (timestamp.strftime('%H%M%S.%f')[:9], lat, lon)
+    checksum = 0
+    for c in body:
+        checksum ^= ord(c)
+    return '$%s*%02X' % (body, checksum)
+
+
+def _power_profile(rng, n_samples, n_pings=1):
+    """Return int16 power indices of a decaying echo profile with noise."""
+    power_db = -20 - 40 * np.log10(np.arange(1, n_samples + 1)) + rng.normal(0, 3, size=(n_pings, n_samples))
+    return np.round(power_db / INDEX2POWER).astype('int16')
+
+
+def write_ek60_raw(path, n_pings=100, n_channels=3, n_range_bins=1000, range_bin_change=None,
+                   ping_interval=1.0, start_time=START_TIME, seed=0):
+    """Write a synthetic EK60 ``.raw`` file of CON0, NME0 and RAW0 datagrams.
+
+    Parameters
+    ----------
+    path : str
+        path of the file to write, its name should contain the timestamp pattern of ``raw_filename``
+    n_pings : int
+        number of pings
+    n_channels : int
+        number of split-beam channels, at most ``len(EK60_FREQUENCIES)``
+    n_range_bins, range_bin_change
+        number of range_bin of each channel, see ``get_range_bins``
+    ping_interval : float
+        time between pings [s]
+    start_time : datetime.datetime
+        time of the first ping
+    seed : int
+        seed of the random echo data
+
+    Returns
+    -------
+    Size of the file in bytes
+    """
+    rng = np.random.default_rng(seed)
+    range_bins = get_range_bins(n_pings, n_channels, n_range_bins, range_bin_change)
+    config_parser, raw_parser, nmea_parser = SimradConfigParser(), SimradRawParser(), SimradNMEAParser()
+
+    transceivers = {}
+    for ch in range(n_channels):
+        transceivers[ch + 1] = dict(
+            channel_id=b'GPT %3d kHz 00907205a6d0 %d-1 ES%d-7C' % (EK60_FREQUENCIES[ch] // 1000, ch + 1,
+                                                                    EK60_FREQUENCIES[ch] // 1000),
+            beam_type=1, frequency=EK60_FREQUENCIES[ch], gain=26.5, equivalent_beam_angle=-20.7,
+            beamwidth_alongship=7.0, beamwidth_athwartship=7.0,
+            angle_sensitivity_alongship=21.9, angle_sensitivity_athwartship=21.9,
+            angle_offset_alongship=0.0, angle_offset_athwartship=0.0,
+            pos_x=0.0, pos_y=0.0, pos_z=0.0, dir_x=0.0, dir_y=0.0, dir_z=0.0,
+            pulse_length_table=PULSE_LENGTH_TABLE, spare1=b'',
+            gain_table=[26.5] * 5, spare2=b'', sa_correction_table=[-0.7] * 5, spare3=b'',
+            gpt_software_version=b'070413', spare4=b'')
+    config = dict(type=b'CON0', survey_name=b'synthetic', transect_name=b'', sounder_name=b'ER60',
+                  version=b'2.4.3', spare0=b'', transceiver_count=n_channels, transceivers=transceivers,
+                  **_nt_dates(start_time))
+
+    with open(path, 'wb') as fid:
+        fid.write(config_parser.to_string(config))
+        for ping in range(n_pings):
+            timestamp = start_time + datetime.timedelta(seconds=ping * ping_interval)
+            dates = _nt_dates(timestamp)
+            fid.write(nmea_parser.to_string(dict(type=b'NME0', nmea_string=_nmea_gga(timestamp, ping), **dates)))
+            for ch in range(n_channels):
+                count = range_bins[ping, ch]
+                angle = rng.integers(-10, 10, size=(count, 2), dtype='int8')
+                fid.write(raw_parser.to_string(dict(
+                    type=b'RAW0', channel=ch + 1, mode=3, transducer_depth=9.15,
+                    frequency=EK60_FREQUENCIES[ch], transmit_power=1000.0, pulse_length=0.001024,
+                    bandwidth=2425.0, sample_interval=0.000256, sound_velocity=1493.0,
+                    absorption_coefficient=0.01, heave=0.0, roll=0.0, pitch=0.0, temperature=8.0,
+                    heading=0.0, transmit_mode=0, spare0=b'', offset=0, count=count,
+                    power=_power_profile(rng, count)[0], angle=angle, **dates)))
+    return os.path.getsize(path)
+
+
+def _ek80_config_xml(n_channels, n_cw_channels):
+    """Return the configuration XML of ``n_channels`` WBT channels."""
+    pulse_durations = ';'.join('%g' % p for p in PULSE_LENGTH_TABLE)
+    gain = ';'.join(['27.0'] * max(5, n_channels))
+    sa_correction = ';'.join(['0.0'] * 5)
+    transceivers, transducers = [], []
+    for ch in range(n_channels):
+        freq, freq_min, freq_max = EK80_FREQUENCIES[ch]
+        serial = 545600 + ch
+        name = 'ES%d-7C' % (freq // 1000)
+        transceivers.append(
+            '<Transceiver TransceiverName="WBT %d" IPAddress="157.237.15.%d" Version="1.0" '
+            'TransceiverSoftwareVersion="1.65" TransceiverNumber="%d" TransceiverType="WBT" '
+            'SerialNumber="%d" Impedance="5400" Multiplexing="0" RxSampleFrequency="%d">'
+            '<Channels><Channel ChannelID="WBT %d-15 %s_ES" ChannelIdShort="WBT %d-15 %s" ChannelNumber="1" '
+            'MaxTxPowerTransceiver="2000" PulseDuration="%s" PulseDurationFM="%s" SampleInterval="%g" '
+            'HWChannelConfiguration="0">'
+            '<Transducer TransducerName="%s" SerialNumber="%d" Frequency="%d" FrequencyMinimum="%d" '
+            'FrequencyMaximum="%d" BeamType="1" EquivalentBeamAngle="-20.7" Gain="%s" SaCorrection="%s" '
+            'MaxTxPowerTransducer="2000" BeamWidthAlongship="7.0" BeamWidthAthwartship="7.0" '
+            'AngleSensitivityAlongship="21.9" AngleSensitivityAthwartship="21.9" AngleOffsetAlongship="0" '
+            'AngleOffsetAthwartship="0" DirectivityDropAt2XBeamWidth="0"/>'
+            '</Channel></Channels></Transceiver>' %
+            (serial, ch, ch + 1, serial, EK80_RX_SAMPLE_FREQUENCY, serial, name, serial, name,
+             pulse_durations, pulse_durations, _ek80_sample_interval(ch >= n_channels - n_cw_channels),
+             name, ch, freq, freq_min, freq_max, gain, sa_correction))
+        transducers.append(
+            '<Transducer TransducerName="%s" TransducerSerialNumber="%d" TransducerCustomName="%s %d-15" '
+            'TransducerMounting="HullMounted" TransducerOffsetX="0" TransducerOffsetY="0" '
+            'TransducerOffsetZ="0" TransducerAlphaX="0" TransducerAlphaY="0" TransducerAlphaZ="0"/>' %
+            (name, ch, name, serial))
+    return ('<Configuration><Header Copyright="" ApplicationName="EK80" Version="1.12.2.0" '
+            'FileFormatVersion="1.21" TimeBias="0"/><Transceivers>%s</Transceivers>'
+            '<Transducers>%s</Transducers></Configuration>' % (''.join(transceivers), ''.join(transducers)))
+
+
+def _ek80_sample_interval(cw):
+    """Return the sample interval [s] of broadband (complex) or CW (power) channels."""
+    decimation = np.prod(EK80_DECIMATION)
+    return decimation / EK80_RX_SAMPLE_FREQUENCY * (4 if cw else 1)
+
+
+def write_ek80_raw(path, n_pings=100, n_channels=3, n_cw_channels=0, n_range_bins=1000, range_bin_change=None,
+                   ping_interval=1.0, start_time=START_TIME, seed=0):
+    """Write a synthetic EK80 ``.raw`` file of XML0, FIL1, NME0, MRU0 and RAW3 datagrams.
+
+    Broadband channels are recorded as complex samples of 4 quadrants
+    and CW channels as power and angle.
+
+    Parameters
+    ----------
+    path : str
+        path of the file to write, its name should contain the timestamp pattern of ``raw_filename``
+    n_pings : int
+        number of pings
+    n_channels : int
+        number of channels, at most ``len(EK80_FREQUENCIES)``
+    n_cw_channels : int
+        number of the last channels that are CW instead of broadband
+    n_range_bins, range_bin_change
+        number of range_bin of each channel, see ``get_range_bins``
+    ping_interval : float
+        time between pings [s]
+    start_time : datetime.datetime
+        time of the first ping
+    seed : int
+        seed of the random echo data
+
+    Returns
+    -------
+    Size of the file in bytes
+    """
+    rng = np.random.default_rng(seed)
+    range_bins = get_range_bins(n_pings, n_channels, n_range_bins, range_bin_change)
+    xml_parser, fil_parser, raw_parser = SimradXMLParser(), SimradFILParser(), SimradRawParser()
+    nmea_parser, mru_parser = SimradNMEAParser(), SimradMRUParser()
+
+    channel_ids = []
+    for ch in range(n_channels):
+        freq = EK80_FREQUENCIES[ch][0]
+        channel_ids.append(b'WBT %d-15 ES%d-7C_ES' % (545600 + ch, freq // 1000))
+    # Low-pass filters of the WBT and pulse compression stages
+    filters = [np.hanning(n + 2)[1:-1].astype('complex64') for n in (32, 16)]
+    filters = [f / f.sum() for f in filters]
+    environment_xml = ('<Environment Depth="100" Acidity="8" Salinity="35" SoundSpeed="1493" Temperature="8" '
+                       'Latitude="47" SoundVelocityProfile="1;1493;1000;1493" DropKeelOffset="0" '
+                       'DropKeelOffsetIsManual="0" WaterLevelDraft="0" WaterLevelDraftIsManual="0">'
+                       '<Transducer TransducerName="Unknown" SoundSpeed="1493"/></Environment>')
+
+    with open(path, 'wb') as fid:
+        dates = _nt_dates(start_time)
+        fid.write(xml_parser.to_string(dict(type=b'XML0', xml_string=_ek80_config_xml(n_channels, n_cw_channels),
+                                            **dates)))
+        for ch_id in channel_ids:
+            for stage, (coefficients, decimation) in enumerate(zip(filters, EK80_DECIMATION), 1):
+                fid.write(fil_parser.to_string(dict(
+                    type=b'FIL1', stage=stage, spare=b'', channel_id=ch_id, n_coefficients=coefficients.size,
+                    decimation_factor=decimation, coefficients=coefficients, **dates)))
+        fid.write(xml_parser.to_string(dict(type=b'XML0', xml_string=environment_xml, **dates)))
+
+        for ping in range(n_pings):
+            timestamp = start_time + datetime.timedelta(seconds=ping * ping_interval)
+            dates = _nt_dates(timestamp)
+            fid.write(nmea_parser.to_string(dict(type=b'NME0', nmea_string=_nmea_gga(timestamp, ping), **dates)))
+            fid.write(mru_parser.to_string(dict(type=b'MRU0', heave=0.0, roll=0.0, pitch=0.0, heading=0.0,
+                                                **dates)))
+            for ch, ch_id in enumerate(channel_ids):
+                freq, freq_start, freq_end = EK80_FREQUENCIES[ch]
+                cw = ch >= n_channels - n_cw_channels
+                frequency = 'Frequency="%d"' % freq if cw else \
+                    'FrequencyStart="%d" FrequencyEnd="%d"' % (freq_start, freq_end)
+                fid.write(xml_parser.to_string(dict(
+                    type=b'XML0', xml_string='<Parameter><Channel ChannelID="%s" ChannelMode="0" PulseForm="%d" '
+                                             '%s PulseDuration="0.001024" SampleInterval="%g" TransmitPower="450" '
+                                             'Slope="0.011"/></Parameter>' %
+                                             (ch_id.decode(), 0 if cw else 1, frequency, _ek80_sample_interval(cw)),
+                    **dates)))
+                count = range_bins[ping, ch]
+                if cw:
+                    raw = dict(data_type=0b11, power=_power_profile(rng, count)[0],
+                               angle=rng.integers(-10, 10, size=(count, 2), dtype='int8'))
+                else:
+                    amplitude = 10 ** (_power_profile(rng, count, EK80_N_COMPLEX).T * INDEX2POWER / 20)
+                    phase = rng.uniform(0, 2 * np.pi, size=amplitude.shape)
+                    raw = dict(data_type=(EK80_N_COMPLEX << 8) | 0b1100,
+                               complex=(amplitude * np.exp(1j * phase)).astype('complex64'))
+                fid.write(raw_parser.to_string(dict(type=b'RAW3', channel_id=ch_id, spare=b'', offset=0,
+                                                    count=count, **raw, **dates)))
+    return os.path.getsize(path)
+
+
+def write_azfp_xml(path, n_channels=4, n_range_bins=1000):
+    """Write the ``.XML`` parameter file of a synthetic AZFP file.
+
+    Only the parameters read by ``ConvertAZFP.loadAZFPxml`` are written.
+    """
+    n_range_bins = np.broadcast_to(n_range_bins, n_channels)
+    frequencies = ''.join(
+        '<Frequency><kHz units="kHz">%d</kHz><TVR>1.7e+02</TVR><VTX0>1.0e+02</VTX0><BP>1.0e-02</BP>'
+        '<EL>1.4e+02</EL><DS>2.3e-02</DS></Frequency>' % AZFP_FREQUENCIES[ch] for ch in range(n_channels))
+    phases = ''.join(
+        '<Frequency Number="%d"><PulseLen units="us">1000</PulseLen><DigRate units="hz">64000</DigRate>'
+        '<RangeSamples units="samples">%d</RangeSamples><RangeAveragingSamples units="samples">1'
+        '</RangeAveragingSamples><LockOutIndex units="samples">0</LockOutIndex><Gain units="gain">1</Gain>'
+        '</Frequency>' % (ch + 1, n_range_bins[ch]) for ch in range(n_channels))
+    xml_string = (
+        '<AZFP><ULS5_LogConfiguration><SerialNumber>55075</SerialNumber><SensorsFlag>0</SensorsFlag>'
+        '<AG_Tilt><X_a>-4.6e+01</X_a><X_b>-7.9e-04</X_b><X_c>2.0e-07</X_c><X_d>-3.2e-12</X_d>'
+        '<Y_a>-4.7e+01</Y_a><Y_b>-5.8e-04</Y_b><Y_c>2.0e-07</Y_c><Y_d>-3.1e-12</Y_d></AG_Tilt>'
+        '<Analog_Temperature><ka>5.25e+02</ka><kb>3.0e+03</kb><kc>1.874e+00</kc><A>1.466e-03</A>'
+        '<B>2.388e-04</B><C>1.003e-07</C></Analog_Temperature>'
+        '<LogAcousticCoefficients><NumFreq>%d</NumFreq><Frequencies>%s</Frequencies></LogAcousticCoefficients>'
+        '</ULS5_LogConfiguration><AZFP_Parameters><Phases><Phase Number="1"><BurstInterval units="seconds">900'
+        '</BurstInterval><PingsPerBurst units="pings">60</PingsPerBurst><AverageBurstPings units="bool">0'
+        '</AverageBurstPings><Frequencies>%s</Frequencies></Phase></Phases></AZFP_Parameters></AZFP>' %
+        (n_channels, frequencies, phases))
+    with open(path, 'w') as fid:
+        fid.write(xml_string)
+
+
+def write_azfp_01A(path, n_pings=100, n_channels=4, n_range_bins=1000, ping_interval=1,
+                   start_time=START_TIME, seed=0):
+    """Write a synthetic AZFP ``.01A`` file of raw (not averaged) counts and its ``.XML`` file.
+
+    The ``.XML`` file is written next to the ``.01A`` file with the same name.
+    All pings of an AZFP file have the same number of range_bin.
+
+    Parameters
+    ----------
+    path : str
+        path of the ``.01A`` file to write
+    n_pings : int
+        number of pings
+    n_channels : int
+        number of channels, at most 4
+    n_range_bins : int or list of int
+        number of range_bin, the same for all channels or of each channel
+    ping_interval : int
+        time between pings [s]
+    start_time : datetime.datetime
+        time of the first ping
+    seed : int
+        seed of the random echo data
+
+    Returns
+    -------
+    Size of the ``.01A`` file in bytes
+    """
+    rng = np.random.default_rng(seed)
+    n_range_bins = np.broadcast_to(n_range_bins, n_channels)
+    xml_path = os.path.splitext(path)[0] + '.XML'
+    write_azfp_xml(xml_path, n_channels, n_range_bins)
+
+    def pad4(values):
+        return list(values) + [0] * (4 - len(values))
+
+    header = np.zeros(1, dtype=[(field[0], '>' + field[1]) + field[2:] for field in ConvertAZFP.get_fields()])[0]
+    header['num_chan'] = n_channels
+    header['num_bins'] = pad4(n_range_bins)
+    header['data_type'] = 0
+    pings = np.zeros(n_pings, dtype=ConvertAZFP(path, xml_path)._get_ping_dtype(header))
+
+    times = [start_time + datetime.timedelta(seconds=ping * ping_interval) for ping in range(n_pings)]
+    pings['profile_flag'] = 64770
+    pings['profile_number'] = np.arange(n_pings)
+    pings['serial_number'] = 55075
+    pings['burst_int'] = 900
+    for field in ('year', 'month', 'day', 'hour', 'minute', 'second'):
+        pings[field] = [getattr(t, field) for t in times]
+    pings['dig_rate'] = pad4([64000] * n_channels)
+    pings['num_bins'] = pad4(n_range_bins)
+    pings['range_samples_per_bin'] = pad4([1] * n_channels)
+    pings['ping_per_profile'] = 1
+    pings['num_acq_pings'] = 1
+    pings['ping_period'] = ping_interval
+    pings['num_chan'] = n_channels
+    pings['gain'] = pad4([1] * n_channels)
+    pings['pulse_length'] = pad4([1000] * n_channels)
+    pings['board_num'] = pad4(range(n_channels))
+    pings['frequency'] = pad4(AZFP_FREQUENCIES[:n_channels])
+    pings['ancillary'] = [32000, 32000, 40000, 0, 30000]
+    pings['ad'] = [40000, 0]
+    for ch in range(n_channels):
+        profile = 30000 - 20000 * np.log10(np.arange(1, n_range_bins[ch] + 1)) / np.log10(n_range_bins[ch] + 1)
+        pings['counts_%d' % ch] = np.clip(profile + rng.normal(0, 500, size=(n_pings, n_range_bins[ch])), 0, 65535)
+    pings.tofile(path)
+    return os.path.getsize(path)
@@ -1,16 +1,12 @@
 import os
 import shutil
-from collections import defaultdict
 import numpy as np
-import xarray as xr
 import xml.dom.minidom
-import math
 from datetime import datetime as dt
-from datetime import timezone
-from struct import unpack
 from .._version import get_versions
 from .utils.set_groups import SetGroups
 from .convertbase import ConvertBase
+from ..utils.profiling import stage
 ECHOPYPE_VERSION = get_versions()['version']
 del get_versions
 
@@ -25,7 +21,6 @@ class ConvertAZFP(ConvertBase):
         # self.file_name = os.path.basename(self.filename)
         self.FILE_TYPE = 64770
         self.HEADER_SIZE = 124
-        self.HEADER_FORMAT = ">HHHHIHHHHHHHHHHHHHHHHHHHHHHHHHHHHHBBBBHBBBBBBBBHHHHHHHHHHHHHHHHHHHH"
         self.parameters = dict()
 
         # Adds to self.parameters the contents of the xml file
@@ -136,83 +131,72 @@ class ConvertAZFP(ConvertBase):
         )
         return _fields
 
-    def _split_header(self, raw, header_unpacked, unpacked_data, fields):
-        """Splits the header information into a dictionary.
+    def _get_ping_dtype(self, header):
+        """Returns the structured data type of a ping with the same layout as ``header``.
+
+        Each ping consists of the header followed by the data of each channel,
+        stored as raw counts (2 bytes per bin) or, for averaged data,
+        as the linear sum (4 bytes per bin) and its overflow (1 byte per bin).
 
         Parameters
         ----------
-        raw
-            open binary file
-        header_unpacked
-            output of struct unpack of raw file
-        unpacked_data
-            current unpacked data
-        fields
-            fields to be unpacked for each ping, defined in ``get_fields``
-
-        Returns
-        -------
-            True or False depending on whether the unpacking was successful
+        header
+            header of the ping, a record of the ``np.dtype`` of ``get_fields``
         """
-        if header_unpacked[0] != self.FILE_TYPE:  # first field should match hard-coded FILE_TYPE from manufacturer
-            check_eof = raw.read(1)
-            if check_eof:
-                print("Error: Unknown file type")
-                return False
-        header_byte_cnt = 0
-        firmware_freq_len = 4   # fields with num_freq data still takes 4 bytes, the extra bytes contain random numbers
-        field_w_freq = ('dig_rate', 'lockout_index', 'num_bins', 'range_samples_per_bin',  # fields with num_freq data
-                        'data_type', 'gain', 'pulse_length', 'board_num', 'frequency')
-        for field in fields:
-            if field[0] in field_w_freq:  # fields with num_freq data
-                unpacked_data[field[0]].append(
-                    header_unpacked[header_byte_cnt:header_byte_cnt + self.parameters['num_freq']])
-                # unpacked_data[ping_num][field[0]] = \
-                #     header_unpacked[header_byte_cnt:header_byte_cnt + self.parameters['num_freq']]
-                header_byte_cnt += firmware_freq_len
-            elif len(field) == 3:  # other longer fields ('ancillary' and 'ad')
-                unpacked_data[field[0]].append(header_unpacked[header_byte_cnt:header_byte_cnt + field[2]])
-                # unpacked_data[ping_num][field[0]] = \
-                #     header_unpacked[header_byte_cnt:header_byte_cnt + field[2]]
-                header_byte_cnt += field[2]
+        ping_fields = [(field[0], '>' + field[1]) + field[2:] for field in self.get_fields()]
+        for freq_ch in range(header['num_chan']):
+            num_bins = header['num_bins'][freq_ch]
+            if header['data_type'][freq_ch]:
+                ping_fields += [('ls_%d' % freq_ch, '>u4', num_bins),     # Linear sum
+                                ('lso_%d' % freq_ch, 'u1', num_bins)]     # linear sum overflow
             else:
-                unpacked_data[field[0]].append(header_unpacked[header_byte_cnt])
-                # unpacked_data[ping_num][field[0]] = header_unpacked[header_byte_cnt]
-                header_byte_cnt += 1
-        return True
+                ping_fields += [('counts_%d' % freq_ch, '>u2', num_bins)]
+        return np.dtype(ping_fields)
+
+    def _check_header(self, header, offset):
+        """Raises ValueError if ``header`` is not a valid ping header.
+
+        Parameters
+        ----------
+        header
+            header of a ping, a record of the ``np.dtype`` of ``get_fields``
+        offset : int
+            position of the header in the file [bytes]
+        """
+        if header['profile_flag'] != self.FILE_TYPE:
+            raise ValueError(f"Unknown file type: profile_flag {header['profile_flag']} "
+                             f"at byte offset {offset}")
+        if not 1 <= header['num_chan'] <= 4:
+            raise ValueError(f"Header value num_chan {header['num_chan']} at byte offset {offset} "
+                             f"is not 1, 2, 3 or 4")
 
-    def _add_counts(self, raw, ping_num, unpacked_data):
-        """Unpacks the echosounder raw data. Modifies unpacked_data in place.
+    def _unpack_counts(self, pings, unpacked_data):
+        """Unpacks the echosounder raw data of all pings. Modifies unpacked_data in place.
 
         Parameters
         ----------
-        raw
-            open binary file
-        ping_num
-            ping number
+        pings
+            structured array of pings as returned by ``_get_ping_dtype``
         unpacked_data
             current unpacked data
         """
-        vv_tmp = [[]] * unpacked_data['num_chan'][ping_num]
-        for freq_ch in range(unpacked_data['num_chan'][ping_num]):
-            counts_byte_size = unpacked_data['num_bins'][ping_num][freq_ch]
-            if unpacked_data['data_type'][ping_num][freq_ch]:
-                if unpacked_data['avg_pings'][ping_num]:  # if pings are averaged over time
-                    divisor = unpacked_data['ping_per_profile'][ping_num] * \
-                              unpacked_data['range_samples_per_bin'][ping_num][freq_ch]
-                else:
-                    divisor = unpacked_data['range_samples_per_bin'][ping_num][freq_ch]
-                ls = unpack(">" + "I" * counts_byte_size, raw.read(counts_byte_size * 4))     # Linear sum
-                lso = unpack(">" + "B" * counts_byte_size, raw.read(counts_byte_size * 1))    # linear sum overflow
-                v = (np.array(ls) + np.array(lso) * 4294967295) / divisor
-                v = (np.log10(v) - 2.5) * (8 * 65535) * self.parameters['DS'][freq_ch]
+        counts = []
+        for freq_ch in range(pings['num_chan'][0]):
+            if pings['data_type'][0][freq_ch]:
+                # Averaged pings are divided by the number of pings per profile as well
+                divisor = np.where(unpacked_data['avg_pings'],
+                                   unpacked_data['ping_per_profile'] *
+                                   unpacked_data['range_samples_per_bin'][:, freq_ch],
+                                   unpacked_data['range_samples_per_bin'][:, freq_ch])
+                v = (pings['ls_%d' % freq_ch] + pings['lso_%d' % freq_ch] * np.float64(4294967295)) / \
+                    divisor[:, None]
+                with np.errstate(divide='ignore'):
+                    v = (np.log10(v) - 2.5) * (8 * 65535) * self.parameters['DS'][freq_ch]
                 v[np.isinf(v)] = 0
-                vv_tmp[freq_ch] = v
+                counts.append(v)
             else:
-                counts_chunk = raw.read(counts_byte_size * 2)
-                counts_unpacked = unpack(">" + "H" * counts_byte_size, counts_chunk)
-                vv_tmp[freq_ch] = counts_unpacked
-        unpacked_data['counts'].append(vv_tmp)
+                counts.append(pings['counts_%d' % freq_ch].astype('int64'))
+        unpacked_data['counts'] = counts   # dim: freq, each of ping_time x range_bin
 
     def _print_status(self, path, unpacked_data):
         """Prints message to console giving information about the raw file being parsed
@@ -266,73 +250,90 @@ class ConvertAZFP(ConvertBase):
     def parse_raw(self, raw):
         """Parses a raw AZFP file of the 01A file format
 
+        All pings are read at once into a structured array built from the fields of
+        ``get_fields``, and the derived values are computed over the whole file.
+
         Parameters
         ----------
         raw : list
             raw filename
         """
-
-        # Start of computation subfunctions
-        def compute_temp(counts):
-            """Returns the temperature in celsius given from xml data and the counts from ancillary"""
-            v_in = 2.5 * (counts / 65535)
-            R = (self.parameters['ka'] + self.parameters['kb'] * v_in) / (self.parameters['kc'] - v_in)
-            T = 1 / (self.parameters['A'] + self.parameters['B'] * (math.log(R)) +
-                     self.parameters['C'] * (math.log(R) ** 3)) - 273
-            return T
-
         def compute_tilt(N, a, b, c, d):
             return a + b * N + c * N**2 + d * N**3
 
-        def compute_battery(N):
-            USL5_BAT_CONSTANT = (2.5 / 65536.0) * (86.6 + 475.0) / 86.6
-            return N * USL5_BAT_CONSTANT
-
-        unpacked_data = defaultdict(list)
-        fields = self.get_fields()
-        with open(raw, 'rb') as file:
-            ping_num = 0
-            eof = False
-            while not eof:
-                header_chunk = file.read(self.HEADER_SIZE)
-                if header_chunk:
-                    header_unpacked = unpack(self.HEADER_FORMAT, header_chunk)
-
-                    # Reading will stop if the file contains an unexpected flag
-                    if self._split_header(file, header_unpacked, unpacked_data, fields):
-                        # Appends the actual 'data values' to unpacked_data
-                        self._add_counts(file, ping_num, unpacked_data)
-                        if ping_num == 0:
-                            # Display information about the file that was loaded in
-                            self._print_status(raw, unpacked_data)
-                        # Compute temperature from unpacked_data[ii]['ancillary][4]
-                        unpacked_data['temperature'].append(compute_temp(unpacked_data['ancillary'][ping_num][4]))
-                        # compute x tilt from unpacked_data[ii]['ancillary][0]
-                        unpacked_data['tilt_x'].append(
-                            compute_tilt(unpacked_data['ancillary'][ping_num][0],
-                                            self.parameters['X_a'], self.parameters['X_b'],
-                                            self.parameters['X_c'], self.parameters['X_d']))
-                        # Compute y tilt from unpacked_data[ii]['ancillary][1]
-                        unpacked_data['tilt_y'].append(
-                            compute_tilt(unpacked_data['ancillary'][ping_num][1],
-                                            self.parameters['Y_a'], self.parameters['Y_b'],
-                                            self.parameters['Y_c'], self.parameters['Y_d']))
-                        # Compute cos tilt magnitude from tilt x and y values
-                        unpacked_data['cos_tilt_mag'].append(
-                            math.cos((math.sqrt(unpacked_data['tilt_x'][ping_num] ** 2 +
-                                                unpacked_data['tilt_y'][ping_num] ** 2)) * math.pi / 180))
-                        # Calculate voltage of main battery pack
-                        unpacked_data['battery_main'].append(
-                            compute_battery(unpacked_data['ancillary'][ping_num][2]))
-                        # If there is a Tx battery pack
-                        unpacked_data['battery_tx'].append(
-                            compute_battery(unpacked_data['ad'][ping_num][0]))
-                    else:
-                        break
-                else:
-                    # End of file
-                    eof = True
-                ping_num += 1
+        # fields with num_freq data still take 4 values, the extra values contain random numbers
+        field_w_freq = ('dig_rate', 'lockout_index', 'num_bins', 'range_samples_per_bin',
+                        'data_type', 'gain', 'pulse_length', 'board_num', 'frequency')
+        header_dtype = np.dtype([(field[0], '>' + field[1]) + field[2:] for field in self.get_fields()])
+
+        # Memory map the file so that pings are unpacked without copying the file into memory
+        if os.path.getsize(raw) >= header_dtype.itemsize:
+            data = np.memmap(raw, dtype='u1', mode='r')
+        else:
+            data = np.zeros(0, dtype='u1')
+
+        # All pings are expected to have the same layout as the first ping
+        if data.size:
+            header = np.frombuffer(data, dtype=header_dtype, count=1)[0]
+            self._check_header(header, 0)
+            ping_dtype = self._get_ping_dtype(header)
+            pings = np.frombuffer(data, dtype=ping_dtype, count=data.size // ping_dtype.itemsize)
+        else:
+            ping_dtype = header_dtype
+            pings = np.zeros(0, dtype=header_dtype)
+
+        # Reading will stop if the file contains an unexpected flag
+        # first field should match hard-coded FILE_TYPE from manufacturer
+        valid = pings['profile_flag'] == self.FILE_TYPE
+        if not valid.all():
+            print("Error: Unknown file type")
+            pings = pings[:np.argmin(valid)]
+        # Pings with a different layout would be misread, so raise error if any
+        for field in ('num_chan', 'num_bins', 'data_type'):
+            values = pings[field] if field == 'num_chan' else pings[field][:, :pings['num_chan'][0]]
+            changed = values != values[:1]
+            if changed.ndim > 1:
+                changed = changed.any(axis=1)
+            if changed.any():
+                raise ValueError(f"Header value {field} is not constant for each ping, it changes "
+                                 f"at byte offset {np.argmax(changed) * ping_dtype.itemsize}")
+        pings = np.array(pings)   # copy the pings out of the memory map
+        del data
+
+        unpacked_data = dict()
+        for field in self.get_fields():
+            values = pings[field[0]]
+            if field[0] in field_w_freq:  # fields with num_freq data
+                values = values[:, :self.parameters['num_freq']]
+            unpacked_data[field[0]] = values.astype('int64')
+        if not pings.size:
+            self.unpacked_data = unpacked_data
+            return
+
+        # Appends the actual 'data values' to unpacked_data
+        self._unpack_counts(pings, unpacked_data)
+        # Display information about the file that was loaded in
+        self._print_status(raw, unpacked_data)
+
+        # Compute temperature from unpacked_data['ancillary'][:, 4]
+        ancillary = unpacked_data['ancillary']
+        v_in = 2.5 * (ancillary[:, 4] / 65535)
+        R = (self.parameters['ka'] + self.parameters['kb'] * v_in) / (self.parameters['kc'] - v_in)
+        unpacked_data['temperature'] = 1 / (self.parameters['A'] + self.parameters['B'] * np.log(R) +
+                                            self.parameters['C'] * np.log(R) ** 3) - 273
+        # compute x tilt from unpacked_data['ancillary'][:, 0]
+        unpacked_data['tilt_x'] = compute_tilt(ancillary[:, 0], self.parameters['X_a'], self.parameters['X_b'],
+                                               self.parameters['X_c'], self.parameters['X_d'])
+        # Compute y tilt from unpacked_data['ancillary'][:, 1]
+        unpacked_data['tilt_y'] = compute_tilt(ancillary[:, 1], self.parameters['Y_a'], self.parameters['Y_b'],
+                                               self.parameters['Y_c'], self.parameters['Y_d'])
+        # Compute cos tilt magnitude from tilt x and y values
+        unpacked_data['cos_tilt_mag'] = np.cos(np.sqrt(unpacked_data['tilt_x'] ** 2 +
+                                                       unpacked_data['tilt_y'] ** 2) * np.pi / 180)
+        # Calculate voltage of main battery pack and of the Tx battery pack if there is one
+        USL5_BAT_CONSTANT = (2.5 / 65536.0) * (86.6 + 475.0) / 86.6
+        unpacked_data['battery_main'] = ancillary[:, 2] * USL5_BAT_CONSTANT
+        unpacked_data['battery_tx'] = unpacked_data['ad'][:, 0] * USL5_BAT_CONSTANT
 
         self.unpacked_data = unpacked_data
 
@@ -342,17 +343,15 @@ class ConvertAZFP(ConvertBase):
         if not self.unpacked_data:
             self.parse_raw()
 
-        ping_time = []
-        for ping_num, year in enumerate(self.unpacked_data['year']):
-            ping_time.append(dt(year,
-                                self.unpacked_data['month'][ping_num],
-                                self.unpacked_data['day'][ping_num],
-                                self.unpacked_data['hour'][ping_num],
-                                self.unpacked_data['minute'][ping_num],
-                                int(self.unpacked_data['second'][ping_num] +
-                                    self.unpacked_data['hundredths'][ping_num] / 100)
-                                ).replace(tzinfo=timezone.utc).timestamp())
-        return ping_time
+        # Hundredths of a second are truncated into the seconds
+        dates = (self.unpacked_data['year'] - 1970).astype('datetime64[Y]') + \
+            (self.unpacked_data['month'] - 1).astype('timedelta64[M]')
+        ping_time = dates.astype('datetime64[D]') + \
+            (self.unpacked_data['day'] - 1).astype('timedelta64[D]') + \
+            self.unpacked_data['hour'].astype('timedelta64[h]') + \
+            self.unpacked_data['minute'].astype('timedelta64[m]') + \
+            (self.unpacked_data['second'] + self.unpacked_data['hundredths'] // 100).astype('timedelta64[s]')
+        return (ping_time - np.datetime64(0, 's')).astype('float64')
 
     def calc_Sv_offset(self, f, pulse_length):
         """Calculate a compensation for the effects of finite response
@@ -434,8 +433,7 @@ class ConvertAZFP(ConvertBase):
         Sv_offset = np.zeros(freq.shape)
         for ich in range(len(freq)):
             Sv_offset[ich] = self.calc_Sv_offset(freq[ich], self.unpacked_data['pulse_length'][ich])
-            N.append(np.array([self.unpacked_data['counts'][p][ich]
-                                for p in range(len(self.unpacked_data['year']))]))
+            N.append(self.unpacked_data['counts'][ich])
 
         tdn = self.unpacked_data['pulse_length'] / 1e6  # Convert microseconds to seconds
         range_samples_xml = np.array(self.parameters['range_samples'])         # from xml file
@@ -450,15 +448,12 @@ class ConvertAZFP(ConvertBase):
         # Largest number of counts along the range dimension among the different channels
         longest_range_bin = np.max(self.unpacked_data['num_bins'])
         range_bin = np.arange(longest_range_bin)
-        # TODO: replace the following with an explicit check of length of range across channels
-        try:
-            np.array(N)
-        # Exception occurs when N is not rectangular,
+        # N is not rectangular if the length of range differs across channels,
         #  so it must be padded with nan values to make it rectangular
-        except ValueError:
-            N = [np.pad(n, ((0, 0), (0, longest_range_bin - n.shape[1])),
+        if any(n.shape[1] != longest_range_bin for n in N):
+            N = [np.pad(n.astype('float64'), ((0, 0), (0, longest_range_bin - n.shape[1])),
                         mode='constant', constant_values=np.nan)
-                    for n in N]
+                 for n in N]
 
         beam_dict = dict()
 
@@ -548,39 +543,36 @@ class ConvertAZFP(ConvertBase):
         ping_time = self.get_ping_time()
         # Create SetGroups object
         grp = SetGroups(file_path=out_file, echo_type='AZFP',
-                        compress=save_settings['compress'], append_zarr=self._append_zarr)
+                        compress=save_settings['compress'], append_zarr=self._append_zarr,
+                        combine_nc=save_settings['combine_opt'], append_nc=self._append_nc)
         grp.set_toplevel(self._set_toplevel_dict())                   # top-level group
+        # The Beam group is saved first, so that a file that cannot be combined is not partly appended
+        grp.set_beam(self._set_beam_dict(ping_time))                  # beam group
         grp.set_env(self._set_env_dict(ping_time))                    # environment group
         grp.set_provenance(self._set_prov_dict(save_settings['combine_opt'], raw_file))   # provenance group
         grp.set_platform(self._set_platform_dict())                   # platform group
         grp.set_sonar(self._set_sonar_dict())                         # sonar group
-        grp.set_beam(self._set_beam_dict(ping_time))                  # beam group
         grp.set_vendor_specific(self._set_vendor_specific_dict(ping_time))     # AZFP Vendor specific group
 
     def _export_nc(self, save_settings, file_idx=0):
         """
         Saves parsed raw files to a NetCDF file.
-        NetCDF files created by combining multiple raw files are saved to a temporary folder and
-        merged after all raw file conversion has been completed due to limitations to appending
-        to a NetCDF file with xarray.
+        Raw files combined into 1 NetCDF file are appended to it in place,
+        along unlimited dimensions created when saving the first raw file.
         """
-        # self._temp_path exists if combining multiple files into 1 .nc file
-        if self._temp_path:
-            out_file = self._temp_path[file_idx]
-        else:
-            # If there are multiple files, self.save_path is a list otherwise it is a string
-            out_file = self.save_path[file_idx] if type(self.save_path) == list else self.save_path
+        # If there are multiple files, self.save_path is a list otherwise it is a string
+        out_file = self.save_path[file_idx] if type(self.save_path) == list else self.save_path
         raw_file = self.filename[file_idx]
 
         # Check if out_file file already exists
         # Deletes it if overwrite is true
-        if os.path.exists(out_file) and save_settings['overwrite']:
+        if os.path.exists(out_file) and save_settings['overwrite'] and not self._append_nc:
             print("          overwriting: " + out_file)
             os.remove(out_file)
         # Check if nc file already exists
         # ... if yes, abort conversion and issue warning
         # ... if not, continue with conversion
-        if os.path.exists(out_file):
+        if os.path.exists(out_file) and not self._append_nc:
             print(f'          ... this file has already been converted to .nc, conversion not executed.')
         else:
             self._set_groups(raw_file, out_file, save_settings=save_settings)
@@ -605,36 +597,37 @@ class ConvertAZFP(ConvertBase):
         else:
             self._set_groups(raw_file, out_file, save_settings=save_settings)
 
-    def _combine_files(self):
-        # Do nothing if combine_opt is true if there is nothing to combine
-        if not self._temp_path:
-            return
-        save_path = self.save_path
-        all_temp = os.listdir(self._temp_dir)
-        files = [os.path.join(self._temp_dir, file) for file in all_temp]
-
-        # Open multiple files as one dataset of each group and save them into a single file
-        with xr.open_dataset(files[0]) as ds_top:
-            ds_top.to_netcdf(path=save_path, mode='w')
-        with xr.open_dataset(files[0], group='Provenance') as ds_prov:
-            ds_prov.to_netcdf(path=save_path, mode='a', group='Provenance')
-        with xr.open_dataset(files[0], group='Sonar') as ds_sonar:
-            ds_sonar.to_netcdf(path=save_path, mode='a', group='Sonar')
-        with xr.open_mfdataset(files, group='Beam', combine='by_coords', data_vars='minimal') as ds_beam:
-            ds_beam.to_netcdf(path=save_path, mode='a', group='Beam')
-        with xr.open_mfdataset(files, group='Environment', combine='by_coords') as ds_env:
-            ds_env.to_netcdf(path=save_path, mode='a', group='Environment')
-        # The platform group for AZFP does not have coordinates, so it must be handled differently from EK60
-        with xr.open_dataset(files[0], group='Platform') as ds_plat:
-            ds_plat.to_netcdf(path=save_path, mode='a', group='Platform')
-        # EK60 does not have the "vendor specific" group
-        with xr.open_mfdataset(files, group='Vendor', combine='by_coords', data_vars='minimal') as ds_vend:
-            ds_vend.to_netcdf(path=save_path, mode='a', group='Vendor')
-
-        # Delete temporary folder:
-        shutil.rmtree(self._temp_dir)
-
-    def save(self, file_format, save_path=None, combine_opt=False, overwrite=False, compress=True):
+    def _parse_file(self, file_format, file_idx, save_settings):
+        """Parse the raw file ``self.filename[file_idx]``, see ``ConvertBase._parse_file``.
+        """
+        file = self.filename[file_idx]
+        # Reset instance variables for each raw file. Always reset if there is more than 1 file being parsed
+        if file_idx > 0 or len(self.filename) > 1:
+            self.reset_vars('AZFP')
+        # Load data if it has not already been loaded.
+        if not self.unpacked_data:
+            with stage('parse', file=os.path.basename(file)) as record:
+                self.parse_raw(file)
+                record.add(n_bytes_read=os.path.getsize(file), n_pings=len(self.unpacked_data['profile_flag']))
+            self.check_uniqueness()
+        return True
+
+    def _save_file(self, file_format, file_idx, save_settings):
+        """Save the parsed raw file ``self.filename[file_idx]`` to netCDF4 or Zarr.
+        """
+        # multiple raw files are saved differently between the .nc and .zarr formats
+        if file_format == '.nc':
+            # Sets flag for combining raw files into 1 nc file
+            self._append_nc = file_idx > save_settings['first_file_idx'] and save_settings['combine_opt']
+            self._export_nc(save_settings, file_idx)
+        elif file_format == '.zarr':
+            # Sets flag for combining raw files into 1 zarr file
+            self._append_zarr = file_idx > save_settings['first_file_idx'] and save_settings['combine_opt']
+            self._export_zarr(save_settings, file_idx)
+
+    def save(self, file_format, save_path=None, combine_opt=False, overwrite=False, compress=True,
+             n_workers=1, ping_chunk_size=None, start_time=None, end_time=None, channels=None, frequencies=None,
+             packed=False, pad_range_bin=False):
         """Save data from raw 01A format to a netCDF4 or Zarr file
 
         Parameters
@@ -652,24 +645,21 @@ class ConvertAZFP(ConvertBase):
             Whether or not to overwrite the file if the output path already exists.
         compress : bool
             Whether or not to compress backscatter data. Defaults to `True`
+        n_workers : int
+            Number of processes used to convert multiple files in parallel. Defaults to 1.
+        ping_chunk_size : int
+            Not used for AZFP files, which are always parsed in full before saving.
+        start_time, end_time, channels, frequencies
+            Not supported for AZFP files, which are always converted in full.
+        packed : bool
+            Not supported for AZFP files.
+        pad_range_bin : bool
+            Not used for AZFP files, which always have the same number of range bins.
         """
+        if packed:
+            raise ValueError("Packed storage is only supported for EK60 files")
+        if any(x is not None for x in (start_time, end_time, channels, frequencies)):
+            raise ValueError("Selecting a time window or channels is only supported for EK60 and EK80 files")
         save_settings = dict(combine_opt=combine_opt, overwrite=overwrite, compress=compress)
         self.validate_path(save_path, file_format, combine_opt)
-        # Loop over all files being parsed
-        for file_idx, file in enumerate(self.filename):
-            # Reset instance variables for each raw file. Always reset if there is more than 1 file being parsed
-            if file_idx > 0 or len(self.filename) > 1:
-                self.reset_vars('AZFP')
-            # Load data if it has not already been loaded.
-            if not self.unpacked_data:
-                self.parse_raw(file)
-                self.check_uniqueness()
-            # multiple raw files are saved differently between the .nc and .zarr formats
-            if file_format == '.nc':
-                self._export_nc(save_settings, file_idx)
-            elif file_format == '.zarr':
-                # Sets flag for combining raw files into 1 zarr file
-                self._append_zarr = True if file_idx and combine_opt else False
-                self._export_zarr(save_settings, file_idx)
-        if combine_opt and file_format == '.nc':
-            self._combine_files()
+        self._convert_files(file_format, save_settings, 'AZFP', n_workers)
@@ -1,5 +1,15 @@
 import os
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime as dt
+from itertools import islice
+import numpy as np
+from .utils.nmea_data import NMEAData
+from .utils.ek_raw_io import RawSimradFile
+from ..utils.profiling import stage
+
+# Instance variables of the combined output, kept by the process appending the files to it
+COMBINE_STATE = ('_zarr_split', '_append_zarr', '_append_nc', '_use_original', 'conversion_errors')
 
 
 class ConvertBase:
@@ -21,8 +31,13 @@ class ConvertBase:
         self._append_zarr = False      # flag to determine if combining raw files into 1 zarr file
         self._use_original = False
         # Variables used for storing nc files
-        self._temp_dir = None          # path of temporary folder for storing .nc files before combination
-        self._temp_path = []           # paths of temporary files for storing .nc files before combination
+        self._append_nc = False        # flag to determine if appending raw files to a combined nc file
+        self.conversion_errors = {}    # errors of files that failed to convert, keyed by filename
+        # Time window and channels to convert, set by raw2nc and raw2zarr
+        self._start_time = None
+        self._end_time = None
+        self._channels = None
+        self._frequencies = None
 
     @property
     def platform_name(self):
@@ -62,9 +77,8 @@ class ConvertBase:
     def reset_vars(self, echo_type):
         if echo_type == 'EK60':
             self.config_datagram = None
+            self.nmea_data = NMEAData()
             self.ping_data_dict = {}
-            self.power_dict = {}
-            self.angle_dict = {}
             self.ping_time = []
             self.CON1_datagram = None
             self.range_lengths = None
@@ -76,6 +90,7 @@ class ConvertBase:
             self.all_files = []
         elif echo_type == 'EK80':
             self.config_datagram = None
+            self.nmea_data = NMEAData()
             self.ping_data_dict = {}
             self.power_dict = {}
             self.angle_dict = {}
@@ -91,12 +106,55 @@ class ConvertBase:
         elif echo_type == 'AZFP':
             self.unpacked_data = None
 
+    def _set_selection(self, start_time=None, end_time=None, channels=None, frequencies=None):
+        """Set the time window and the channels to convert, see ``raw2nc``.
+
+        Returns
+        -------
+        Whether the selection changed, in which case data parsed before must be parsed again
+        """
+        previous = (self._start_time, self._end_time, self._channels, self._frequencies)
+        self._start_time = None if start_time is None else np.datetime64(start_time, 'ms')
+        self._end_time = None if end_time is None else np.datetime64(end_time, 'ms')
+        if self._start_time is not None and self._end_time is not None and self._start_time > self._end_time:
+            raise ValueError("start_time must not be after end_time")
+        self._channels = None if channels is None else [channels] if isinstance(channels, str) else list(channels)
+        self._frequencies = None if frequencies is None else np.atleast_1d(frequencies).astype(float).tolist()
+        return previous != (self._start_time, self._end_time, self._channels, self._frequencies)
+
+    def _select_channels(self, ch_ids, frequencies):
+        """Return the IDs of the channels to convert among the channels of a file.
+
+        Parameters
+        ----------
+        ch_ids : list of str
+            IDs of all channels in the file
+        frequencies : list of float
+            frequency of each channel [Hz]
+        """
+        selected = [ch_id for ch_id, freq in zip(ch_ids, frequencies)
+                    if (self._channels is None or ch_id in self._channels) and
+                    (self._frequencies is None or float(freq) in self._frequencies)]
+        if not selected:
+            raise ValueError(f"No channel matches channels={self._channels} and frequencies={self._frequencies}. "
+                             f"The channels in the file are {ch_ids}")
+        return selected
+
+    def _has_pings_in_window(self, file):
+        """Whether a Simrad ``.raw`` file has RAW datagrams in the time window to convert,
+        checked using the datagram index only.
+        """
+        if self._start_time is None and self._end_time is None:
+            return True
+        with RawSimradFile(file, 'r', use_mmap=True) as fid:
+            return fid.select_dgrams(['RAW'], self._start_time, self._end_time).size > 0
+
     def validate_path(self, save_path, file_format, combine_opt):
         """ Takes in either a path for a file or directory for either a .nc or .zarr output file.
         If the directory does not exist, create it. Raises an error if the directory cannot
         be created or if the filename does not match the file_format given.
         If combine_opt is true, then save_path must be a filename. If false then save_path must be a directory.
-        Writes to self.save_path, self.nc_path, self.zarr_path, self.out_dir, self._temp_dir, self._temp_path
+        Writes to self.save_path, self.nc_path, self.zarr_path, self.out_dir
 
         Parameters
         ----------
@@ -168,19 +226,178 @@ class ConvertBase:
             self.nc_path = self.nc_path[0]
             self.zarr_path = self.zarr_path[0]
 
-        # If combining, create temp folder for files
-        if combine_opt and ext == '.nc':
-            orig_files = [os.path.splitext(os.path.basename(f))[0] for f in self.filename]
-            self._temp_dir = os.path.join(self.out_dir, '.echopype_tmp')
-            if not os.path.exists(self._temp_dir):
-                os.mkdir(self._temp_dir)
-            self._temp_path = [os.path.join(self._temp_dir, f + file_format) for f in orig_files]
+    def _parse_file(self, file_format, file_idx, save_settings):
+        """Parse the raw file ``self.filename[file_idx]``. Implemented by each echosounder model.
+
+        Returns
+        -------
+        Whether the file has data to save
+        """
+        raise NotImplementedError
+
+    def _save_file(self, file_format, file_idx, save_settings):
+        """Save the parsed raw file ``self.filename[file_idx]``. Implemented by each echosounder model.
+        """
+        raise NotImplementedError
+
+    def _parse_in_window(self, file_format, file_idx, save_settings):
+        """Parse one raw file, unless it has no pings in the time window to convert.
+
+        Returns
+        -------
+        Whether the file has data to save
+        """
+        file = self.filename[file_idx]
+        if not self._has_pings_in_window(file):
+            print('%s  no pings in the selected time window, file not converted: %s' %
+                  (dt.now().strftime('%H:%M:%S'), os.path.basename(file)))
+            return False
+        return self._parse_file(file_format, file_idx, save_settings)
+
+    def _convert_file(self, file_format, file_idx, save_settings):
+        """Parse one raw file and save it.
+        """
+        if self._parse_in_window(file_format, file_idx, save_settings):
+            self._save_file(file_format, file_idx, save_settings)
+
+    def _parse_to_combine(self, file_format, file_idx, save_settings):
+        """Parse one raw file in a worker process for the parent process to append it to the combined output.
+
+        Returns
+        -------
+        Whether the file has data to save, and the instance variables except the state of the combined output
+        """
+        has_data = self._parse_in_window(file_format, file_idx, save_settings)
+        return has_data, {name: value for name, value in vars(self).items() if name not in COMBINE_STATE}
+
+    def _convert_files(self, file_format, save_settings, echo_type, n_workers=1):
+        """Parse and save all raw files, in parallel processes if ``n_workers > 1``.
+
+        Files without pings in the time window to convert are skipped, checked by the process
+        that parses them.
+        In parallel conversion every file is parsed and saved by its own worker process.
+        Files combined into one output are parsed by the worker processes and appended
+        to the output by this process, in the order of the files.
+        When converting multiple files, conversion continues if some of the files fail
+        and the errors are collected in ``self.conversion_errors``, keyed by filename.
+        An error converting a single file is raised.
+
+        Parameters
+        ----------
+        file_format : str
+            .nc or .zarr
+        save_settings : dict
+            combine_opt, overwrite and compress options passed to ``save``
+        echo_type : str
+            echosounder model, used to reset parsed data before parallel conversion
+        n_workers : int
+            number of worker processes
+        """
+        n_files = len(self.filename)
+        self.conversion_errors = {}
+        # Files combined into one output are appended to the output of the first saved file
+        save_settings['first_file_idx'] = 0
+        save_settings['combine_opt'] = save_settings['combine_opt'] and n_files > 1
+        if n_workers > 1 and save_settings['combine_opt'] and file_format == '.zarr' and \
+                save_settings.get('ping_chunk_size'):
+            print('%s  streaming files into one .zarr file, converting files one at a time' %
+                  dt.now().strftime('%H:%M:%S'))
+            n_workers = 1
+        if n_files == 1:
+            with stage('convert', file=os.path.basename(self.filename[0])) as record:
+                self._convert_file(file_format, 0, save_settings)
+                record.add(n_bytes_read=os.path.getsize(self.filename[0]))
+            return
+        if n_workers <= 1:
+            self._convert_serial(file_format, save_settings)
+        else:
+            # Each worker gets a copy of this object, so drop any previously parsed data
+            self.reset_vars(echo_type)
+            n_workers = min(n_workers, n_files)
+            print('%s  converting %d files with %d workers' % (dt.now().strftime('%H:%M:%S'), n_files, n_workers))
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                if save_settings['combine_opt']:
+                    self._combine_parsed_files(executor, n_workers, file_format, range(n_files), save_settings)
+                else:
+                    futures = {executor.submit(self._convert_file, file_format, file_idx, save_settings): file_idx
+                               for file_idx in range(n_files)}
+                    for n_done, future in enumerate(as_completed(futures), start=1):
+                        self._report_conversion(futures[future], n_done, n_files, future.exception())
+
+        if self.conversion_errors:
+            print('%s  %d of %d files failed to convert:' %
+                  (dt.now().strftime('%H:%M:%S'), len(self.conversion_errors), n_files))
+            for file, e in self.conversion_errors.items():
+                print('          %s: %s' % (os.path.basename(file), repr(e)))
+
+    def _convert_serial(self, file_format, save_settings):
+        """Parse and save the raw files one at a time, in the order of the files.
+        """
+        n_files = len(self.filename)
+        first_saved = False
+        for file_idx in range(n_files):
+            error = None
+            try:
+                with stage('convert', file=os.path.basename(self.filename[file_idx])) as record:
+                    if self._parse_in_window(file_format, file_idx, save_settings):
+                        # The first saved file creates the combined output that the following files are appended to
+                        if not first_saved:
+                            save_settings['first_file_idx'] = file_idx
+                        self._save_file(file_format, file_idx, save_settings)
+                        first_saved = True
+                    record.add(n_bytes_read=os.path.getsize(self.filename[file_idx]))
+            except Exception as e:
+                error = e
+            self._report_conversion(file_idx, file_idx + 1, n_files, error)
 
-    def _combine_files(self, echo_type):
-        # Combines NetCDF files
-        print("Combining is not supported for this echosounder model")
+    def _combine_parsed_files(self, executor, n_workers, file_format, file_idxs, save_settings):
+        """Parse files in the worker processes of ``executor`` and append them to the combined output in order.
+
+        At most ``n_workers`` parsed files wait to be saved, so that memory use stays bounded.
+        """
+        file_iter = iter(file_idxs)
+        pending = deque((file_idx, executor.submit(self._parse_to_combine, file_format, file_idx, save_settings))
+                        for file_idx in islice(file_iter, n_workers))
+        first_saved = False
+        n_done = 0
+        while pending:
+            file_idx, future = pending.popleft()
+            next_idx = next(file_iter, None)
+            if next_idx is not None:
+                pending.append((next_idx, executor.submit(self._parse_to_combine, file_format,
+                                                          next_idx, save_settings)))
+            n_done += 1
+            try:
+                has_data, parsed = future.result()
+            except Exception as e:
+                self._report_conversion(file_idx, n_done, len(file_idxs), e)
+                continue
+            if has_data:
+                vars(self).update(parsed)
+                # The first saved file creates the combined output that the following files are appended to
+                if not first_saved:
+                    save_settings['first_file_idx'] = file_idx
+                try:
+                    with stage('convert', file=os.path.basename(self.filename[file_idx])):
+                        self._save_file(file_format, file_idx, save_settings)
+                    first_saved = True
+                except Exception as e:
+                    self._report_conversion(file_idx, n_done, len(file_idxs), e)
+                    continue
+            self._report_conversion(file_idx, n_done, len(file_idxs))
+
+    def _report_conversion(self, file_idx, n_done, n_files, error=None):
+        """Print the progress of conversion and collect the error of a failed file.
+        """
+        file = self.filename[file_idx]
+        if error is not None:
+            self.conversion_errors[file] = error
+        print('%s  [%d/%d] %s: %s' % (dt.now().strftime('%H:%M:%S'), n_done, n_files,
+                                      'FAILED' if error is not None else 'finished', os.path.basename(file)))
 
-    def raw2nc(self, save_path=None, combine_opt=False, overwrite=False, compress=True):
+    def raw2nc(self, save_path=None, combine_opt=False, overwrite=False, compress=True, n_workers=1,
+               start_time=None, end_time=None, channels=None, frequencies=None, packed=False,
+               pad_range_bin=False):
         """Wrapper for saving to netCDF.
 
         Parameters
@@ -196,10 +413,39 @@ class ConvertBase:
             Whether or not to overwrite the file if the output path already exists.
         compress : bool
             Whether or not to compress backscatter data. Defaults to `True`
+        n_workers : int
+            Number of processes used to convert multiple files in parallel. Defaults to 1.
+            Files that fail to convert are reported and collected in ``conversion_errors``
+            when converting multiple files, with any number of workers.
+        start_time : str, datetime or numpy.datetime64
+            If given, only convert pings and NMEA datagrams recorded at or after this time (UTC).
+            Files without pings in the time window are not converted.
+        end_time : str, datetime or numpy.datetime64
+            If given, only convert pings and NMEA datagrams recorded at or before this time (UTC).
+        channels : str or list of str
+            If given, only convert the channels with these channel IDs.
+        frequencies : float or list of float
+            If given, only convert the channels with these frequencies [Hz].
+            Pings outside the time window and data of other channels are skipped
+            without being decoded. Only EK60 and EK80 files can be subset.
+        packed : bool
+            Whether to store EK60 power and split-beam angles as int16, as recorded,
+            with CF ``scale_factor`` and ``_FillValue`` attributes so that xarray decodes them
+            to float when read. Reduces memory use during conversion and the output file size.
+            Defaults to `False`, which stores float values. Only EK60 files can be packed.
+        pad_range_bin : bool
+            Whether to save all pings of an EK60 file to one file when the number of range bins
+            changes within the file, padded with fill values to the longest range_bin.
+            The number of samples recorded in each ping is saved in ``sample_count``.
+            Defaults to `False`, which splits the data into ``_partXX`` files.
         """
-        self.save(".nc", save_path, combine_opt, overwrite, compress)
+        self.save(".nc", save_path, combine_opt, overwrite, compress, n_workers,
+                  start_time=start_time, end_time=end_time, channels=channels, frequencies=frequencies,
+                  packed=packed, pad_range_bin=pad_range_bin)
 
-    def raw2zarr(self, save_path=None, combine_opt=False, overwrite=False, compress=True):
+    def raw2zarr(self, save_path=None, combine_opt=False, overwrite=False, compress=True, n_workers=1,
+                 ping_chunk_size=None, start_time=None, end_time=None, channels=None, frequencies=None,
+                 packed=False, pad_range_bin=False):
         """Wrapper for saving to zarr.
 
         Parameters
@@ -215,10 +461,42 @@ class ConvertBase:
             Whether or not to overwrite the file if the output path already exists.
         compress : bool
             Whether or not to compress backscatter data. Defaults to `True`
+        n_workers : int
+            Number of processes used to convert multiple files in parallel. Defaults to 1.
+            Files that fail to convert are reported and collected in ``conversion_errors``
+            when converting multiple files, with any number of workers.
+        ping_chunk_size : int
+            If given, EK60 and EK80 files are parsed and saved in chunks of this many pings,
+            so that memory use stays bounded no matter how large the raw files are.
+            Defaults to `None`, which parses each raw file in full before saving.
+        start_time : str, datetime or numpy.datetime64
+            If given, only convert pings and NMEA datagrams recorded at or after this time (UTC).
+            Files without pings in the time window are not converted.
+        end_time : str, datetime or numpy.datetime64
+            If given, only convert pings and NMEA datagrams recorded at or before this time (UTC).
+        channels : str or list of str
+            If given, only convert the channels with these channel IDs.
+        frequencies : float or list of float
+            If given, only convert the channels with these frequencies [Hz].
+            Pings outside the time window and data of other channels are skipped
+            without being decoded. Only EK60 and EK80 files can be subset.
+        packed : bool
+            Whether to store EK60 power and split-beam angles as int16, as recorded,
+            with CF ``scale_factor`` and ``_FillValue`` attributes so that xarray decodes them
+            to float when read. Reduces memory use during conversion and the output file size.
+            Defaults to `False`, which stores float values. Only EK60 files can be packed.
+        pad_range_bin : bool
+            Whether to save all pings of an EK60 file to one file when the number of range bins
+            changes within the file, padded with fill values to the longest range_bin.
+            The number of samples recorded in each ping is saved in ``sample_count``.
+            Defaults to `False`, which splits the data into ``_partXX`` files.
         """
-        self.save(".zarr", save_path, combine_opt, overwrite, compress)
+        self.save(".zarr", save_path, combine_opt, overwrite, compress, n_workers, ping_chunk_size,
+                  start_time=start_time, end_time=end_time, channels=channels, frequencies=frequencies,
+                  packed=packed, pad_range_bin=pad_range_bin)
 
-    def save(self, param, save_path, combine_opt, overwrite, compress):
+    def save(self, param, save_path, combine_opt, overwrite, compress, n_workers=1, ping_chunk_size=None,
+             start_time=None, end_time=None, channels=None, frequencies=None, packed=False, pad_range_bin=False):
         """Wrapper for saving functions.
         """
         pass
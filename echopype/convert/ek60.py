@@ -7,16 +7,18 @@ import os
 import re
 import shutil
 from collections import defaultdict
+from functools import partial
 import numpy as np
-import xarray as xr
+import zarr
 from datetime import datetime as dt
 import pytz
-import pynmea2
 from .._version import get_versions
 from .utils.ek_raw_io import RawSimradFile, SimradEOF
 from .utils.nmea_data import NMEAData
+from .utils.ping_data import PingData
 from .utils.set_groups import SetGroups
 from .convertbase import ConvertBase
+from ..utils.profiling import stage
 ECHOPYPE_VERSION = get_versions()['version']
 del get_versions
 
@@ -28,6 +30,9 @@ del get_versions
 #  postfix: so far only saw Saildrone that produces filename with postfix
 FILENAME_MATCHER_STR = '(?P<survey>.+)?-?D(?P<date>\w{1,8})-T(?P<time>\w{1,6})-?(?P<postfix>\w+)?.raw'
 
+# Types of datagrams read from EK60 files after the configuration datagram
+DGRAM_TYPES = ['RAW', 'NME', 'TAG', 'BOT', 'DEP']
+
 
 # Create a constant to convert indexed power to power.
 INDEX2POWER = (10.0 * np.log10(2.0) / 256.0)
@@ -35,6 +40,11 @@ INDEX2POWER = (10.0 * np.log10(2.0) / 256.0)
 # Create a constant to convert from indexed angles to electrical angles.
 INDEX2ELEC = 180.0 / 128.0
 
+# Fill values of packed power and angle data, for padded samples and channels without angles.
+# Angles recorded as int8 are stored as int16 so that their fill value is never a recorded angle.
+POWER_FILL_VALUE = np.iinfo('int16').min
+ANGLE_FILL_VALUE = np.iinfo('int16').min
+
 
 class ConvertEK60(ConvertBase):
     """Class for converting EK60 ``.raw`` files.
@@ -46,9 +56,7 @@ class ConvertEK60(ConvertBase):
         # Initialize file parsing storage variables
         self.config_datagram = None
         self.nmea_data = NMEAData()  # object for NMEA data
-        self.ping_data_dict = {}   # dictionary to store metadata
-        self.power_dict = {}   # dictionary to store power data
-        self.angle_dict = {}   # dictionary to store angle data
+        self.ping_data_dict = {}   # dictionary of PingData objects to store metadata, power and angle data
         self.ping_time = []    # list to store ping time
         self.CON1_datagram = None    # storage for CON1 datagram for ME70
 
@@ -59,33 +67,13 @@ class ConvertEK60(ConvertBase):
         self.angle_dict_split = {}
         self.tx_sig = {}   # dictionary to store transmit signal parameters and sample interval
         self.ping_slices = []
+        self._channel_map = {}   # channel number of each selected channel keyed by its number in the file
+        self._packed = False     # whether power and angle data are kept as integers, see save
+        self._pad_power = False  # whether packed power of different files or range_bin groups is padded
+        self._pad_range_bin = False  # whether range_bin groups are padded to the longest, see save
         self.timestamp_pattern = re.compile(regex)
 
-    def _append_channel_ping_data(self, ch_num, datagram):
-        """ Append ping-by-ping channel metadata extracted from the newly read datagram of type 'RAW'.
-
-        Parameters
-        ----------
-        ch_num : int
-            number of the channel to append metadata to
-        datagram : dict
-            the newly read datagram of type 'RAW'
-        """
-        self.ping_data_dict[ch_num]['mode'].append(datagram['mode'])
-        self.ping_data_dict[ch_num]['transducer_depth'].append(datagram['transducer_depth'])
-        self.ping_data_dict[ch_num]['transmit_power'].append(datagram['transmit_power'])
-        self.ping_data_dict[ch_num]['pulse_length'].append(datagram['pulse_length'])
-        self.ping_data_dict[ch_num]['bandwidth'].append(datagram['bandwidth'])
-        self.ping_data_dict[ch_num]['sample_interval'].append(datagram['sample_interval'])
-        self.ping_data_dict[ch_num]['sound_velocity'].append(datagram['sound_velocity'])
-        self.ping_data_dict[ch_num]['absorption_coefficient'].append(datagram['absorption_coefficient'])
-        self.ping_data_dict[ch_num]['heave'].append(datagram['heave'])
-        self.ping_data_dict[ch_num]['roll'].append(datagram['roll'])
-        self.ping_data_dict[ch_num]['pitch'].append(datagram['pitch'])
-        self.ping_data_dict[ch_num]['temperature'].append(datagram['temperature'])
-        self.ping_data_dict[ch_num]['heading'].append(datagram['heading'])
-
-    def _read_datagrams(self, fid):
+    def _read_datagrams(self, fid, end_offset=None):
         """
         Read various datagrams until the end of a ``.raw`` file.
 
@@ -96,6 +84,9 @@ class ConvertEK60(ConvertBase):
         ----------
         fid
             a RawSimradFile file object opened in ``self.load_ek60_raw()``
+        end_offset : int
+            stop before the datagram at this byte offset instead of at the end of the file.
+            Used to read a file in chunks of pings.
         """
         num_datagrams_parsed = 0
         tmp_num_ch_per_ping_parsed = 0  # number of channels of the same ping parsed
@@ -104,11 +95,14 @@ class ConvertEK60(ConvertBase):
         tmp_datagram_dict = []  # tmp list of datagrams, only saved to actual output
                                 # structure if data from all freq channels are present
 
-        while True:
-            try:
-                new_datagram = fid.read(1)
-            except SimradEOF:
-                break
+        nmea_times, nmea_strings = [], []   # NMEA datagrams to add to self.nmea_data
+
+        # Jump straight to the datagrams of interest using the datagram index,
+        # which is cached next to the raw file so that repeat conversions skip the scan
+        # Datagrams outside the time window or of other channels are skipped without being decoded
+        for new_datagram in fid.iter_indexed_dgrams(types=DGRAM_TYPES, start_time=self._start_time,
+                                                    end_time=self._end_time, end_offset=end_offset,
+                                                    channels=list(self._channel_map)):
 
             # Convert the timestamp to a datetime64 object.
             new_datagram['timestamp'] = np.datetime64(new_datagram['timestamp'].replace(tzinfo=None), '[ms]')
@@ -117,7 +111,7 @@ class ConvertEK60(ConvertBase):
 
             # RAW datagrams store raw acoustic data for a channel
             if new_datagram['type'].startswith('RAW'):
-                curr_ch_num = new_datagram['channel']
+                curr_ch_num = self._channel_map[new_datagram['channel']]
 
                 # Reset counter and storage for parsed number of channels
                 # if encountering datagram from the first channel
@@ -142,18 +136,17 @@ class ConvertEK60(ConvertBase):
                         # the channel number as stored in config_datagram['transceivers'].keys()
                         if self.config_datagram['transceivers'][ch_seq+1]['frequency'] \
                                 == tmp_datagram_dict[ch_seq]['frequency']:
-                            self._append_channel_ping_data(ch_seq+1, tmp_datagram_dict[ch_seq])  # ping-by-ping metadata
-                            self.power_dict[ch_seq+1].append(tmp_datagram_dict[ch_seq]['power'])  # append power data
-                            self.angle_dict[ch_seq+1].append(tmp_datagram_dict[ch_seq]['angle'])  # append angle data
+                            # ping-by-ping metadata, power and angle data
+                            self.ping_data_dict[ch_seq+1].add_ping(tmp_datagram_dict[ch_seq])
                         else:
                             # TODO: need error-handling code here
                             print('Frequency mismatch for data from the same channel number!')
 
             # NME datagrams store ancillary data as NMEA-0817 style ASCII data.
             elif new_datagram['type'].startswith('NME'):
-                # Add the datagram to our nmea_data object.
-                self.nmea_data.add_datagram(new_datagram['timestamp'],
-                                            new_datagram['nmea_string'])
+                # Collect the datagram to add to our nmea_data object in one batch.
+                nmea_times.append(new_datagram['timestamp'])
+                nmea_strings.append(new_datagram['nmea_string'])
 
             # TAG datagrams contain time-stamped annotations inserted via the recording software
             elif new_datagram['type'].startswith('TAG'):
@@ -171,51 +164,59 @@ class ConvertEK60(ConvertBase):
             else:
                 print("Unknown datagram type: " + str(new_datagram['type']))
 
+        self.nmea_data.add_datagrams(nmea_times, nmea_strings)
+
     def split_by_range_group(self):
-        """Split ping_time, power_dict, angle_dict, tx_sig by range_group.
+        """Split ping_time, power, angle, tx_sig by range_group.
 
         This is to deal with cases when there is a switch of range_bin size in the middle of the file.
         """
         # Find out the number of range_bin groups in power data
-        # since there are files with a clear switch of length of range_bin in the middle
-        range_bin_lens = [len(l) for l in self.power_dict[1]]
-        uni, uni_inv, uni_cnt = np.unique(range_bin_lens, return_inverse=True, return_counts=True)
+        # since there are files with a clear switch of length of range_bin in the middle.
+        # Consecutive pings with the same length of range_bin form a range_bin group.
+        range_bin_lens = self.ping_data_dict[1].n_samples
+        uni_cnt_insert = np.concatenate([[0], np.flatnonzero(np.diff(range_bin_lens)) + 1, [range_bin_lens.size]])
+        uni = range_bin_lens[uni_cnt_insert[:-1]]
 
         # Initialize dictionaries. keys are index for ranges. values are dictionaries with keys for each freq
-        uni_cnt_insert = np.cumsum(np.insert(uni_cnt, 0, 0))
         beam_type = np.array([x['beam_type'] for x in self.config_datagram['transceivers'].values()])
+        num_ch = len(self.ping_data_dict)
+        self.ping_slices = []
         for range_group in range(len(uni)):
-            self.ping_time_split[range_group] = np.array(self.ping_time)[uni_cnt_insert[range_group]:
-                                                                         uni_cnt_insert[range_group+1]]
-            range_bin_freq_lens = np.unique(
-                [x_val[uni_cnt_insert[range_group]].shape for x_val in self.power_dict.values()])
-            self.angle_dict_split[range_group] = np.empty(
-                (len(self.power_dict), uni_cnt_insert[range_group + 1] - uni_cnt_insert[range_group],
-                 range_bin_freq_lens.max(), 2))
-            self.angle_dict_split[range_group][:] = np.nan
-            if len(range_bin_freq_lens) != 1:  # different frequency channels have different range_bin lengths
-                tmp_power_pad, tmp_angle_pad = [], []
-                for x_p, x_a in zip(self.power_dict.values(), self.angle_dict.values()):  # pad nan to shorter channels
-                    tmp_p_data = np.array(x_p[uni_cnt_insert[range_group]:uni_cnt_insert[range_group + 1]])
-                    tmp_a_data = np.array(x_a[uni_cnt_insert[range_group]:uni_cnt_insert[range_group + 1]])
-                    tmp_power = np.pad(tmp_p_data.astype('float64'),
-                                       ((0, 0), (0, range_bin_freq_lens.max()-tmp_p_data.shape[1])),
-                                       mode='constant', constant_values=(np.nan,))
-                    tmp_angle = np.pad(tmp_a_data.astype('float64'),
-                                       ((0, 0), (0, range_bin_freq_lens.max()-tmp_a_data.shape[1]), (0, 0)),
-                                       mode='constant', constant_values=(np.nan,))
-                    tmp_power_pad.append(tmp_power)
-                    tmp_angle_pad.append(tmp_angle)
-                self.angle_dict_split[range_group] = np.array(tmp_angle_pad)
-                self.power_dict_split[range_group] = np.array(tmp_power_pad) * INDEX2POWER
+            ping_slice = slice(uni_cnt_insert[range_group], uni_cnt_insert[range_group + 1])
+            self.ping_slices.append(ping_slice)
+            num_pings = ping_slice.stop - ping_slice.start
+            self.ping_time_split[range_group] = np.array(self.ping_time)[ping_slice]
+            range_bin_freq_lens = np.array([x.n_samples[ping_slice.start] for x in self.ping_data_dict.values()])
+            num_range_bin = range_bin_freq_lens.max()
+            # Packed data keep the indexed power and angles, unpacked data are converted to float
+            if self._packed:
+                self.angle_dict_split[range_group] = np.full((num_ch, num_pings, num_range_bin, 2),
+                                                             ANGLE_FILL_VALUE, dtype='int16')
+                self.power_dict_split[range_group] = np.full((num_ch, num_pings, num_range_bin),
+                                                             POWER_FILL_VALUE, dtype='int16')
+                power_scale = 1
             else:
-                self.power_dict_split[range_group] = np.array(
-                    [x[uni_cnt_insert[range_group]:uni_cnt_insert[range_group + 1]]
-                     for x_key, x in self.power_dict.items()]) * INDEX2POWER
+                self.angle_dict_split[range_group] = np.full((num_ch, num_pings, num_range_bin, 2), np.nan)
+                self.power_dict_split[range_group] = np.full((num_ch, num_pings, num_range_bin), np.nan)
+                power_scale = INDEX2POWER
+            if np.unique(range_bin_freq_lens).size != 1:  # different frequency channels have different range_bin lengths
+                for ch_seq, (x, x_len) in enumerate(zip(self.ping_data_dict.values(), range_bin_freq_lens)):
+                    # pad nan to shorter channels
+                    np.multiply(x.power[ping_slice, :x_len], power_scale,
+                                out=self.power_dict_split[range_group][ch_seq, :, :x_len], casting='unsafe')
+                    if x.has_angle:
+                        self.angle_dict_split[range_group][ch_seq, :, :x_len, :] = x.angle[ping_slice, :x_len, :]
+            else:
+                for ch_seq, x in enumerate(self.ping_data_dict.values()):
+                    np.multiply(x.power[ping_slice, :num_range_bin], power_scale,
+                                out=self.power_dict_split[range_group][ch_seq], casting='unsafe')
                 for ch in np.argwhere(beam_type == 1):   # if split-beam
-                    self.angle_dict_split[range_group][ch, :, :, :] = np.array(
-                        self.angle_dict[ch[0]+1][uni_cnt_insert[range_group]:uni_cnt_insert[range_group + 1]])
-            self.tx_sig[range_group] = defaultdict(lambda: np.zeros(shape=(tx_num,), dtype='float32'))
+                    self.angle_dict_split[range_group][ch, :, :, :] = \
+                        self.ping_data_dict[ch[0]+1].angle[ping_slice, :num_range_bin, :]
+            # A picklable default, parsed data are sent back from worker processes when combining files
+            tx_num = self.config_datagram['transceiver_count']
+            self.tx_sig[range_group] = defaultdict(partial(np.zeros, shape=(tx_num,), dtype='float32'))
 
         pulse_length, transmit_power, bandwidth, sample_interval = [], [], [], []
         param = [pulse_length, transmit_power, bandwidth, sample_interval]
@@ -237,6 +238,43 @@ class ConvertEK60(ConvertBase):
 
         self.range_lengths = uni  # used in looping when saving files with different range_bin numbers
 
+    def _read_config(self, fid):
+        """Read the configuration datagrams at the start of a ``.raw`` file.
+
+        Parameters
+        ----------
+        fid
+            a RawSimradFile file object opened at the start of the file
+        """
+        # Read the CON0 configuration datagram. Only keep 1 if multiple files
+        if self.config_datagram is None:
+            self.config_datagram = fid.read(1)
+            self.config_datagram['timestamp'] = np.datetime64(
+                self.config_datagram['timestamp'].replace(tzinfo=None), '[ms]')
+
+            # Only keep the selected channels, numbered from 1 in the order of the file
+            transceivers = self.config_datagram['transceivers']
+            ch_ids = self._select_channels([x['channel_id'] for x in transceivers.values()],
+                                           [x['frequency'] for x in transceivers.values()])
+            self._channel_map = {ch_num: i + 1 for i, ch_num in enumerate(
+                [ch_num for ch_num, x in transceivers.items() if x['channel_id'] in ch_ids])}
+            self.config_datagram['transceivers'] = {self._channel_map[ch_num]: transceivers[ch_num]
+                                                    for ch_num in self._channel_map}
+            self.config_datagram['transceiver_count'] = len(self._channel_map)
+
+            for ch_num in self.config_datagram['transceivers'].keys():
+                self.ping_data_dict[ch_num] = PingData(
+                    frequency=self.config_datagram['transceivers'][ch_num]['frequency'])
+        else:
+            tmp_config = fid.read(1)
+
+        # Check if reading an ME70 file with a CON1 datagram.
+        next_datagram = fid.peek()
+        if next_datagram == 'CON1':
+            self.CON1_datagram = fid.read(1)
+        else:
+            self.CON1_datagram = None
+
     def load_ek60_raw(self, raw):
         """Method to parse the EK60 ``.raw`` data file.
 
@@ -250,34 +288,28 @@ class ConvertEK60(ConvertBase):
         """
         print('%s  converting file: %s' % (dt.now().strftime('%H:%M:%S'), os.path.basename(raw)))
 
-        with RawSimradFile(raw, 'r') as fid:
-            # Read the CON0 configuration datagram. Only keep 1 if multiple files
-            if self.config_datagram is None:
-                self.config_datagram = fid.read(1)
-                self.config_datagram['timestamp'] = np.datetime64(
-                    self.config_datagram['timestamp'].replace(tzinfo=None), '[ms]')
-
-                for ch_num in self.config_datagram['transceivers'].keys():
-                    self.ping_data_dict[ch_num] = defaultdict(list)
-                    self.ping_data_dict[ch_num]['frequency'] = \
-                        self.config_datagram['transceivers'][ch_num]['frequency']
-                    self.power_dict[ch_num] = []
-                    self.angle_dict[ch_num] = []
-            else:
-                tmp_config = fid.read(1)
+        with stage('parse', file=os.path.basename(raw)) as record, \
+                RawSimradFile(raw, 'r', use_mmap=True) as fid:
+            self._read_config(fid)
 
-            # Check if reading an ME70 file with a CON1 datagram.
-            next_datagram = fid.peek()
-            if next_datagram == 'CON1':
-                self.CON1_datagram = fid.read(1)
-            else:
-                self.CON1_datagram = None
+            # Preallocate ping storage using the number of RAW datagrams of each channel
+            index = fid.get_index()
+            raw_dgrams = fid.select_dgrams(['RAW0'], self._start_time, self._end_time)
+            num_raw = np.bincount(index['channel'][raw_dgrams], minlength=max(self._channel_map) + 1)
+            for file_ch_num, ch_num in self._channel_map.items():
+                self.ping_data_dict[ch_num].reserve(num_raw[file_ch_num])
 
             # Read the rest of datagrams
             self._read_datagrams(fid)
+            record.add(n_bytes_read=os.path.getsize(raw), n_datagrams=len(index), n_pings=len(self.ping_time))
+
+        # Trim excess allocated pings
+        for ping_data in self.ping_data_dict.values():
+            ping_data.trim()
 
         # Split data based on range_group (when there is a switch of range_bin in the middle of a file)
-        self.split_by_range_group()
+        with stage('split_by_range_group', file=os.path.basename(raw)):
+            self.split_by_range_group()
 
         # Trim excess data from NMEA object
         self.nmea_data.trim()
@@ -361,12 +393,7 @@ class ConvertEK60(ConvertBase):
         out_dict['water_level'] = np.int32(0)
 
         # Read lat/long from NMEA datagram
-        idx_loc = np.argwhere(np.isin(self.nmea_data.messages, ['GGA', 'GLL', 'RMC'])).squeeze()
-        # TODO: use NaN when nmea_msg is empty
-        nmea_msg = []
-        [nmea_msg.append(pynmea2.parse(self.nmea_data.raw_datagrams[x])) for x in idx_loc]
-        out_dict['lat'] = np.array([x.latitude for x in nmea_msg])
-        out_dict['lon'] = np.array([x.longitude for x in nmea_msg])
+        idx_loc, out_dict['lat'], out_dict['lon'] = self.nmea_data.get_positions()
         out_dict['location_time'] = self.nmea_data.nmea_times[idx_loc]
 
         if len(self.range_lengths) > 1:
@@ -401,6 +428,19 @@ class ConvertEK60(ConvertBase):
         beam_dict['ping_time'] = self.ping_time_split[piece_seq]   # [seconds since 1900-01-01] for xarray.to_netcdf conversion
         beam_dict['backscatter_r'] = self.power_dict_split[piece_seq]  # dimension [freq x ping_time x range_bin]
         beam_dict['angle_dict'] = self.angle_dict_split[piece_seq]
+        # CF attributes to decode packed data when read
+        if self._packed:
+            # Power is stored with the full int16 range, a fill value is only declared
+            # when some samples are padded, where the lowest recorded power also reads as NaN
+            power_attrs = {'scale_factor': INDEX2POWER}
+            range_bin_freq_lens = [x.n_samples[self.ping_slices[piece_seq].start]
+                                   for x in self.ping_data_dict.values()]
+            if self._pad_power or len(set(range_bin_freq_lens)) > 1:
+                power_attrs['_FillValue'] = POWER_FILL_VALUE
+            beam_dict['packed_attrs'] = {'backscatter_r': power_attrs,
+                                         'angle': {'_FillValue': ANGLE_FILL_VALUE}}
+        else:
+            beam_dict['packed_attrs'] = {'backscatter_r': {}, 'angle': {}}
 
         # Additional coordinate variables added by echopype for storing data as a cube with
         # dimensions [frequency x ping_time x range_bin]
@@ -408,6 +448,9 @@ class ConvertEK60(ConvertBase):
                             for x in self.config_datagram['transceivers'].keys()], dtype='float32')
         beam_dict['frequency'] = freq
         beam_dict['range_bin'] = np.arange(self.power_dict_split[piece_seq].shape[2])
+        if self._pad_range_bin:
+            beam_dict['sample_count'] = np.array([x.n_samples[self.ping_slices[piece_seq]]
+                                                  for x in self.ping_data_dict.values()], dtype='int32')
 
         # Loop through each transducer for channel-specific variables
         param_numerical = {"beamwidth_receive_major": "beamwidth_alongship",
@@ -507,43 +550,65 @@ class ConvertEK60(ConvertBase):
 
     def _set_groups(self, raw_file, out_file, save_settings):
         # Create SetGroups object
+        # Files with range_bin groups padded to the longest range_bin are saved like combined files
+        combine_nc = (save_settings['combine_opt'] or
+                      (save_settings['pad_range_bin'] and len(self.range_lengths) > 1)) and \
+            os.path.splitext(out_file)[1] == '.nc'
         grp = SetGroups(file_path=out_file, echo_type='EK60',
-                        compress=save_settings['compress'], append_zarr=self._append_zarr)
+                        compress=save_settings['compress'], append_zarr=self._append_zarr,
+                        combine_nc=combine_nc, append_nc=self._append_nc)
         grp.set_toplevel(self._set_toplevel_dict(raw_file))  # top-level group
         grp.set_env(self._set_env_dict())            # environment group
         grp.set_provenance(self._set_prov_dict(raw_file, save_settings['combine_opt']))    # provenance group
         grp.set_sonar(self._set_sonar_dict())        # sonar group
+        if len(self.range_lengths) > 1 and (combine_nc or save_settings['pad_range_bin']):
+            # All range_bin groups are appended to the same file, padded to the longest range_bin
+            self.all_files = [out_file] * len(self.range_lengths)
+            # The Beam group is saved first, so that a file that cannot be combined is not partly appended
+            append_nc, append_zarr = grp.append_nc, grp.append_zarr
+            for piece in range(len(self.range_lengths)):
+                beam_dict = self._set_beam_dict(out_file, piece_seq=piece)
+                beam_dict['overwrite_beam'] = False
+                grp.set_beam(beam_dict)
+                # Following range_bin groups are appended to the Beam group
+                grp.append_nc = grp.format == '.nc'
+                grp.append_zarr = grp.format == '.zarr'
+            grp.append_nc, grp.append_zarr = append_nc, append_zarr
+            platform_dict = self._set_platform_dict(out_file)
+            nmea_dict = self._set_nmea_dict(out_file)
+            for out_dict in (platform_dict, nmea_dict):
+                del out_dict['ping_slice']
+                out_dict['overwrite_plat'] = False
+            grp.set_platform(platform_dict)
+            grp.set_nmea(nmea_dict)
+            return
         if len(self.range_lengths) > 1:
             self.copyfiles(out_file, save_settings['overwrite'])
         for piece in range(len(self.range_lengths)):
             grp.set_beam(self._set_beam_dict(out_file, piece_seq=piece))          # beam group
             grp.set_platform(self._set_platform_dict(out_file, piece_seq=piece))  # platform group
             grp.set_nmea(self._set_nmea_dict(out_file, piece_seq=piece))          # platform/NMEA group
+            grp.append_nc = combine_nc
 
     def _export_nc(self, save_settings, file_idx=0):
         """
         Saves parsed raw files to a NetCDF file.
-        NetCDF files created by combining multiple raw files are saved to a temporary folder and
-        merged after all raw file conversion has been completed due to limitations to appending
-        to a NetCDF file with xarray.
+        Raw files combined into 1 NetCDF file are appended to it in place,
+        along unlimited dimensions created when saving the first raw file.
         """
-        # self._temp_path exists if combining multiple files into 1 .nc file
-        if self._temp_path:
-            out_file = self._temp_path[file_idx]
-        else:
-            # If there are multiple files, self.save_path is a list otherwise it is a string
-            out_file = self.save_path[file_idx] if type(self.save_path) == list else self.save_path
+        # If there are multiple files, self.save_path is a list otherwise it is a string
+        out_file = self.save_path[file_idx] if type(self.save_path) == list else self.save_path
         raw_file = self.filename[file_idx]
 
         # Check if out_file file already exists
         # Deletes it if overwrite is true
-        if os.path.exists(out_file) and save_settings['overwrite']:
+        if os.path.exists(out_file) and save_settings['overwrite'] and not self._append_nc:
             print("          overwriting: " + out_file)
             os.remove(out_file)
         # Check if nc file already exists
         # ... if yes, abort conversion and issue warning
         # ... if not, continue with conversion
-        if os.path.exists(out_file):
+        if os.path.exists(out_file) and not self._append_nc:
             print(f'          ... this file has already been converted to .nc, conversion not executed.')
         else:
             self._set_groups(raw_file, out_file, save_settings=save_settings)
@@ -574,47 +639,154 @@ class ConvertEK60(ConvertBase):
         else:
             self._set_groups(raw_file, out_file, save_settings=save_settings)
 
-    def _combine_files(self):
-        # Do nothing if combine_opt is true if there is nothing to combine
-        if not self._temp_path:
-            return
-        save_path = self.save_path
-        split = os.path.splitext(self.save_path)
-        all_temp = os.listdir(self._temp_dir)
-        file_groups = [[]]
-        # Split the files in the temp directory into range_bin groups
-        i = 0
-        while i < len(all_temp):
-            file_groups[-1].append(os.path.join(self._temp_dir, all_temp[i]))
-            if "_part" in all_temp[i]:
-                i += 1
-                file_groups.append([os.path.join(self._temp_dir, all_temp[i])])
-            i += 1
-        for n, file_group in enumerate(file_groups):
-            if len(file_groups) > 1:
-                # Construct a new path with _part[n] if there are multiple range_bin lengths
-                save_path = split[0] + '_part%02d' % (n + 1) + split[1]
-            # Open multiple files as one dataset of each group and save them into a single file
-            with xr.open_dataset(file_group[0]) as ds_top:
-                ds_top.to_netcdf(path=save_path, mode='w')
-            with xr.open_dataset(file_group[0], group='Provenance') as ds_prov:
-                ds_prov.to_netcdf(path=save_path, mode='a', group='Provenance')
-            with xr.open_dataset(file_group[0], group='Sonar') as ds_sonar:
-                ds_sonar.to_netcdf(path=save_path, mode='a', group='Sonar')
-            with xr.open_mfdataset(file_group, group='Beam', combine='by_coords', data_vars='minimal') as ds_beam:
-                ds_beam.to_netcdf(path=save_path, mode='a', group='Beam')
-            with xr.open_dataset(file_group[0], group='Environment') as ds_env:
-                ds_env.to_netcdf(path=save_path, mode='a', group='Environment')
-            with xr.open_mfdataset(file_group, group='Platform', combine='by_coords') as ds_plat:
-                ds_plat.to_netcdf(path=save_path, mode='a', group='Platform')
-            with xr.open_mfdataset(file_group, group='Platform/NMEA',
-                                   combine='nested', concat_dim='time', decode_times=False) as ds_nmea:
-                ds_nmea.to_netcdf(path=save_path, mode='a', group='Platform/NMEA')
-
-        # Delete temporary folder:
-        shutil.rmtree(self._temp_dir)
-
-    def save(self, file_format, save_path=None, combine_opt=False, overwrite=False, compress=True):
+    def _export_zarr_stream(self, save_settings, file_idx=0):
+        """
+        Parse a raw file and save it to Zarr in chunks of ``ping_chunk_size`` pings.
+
+        Each chunk is appended to the Beam, Platform and Platform/NMEA groups as soon as it
+        is parsed, so that memory use does not grow with the size of the raw file.
+        As when saving a whole file, a new ``_partXX`` file is started whenever the length
+        of range_bin changes, unless the data are padded to the longest range_bin.
+        """
+        out_file = self.save_path[file_idx] if type(self.save_path) == list else self.save_path
+        raw_file = self.filename[file_idx]
+        ping_chunk_size = save_settings['ping_chunk_size']
+
+        # Continue the last file written if combining raw files into 1 zarr file
+        if self._append_zarr and self._zarr_split:
+            parts = self._zarr_split
+        else:
+            if os.path.exists(out_file) and save_settings['overwrite']:
+                print("          overwriting: " + out_file)
+                shutil.rmtree(out_file)
+            if os.path.exists(out_file):
+                print(f'          ... this file has already been converted to .zarr, conversion not executed.')
+                return
+            parts = []
+            self._zarr_split = parts
+        range_bin_len = zarr.open_group(parts[-1], mode='r')['Beam/range_bin'].shape[0] if parts else None
+
+        print('%s  converting file in chunks of %d pings: %s' %
+              (dt.now().strftime('%H:%M:%S'), ping_chunk_size, os.path.basename(raw_file)))
+        self.reset_vars('EK60')
+        with RawSimradFile(raw_file, 'r', use_mmap=True) as fid:
+            self._read_config(fid)
+
+            for end_offset in fid.get_chunk_offsets(ping_chunk_size) + [None]:
+                for ping_data in self.ping_data_dict.values():
+                    ping_data.reserve(ping_chunk_size)
+                with stage('parse', file=os.path.basename(raw_file)) as record:
+                    self._read_datagrams(fid, end_offset)
+                    record.add(n_pings=len(self.ping_time))
+                if not self.ping_time:
+                    continue
+                for ping_data in self.ping_data_dict.values():
+                    ping_data.trim()
+                with stage('split_by_range_group', file=os.path.basename(raw_file)):
+                    self.split_by_range_group()
+                self.nmea_data.trim()
+
+                self.all_files = []
+                for piece in range(len(self.range_lengths)):
+                    if save_settings['pad_range_bin']:
+                        new_part = not parts
+                    else:
+                        new_part = self.power_dict_split[piece].shape[2] != range_bin_len
+                    if new_part:
+                        range_bin_len = self.power_dict_split[piece].shape[2]
+                        parts.append(self._new_zarr_part(out_file, parts, save_settings['overwrite']))
+                    self.all_files.append(parts[-1])
+                    self._write_zarr_chunk(raw_file, parts[-1], piece, save_settings, new_part)
+
+                # Drop the saved chunk and keep the configuration for the next one
+                self.ping_data_dict = {ch_num: PingData(frequency=ping_data.frequency)
+                                       for ch_num, ping_data in self.ping_data_dict.items()}
+                self.ping_time = []
+                self.nmea_data = NMEAData()
+                self.ping_time_split = {}
+                self.power_dict_split = {}
+                self.angle_dict_split = {}
+                self.tx_sig = {}
+
+    def _new_zarr_part(self, out_file, parts, overwrite=False):
+        """Return the path of the next file of a streamed conversion.
+
+        The first file is ``out_file`` itself. It is renamed to ``_part01``
+        once a second file with a different range_bin length is needed.
+        """
+        if not parts:
+            return out_file
+        split = os.path.splitext(out_file)
+        if len(parts) == 1:
+            new_path = split[0] + '_part01' + split[1]
+            if os.path.exists(new_path) and overwrite:
+                shutil.rmtree(new_path)
+            os.rename(parts[0], new_path)
+            parts[0] = new_path
+            print("          splitting into: ")
+            print("                " + new_path)
+        new_path = split[0] + '_part%02d' % (len(parts) + 1) + split[1]
+        if os.path.exists(new_path) and overwrite:
+            shutil.rmtree(new_path)
+        print("                " + new_path)
+        return new_path
+
+    def _write_zarr_chunk(self, raw_file, path, piece, save_settings, new_part):
+        """Save one range_bin group of a chunk of pings to a zarr file.
+
+        All groups are created if ``new_part`` is True. Otherwise the pings are appended
+        to the Beam, Platform and Platform/NMEA groups.
+        """
+        grp = SetGroups(file_path=path, echo_type='EK60',
+                        compress=save_settings['compress'], append_zarr=not new_part)
+        if new_part:
+            grp.set_toplevel(self._set_toplevel_dict(raw_file))
+            grp.set_env(self._set_env_dict())
+            grp.set_provenance(self._set_prov_dict(raw_file, save_settings['combine_opt']))
+            grp.set_sonar(self._set_sonar_dict())
+        beam_dict = self._set_beam_dict(path, piece_seq=piece)
+        beam_dict['overwrite_beam'] = False
+        grp.set_beam(beam_dict)
+        platform_dict = self._set_platform_dict(path, piece_seq=piece)
+        platform_dict['overwrite_plat'] = False
+        grp.set_platform(platform_dict)
+        grp.set_nmea(self._set_nmea_dict(path, piece_seq=piece))
+
+    def _parse_file(self, file_format, file_idx, save_settings):
+        """Parse the raw file ``self.filename[file_idx]``, see ``ConvertBase._parse_file``.
+        """
+        file = self.filename[file_idx]
+        # Reset instance variables for each raw file. Always reset if there is more than 1 file being parsed
+        if file_idx > 0 or len(self.filename) > 1:
+            self.reset_vars('EK60')
+        # Load data if it has not already been loaded. Streamed conversion reads the file itself.
+        if not self.ping_data_dict and not (file_format == '.zarr' and save_settings['ping_chunk_size']):
+            self.load_ek60_raw(file)
+            if not self.ping_time:
+                print('%s  no complete pings in the selected time window, file not converted: %s' %
+                      (dt.now().strftime('%H:%M:%S'), os.path.basename(file)))
+                return False
+        return True
+
+    def _save_file(self, file_format, file_idx, save_settings):
+        """Save the parsed raw file ``self.filename[file_idx]`` to netCDF4 or Zarr.
+        """
+        # multiple raw files are saved differently between the .nc and .zarr formats
+        if file_format == '.nc':
+            # Sets flag for combining raw files into 1 nc file
+            self._append_nc = file_idx > save_settings['first_file_idx'] and save_settings['combine_opt']
+            self._export_nc(save_settings, file_idx)
+        elif file_format == '.zarr':
+            # Sets flag for combining raw files into 1 zarr file
+            self._append_zarr = file_idx > save_settings['first_file_idx'] and save_settings['combine_opt']
+            if save_settings['ping_chunk_size']:
+                self._export_zarr_stream(save_settings, file_idx)
+            else:
+                self._export_zarr(save_settings, file_idx)
+
+    def save(self, file_format, save_path=None, combine_opt=False, overwrite=False, compress=True,
+             n_workers=1, ping_chunk_size=None, start_time=None, end_time=None, channels=None, frequencies=None,
+             packed=False, pad_range_bin=False):
         """Save data from .raw format to a netCDF4 or Zarr file
 
         Parameters
@@ -632,23 +804,25 @@ class ConvertEK60(ConvertBase):
             Whether or not to overwrite the file if the output path already exists.
         compress : bool
             Whether or not to compress backscatter data. Defaults to `True`
+        n_workers : int
+            Number of processes used to convert multiple files in parallel. Defaults to 1.
+        ping_chunk_size : int
+            If given, parse and save each raw file in chunks of this many pings
+            so that memory use stays bounded. Only used when saving to Zarr.
+        start_time, end_time, channels, frequencies
+            Time window and channels to convert, see ``raw2nc``.
+        packed : bool
+            Whether to store power and angles as int16 with CF scale factors, see ``raw2nc``.
+        pad_range_bin : bool
+            Whether to save pings with different range_bin lengths to one file, see ``raw2nc``.
             """
-        save_settings = dict(combine_opt=combine_opt, overwrite=overwrite, compress=compress)
+        save_settings = dict(combine_opt=combine_opt, overwrite=overwrite, compress=compress,
+                             ping_chunk_size=ping_chunk_size, pad_range_bin=pad_range_bin)
+        # Data already parsed with another selection or packing are parsed again
+        if self._set_selection(start_time, end_time, channels, frequencies) | (packed != self._packed):
+            self.reset_vars('EK60')
+        self._packed = packed
+        self._pad_power = combine_opt or pad_range_bin or (file_format == '.zarr' and bool(ping_chunk_size))
+        self._pad_range_bin = pad_range_bin
         self.validate_path(save_path, file_format, combine_opt)
-        # Loop over all files being parsed
-        for file_idx, file in enumerate(self.filename):
-            # Reset instance variables for each raw file. Always reset if there is more than 1 file being parsed
-            if file_idx > 0 or len(self.filename) > 1:
-                self.reset_vars('EK60')
-            # Load data if it has not already been loaded.
-            if not self.power_dict:
-                self.load_ek60_raw(file)
-            # multiple raw files are saved differently between the .nc and .zarr formats
-            if file_format == '.nc':
-                self._export_nc(save_settings, file_idx)
-            elif file_format == '.zarr':
-                # Sets flag for combining raw files into 1 zarr file
-                self._append_zarr = True if file_idx and combine_opt else False
-                self._export_zarr(save_settings, file_idx)
-        if combine_opt and file_format == '.nc':
-            self._combine_files()
+        self._convert_files(file_format, save_settings, 'EK60', n_workers)
@@ -7,16 +7,14 @@ import re
 import shutil
 from collections import defaultdict
 import numpy as np
-import xarray as xr
-import netCDF4
 from datetime import datetime as dt
 import pytz
-import pynmea2
 from .._version import get_versions
 from .utils.ek_raw_io import RawSimradFile, SimradEOF
 from .utils.nmea_data import NMEAData
 from .utils.set_groups import SetGroups
 from .convertbase import ConvertBase
+from ..utils.profiling import stage
 ECHOPYPE_VERSION = get_versions()['version']
 del get_versions
 
@@ -28,6 +26,11 @@ del get_versions
 #  postfix: so far only saw Saildrone that produces filename with postfix
 FILENAME_MATCHER_STR = '(?P<survey>.+)?-?D(?P<date>\w{1,8})-T(?P<time>\w{1,6})-?(?P<postfix>\w+)?.raw'
 
+# Types of datagrams read from EK80 files after the configuration datagram besides RAW datagrams,
+# with and without a time window
+TIMED_DGRAM_TYPES = ['NME', 'MRU']
+UNTIMED_DGRAM_TYPES = ['XML', 'FIL']
+
 
 class ConvertEK80(ConvertBase):
     """Class for converting EK80 ``.raw`` files.
@@ -52,9 +55,10 @@ class ConvertEK80(ConvertBase):
         self.fil_df = defaultdict(dict)       # Dictionary to store filter decimation factors
         self.ch_ids = []                      # List of all channel ids
         self.recorded_ch_ids = []
+        self._index_channels = None   # numbers of the selected channels in the datagram index
         self.timestamp_pattern = re.compile(regex)
 
-    def _read_datagrams(self, fid):
+    def _read_datagrams(self, fid, end_offset=None):
         """
         Read various datagrams until the end of a ``.raw`` file.
 
@@ -64,16 +68,19 @@ class ConvertEK80(ConvertBase):
         Parameters
         ----------
         fid
-            a RawSimradFile file object opened in ``self.load_ek60_raw()``
+            a RawSimradFile file object opened in ``self.load_ek80_raw()``
+        end_offset : int
+            stop before the datagram at this byte offset instead of at the end of the file.
+            Used to read a file in chunks of pings.
         """
 
         num_datagrams_parsed = 0
 
-        while True:
-            try:
-                new_datagram = fid.read(1)
-            except SimradEOF:
-                break
+        nmea_times, nmea_strings = [], []   # NMEA datagrams to add to self.nmea_data
+
+        # Jump straight to the datagrams of interest using the datagram index,
+        # which is cached next to the raw file so that repeat conversions skip the scan
+        for new_datagram in fid.read_dgrams(self._select_dgrams(fid, end_offset)):
 
             num_datagrams_parsed += 1
 
@@ -134,9 +141,9 @@ class ConvertEK80(ConvertBase):
 
             # NME datagrams store ancillary data as NMEA-0817 style ASCII data.
             elif new_datagram['type'].startswith("NME"):
-                # Add the datagram to our nmea_data object.
-                self.nmea_data.add_datagram(new_datagram['timestamp'],
-                                            new_datagram['nmea_string'])
+                # Collect the datagram to add to our nmea_data object in one batch.
+                nmea_times.append(new_datagram['timestamp'])
+                nmea_strings.append(new_datagram['nmea_string'])
 
             # MRU datagrams contain motion data for each ping
             elif new_datagram['type'].startswith("MRU"):
@@ -151,6 +158,43 @@ class ConvertEK80(ConvertBase):
                 self.fil_coeffs[new_datagram['channel_id']][new_datagram['stage']] = new_datagram['coefficients']
                 self.fil_df[new_datagram['channel_id']][new_datagram['stage']] = new_datagram['decimation_factor']
 
+        self.nmea_data.add_datagrams(nmea_times, nmea_strings)
+
+    def _select_dgrams(self, fid, end_offset=None):
+        """Select the datagrams to read in the time window and of the channels to convert.
+
+        Datagrams outside the time window or of other channels are skipped without being decoded.
+        RAW datagrams are selected by whole pings, using the time of the first datagram of each ping.
+        The environment XML datagram and the FIL datagrams are read regardless of the time window,
+        and each XML parameter datagram is read with the RAW datagram following it.
+
+        Parameters
+        ----------
+        fid
+            a RawSimradFile file object
+        end_offset : int
+            only select datagrams before this byte offset
+
+        Returns
+        -------
+        Numbers of the datagrams to read in the datagram index
+        """
+        index = fid.get_index()
+        raw = fid.select_dgrams(['RAW'], end_offset=end_offset, channels=self._index_channels)
+        if raw.size and (self._start_time is not None or self._end_time is not None):
+            # A ping starts with a RAW datagram of the channel of the first RAW datagram in the file
+            all_raw = np.flatnonzero(np.char.startswith(index['type'], b'RAW'))
+            first_ch = index['channel'][all_raw[0]]
+            ping_starts = all_raw[index['channel'][all_raw] == first_ch]
+            in_window = fid.select_dgrams(['RAW'], self._start_time, self._end_time, channels=[first_ch])
+            raw = raw[np.isin(ping_starts[np.searchsorted(ping_starts, raw, side='right') - 1], in_window)]
+        other = fid.select_dgrams(TIMED_DGRAM_TYPES, self._start_time, self._end_time, end_offset)
+        untimed = fid.select_dgrams(UNTIMED_DGRAM_TYPES, end_offset=end_offset, channels=self._index_channels)
+        before_raw = np.char.startswith(index['type'][np.minimum(untimed + 1, len(index) - 1)], b'RAW') & \
+            (untimed + 1 < len(index))
+        untimed = untimed[~before_raw | np.isin(untimed + 1, raw)]
+        return np.union1d(np.union1d(raw, other), untimed)
+
     def load_ek80_raw(self, raw):
         """Method to parse the EK80 ``.raw`` data file.
 
@@ -164,41 +208,80 @@ class ConvertEK80(ConvertBase):
         """
         print('%s  converting file: %s' % (dt.now().strftime('%H:%M:%S'), os.path.basename(raw)))
 
-        with RawSimradFile(raw, 'r') as fid:
-            self.config_datagram = fid.read(1)
-            self.config_datagram['timestamp'] = np.datetime64(self.config_datagram['timestamp'], '[ms]')
-
-            # IDs of the channels found in the dataset
-            self.ch_ids = list(self.config_datagram[self.config_datagram['subtype']])
-
-            for ch_id in self.ch_ids:
-                self.ping_data_dict[ch_id] = defaultdict(list)
-                self.ping_data_dict[ch_id]['frequency'] = \
-                    self.config_datagram['configuration'][ch_id]['transducer_frequency']
-                self.power_dict[ch_id] = []
-                self.angle_dict[ch_id] = []
-                self.complex_dict[ch_id] = []
-                self.n_complex_dict[ch_id] = -1
-
-                # Parameters recorded for each frequency for each ping
-                self.parameters[ch_id]['frequency_start'] = []
-                self.parameters[ch_id]['frequency_end'] = []
-                self.parameters[ch_id]['frequency'] = []
-                self.parameters[ch_id]['pulse_duration'] = []
-                self.parameters[ch_id]['pulse_form'] = []
-                self.parameters[ch_id]['sample_interval'] = []
-                self.parameters[ch_id]['slope'] = []
-                self.parameters[ch_id]['transmit_power'] = []
-                self.parameters[ch_id]['timestamp'] = []
+        with stage('parse', file=os.path.basename(raw)) as record, \
+                RawSimradFile(raw, 'r', use_mmap=True) as fid:
+            self._read_config(fid)
 
             # Read the rest of datagrams
             self._read_datagrams(fid)
-            # Remove empty lists
-            for ch_id in self.ch_ids:
-                if all(x is None for x in self.power_dict[ch_id]):
-                    self.power_dict[ch_id] = None
-                if all(x is None for x in self.complex_dict[ch_id]):
-                    self.complex_dict[ch_id] = None
+            self._remove_empty_channels()
+            record.add(n_bytes_read=os.path.getsize(raw), n_datagrams=len(fid.get_index()),
+                       n_pings=len(self.ping_time))
+
+        # Trim excess data from NMEA object
+        self.nmea_data.trim()
+
+    def _read_config(self, fid):
+        """Read the configuration datagram at the start of a ``.raw`` file
+        and set up the storage of each channel.
+
+        Parameters
+        ----------
+        fid
+            a RawSimradFile file object opened at the start of the file
+        """
+        self.config_datagram = fid.read(1)
+        self.config_datagram['timestamp'] = np.datetime64(self.config_datagram['timestamp'], '[ms]')
+
+        # IDs of the channels found in the dataset. Only the selected channels are kept.
+        config = self.config_datagram[self.config_datagram['subtype']]
+        self.ch_ids = self._select_channels(list(config), [x['transducer_frequency'] for x in config.values()])
+        for ch_id in list(config):
+            if ch_id not in self.ch_ids:
+                del config[ch_id]
+        # Numbers of the selected channels in the datagram index
+        self._index_channels = [fid.index_channel_ids.index(ch_id) + 1 for ch_id in self.ch_ids
+                                if ch_id in fid.index_channel_ids]
+
+        for ch_id in self.ch_ids:
+            self.ping_data_dict[ch_id] = defaultdict(list)
+            self.ping_data_dict[ch_id]['frequency'] = \
+                self.config_datagram['configuration'][ch_id]['transducer_frequency']
+            self.n_complex_dict[ch_id] = -1
+        self._reset_ping_data()
+
+    def _reset_ping_data(self):
+        """Empty the storage of ping-by-ping data of all channels.
+        """
+        for ch_id in self.config_datagram[self.config_datagram['subtype']]:
+            self.power_dict[ch_id] = []
+            self.angle_dict[ch_id] = []
+            self.complex_dict[ch_id] = []
+
+            # Parameters recorded for each frequency for each ping
+            self.parameters[ch_id]['frequency_start'] = []
+            self.parameters[ch_id]['frequency_end'] = []
+            self.parameters[ch_id]['frequency'] = []
+            self.parameters[ch_id]['pulse_duration'] = []
+            self.parameters[ch_id]['pulse_form'] = []
+            self.parameters[ch_id]['sample_interval'] = []
+            self.parameters[ch_id]['slope'] = []
+            self.parameters[ch_id]['transmit_power'] = []
+            self.parameters[ch_id]['timestamp'] = []
+        self.ping_time = []
+        self.mru_data = defaultdict(list)
+        self.nmea_data = NMEAData()
+
+    def _remove_empty_channels(self):
+        """Set the power or complex data of channels that did not record them to None
+        and only keep the IDs of channels with data.
+        """
+        # Remove empty lists
+        for ch_id in self.ch_ids:
+            if all(x is None for x in self.power_dict[ch_id]):
+                self.power_dict[ch_id] = None
+            if all(x is None for x in self.complex_dict[ch_id]):
+                self.complex_dict[ch_id] = None
 
         if len(self.ch_ids) != len(self.recorded_ch_ids):
             self.ch_ids = self.recorded_ch_ids
@@ -290,11 +373,7 @@ class ConvertEK80(ConvertBase):
                   'set to None')
 
         # Read lat/long from NMEA datagram
-        idx_loc = np.argwhere(np.isin(self.nmea_data.messages, ['GGA', 'GLL', 'RMC'])).squeeze()
-        nmea_msg = []
-        [nmea_msg.append(pynmea2.parse(self.nmea_data.raw_datagrams[x])) for x in idx_loc]
-        out_dict['lat'] = np.array([x.latitude for x in nmea_msg])
-        out_dict['lon'] = np.array([x.longitude for x in nmea_msg])
+        idx_loc, out_dict['lat'], out_dict['lon'] = self.nmea_data.get_positions()
         out_dict['location_time'] = self.nmea_data.nmea_times[idx_loc]
         return out_dict
 
@@ -490,62 +569,75 @@ class ConvertEK80(ConvertBase):
 
         return out_dict
 
-    def _set_groups(self, raw_file, out_file, save_settings):
-        grp = SetGroups(file_path=out_file, echo_type='EK80',
-                        compress=save_settings['compress'], append_zarr=self._append_zarr)
-        grp.set_toplevel(self._set_toplevel_dict(raw_file))  # top-level group
-        grp.set_env(self._set_env_dict())            # environment group
-        grp.set_provenance(self._set_prov_dict(raw_file, save_settings['combine_opt']))    # provenance group
+    def _beam_groups(self, out_file):
+        """Return the channel IDs, broadband flag and output path of each Beam group.
+
+        If there are both broadband and CW channels, the CW channels are saved to
+        a ``_cw`` file next to ``out_file``.
+        """
+        bb_ch_ids, cw_ch_ids = self.sort_ch_ids()
+        split = os.path.splitext(out_file)
+        beam_groups = []
+        if bb_ch_ids:
+            beam_groups.append((bb_ch_ids, True, out_file))
+        if cw_ch_ids:
+            beam_groups.append((cw_ch_ids, False, split[0] + '_cw' + split[1] if bb_ch_ids else out_file))
+        return beam_groups
+
+    def _set_file_groups(self, grp, raw_file, ch_ids, bb, save_settings, new_file=True):
+        """Save all groups of one output file, with the Beam and Sonar groups of ``ch_ids``.
+
+        The groups shared by the broadband and CW files are written to each of them
+        from the parsed data, instead of copying the file written first.
+        If ``new_file`` is False, only the Beam, Platform and Platform/NMEA groups are saved.
+        The Beam group is saved before the other appended groups, so that a file that
+        cannot be combined is not partly appended.
+        """
+        if new_file:
+            grp.set_toplevel(self._set_toplevel_dict(raw_file))  # top-level group
+            grp.set_env(self._set_env_dict())            # environment group
+            grp.set_provenance(self._set_prov_dict(raw_file, save_settings['combine_opt']))    # provenance group
+        grp.set_beam(self._set_beam_dict(ch_ids, bb=bb, path=grp.file_path))
         grp.set_platform(self._set_platform_dict())  # platform group
         grp.set_nmea(self._set_nmea_dict())          # platform/NMEA group
-        grp.set_vendor(self._set_vendor_dict())      # vendor group
-        """Handles saving the beam and sonar group. These groups a frequency dimension
-        Splits up broadband and continuous wave data into separate files"""
-        bb_ch_ids, cw_ch_ids = self.sort_ch_ids()
-        # If there is both bb and cw data
-        if bb_ch_ids and cw_ch_ids:
-            # Copy the current file into a new file with _cw appended to filename
-            split = os.path.splitext(out_file)
-            new_path = split[0] + '_cw' + split[1]
-            # Do not create _cw file if appendng because it already exists
-            if not self._append_zarr:
-                if split[1] == '.zarr':
-                    shutil.copytree(out_file, new_path)
-                elif split[1] == '.nc':
-                    shutil.copyfile(out_file, new_path)
-            grp.set_beam(self._set_beam_dict(bb_ch_ids, bb=True, path=out_file))
-            grp.set_sonar(self._set_sonar_dict(bb_ch_ids, path=out_file))
-            grp.set_beam(self._set_beam_dict(cw_ch_ids, bb=False, path=new_path))
-            grp.set_sonar(self._set_sonar_dict(cw_ch_ids, path=new_path))
-        # If there is only bb data
-        elif bb_ch_ids:
-            grp.set_beam(self._set_beam_dict(bb_ch_ids, bb=True, path=out_file))
-            grp.set_sonar(self._set_sonar_dict(bb_ch_ids, path=out_file))
-        # If there is only cw data
-        else:
-            grp.set_beam(self._set_beam_dict(cw_ch_ids, bb=False, path=out_file))
-            grp.set_sonar(self._set_sonar_dict(cw_ch_ids, path=out_file))
+        if new_file:
+            grp.set_vendor(self._set_vendor_dict())  # vendor group
+        if new_file:
+            grp.set_sonar(self._set_sonar_dict(ch_ids, path=grp.file_path))
+
+    def _set_groups(self, raw_file, out_file, save_settings):
+        """Save the groups of a parsed raw file.
+
+        Broadband and continuous wave data are saved to separate files, see ``_beam_groups``.
+        """
+        for ch_ids, bb, path in self._beam_groups(out_file):
+            grp = SetGroups(file_path=path, echo_type='EK80',
+                            compress=save_settings['compress'], append_zarr=self._append_zarr,
+                            combine_nc=save_settings['combine_opt'], append_nc=self._append_nc)
+            self._set_file_groups(grp, raw_file, ch_ids, bb, save_settings)
 
     def _export_nc(self, save_settings, file_idx=0):
-        if self._temp_path:
-            out_file = self._temp_path[file_idx]
-        else:
-            # If there are multiple files, self.save_path is a list otherwise it is a string
-            out_file = self.save_path[file_idx] if type(self.save_path) == list else self.save_path
+        """
+        Saves parsed raw files to a NetCDF file.
+        Raw files combined into 1 NetCDF file are appended to it in place,
+        along unlimited dimensions created when saving the first raw file.
+        """
+        # If there are multiple files, self.save_path is a list otherwise it is a string
+        out_file = self.save_path[file_idx] if type(self.save_path) == list else self.save_path
         raw_file = self.filename[file_idx]
 
         # Check if nc file already exists and deletes it if overwrite is true
-        if os.path.exists(out_file) and save_settings['overwrite']:
+        if os.path.exists(out_file) and save_settings['overwrite'] and not self._append_nc:
             print("          overwriting: " + out_file)
             os.remove(out_file)
         # Remove _cw file if present
         split = os.path.splitext(out_file)
         cw_path = split[0] + '_cw' + split[1]
-        if os.path.exists(cw_path) and save_settings['overwrite'] and not self._append_zarr:
+        if os.path.exists(cw_path) and save_settings['overwrite'] and not self._append_nc:
             print("          overwriting: " + cw_path)
             os.remove(cw_path)
 
-        if os.path.exists(out_file):
+        if os.path.exists(out_file) and not self._append_nc:
             print(f'          ... this file has already been converted to .nc, conversion not executed.')
         else:
             self._set_groups(raw_file, out_file, save_settings)
@@ -576,92 +668,109 @@ class ConvertEK80(ConvertBase):
         else:
             self._set_groups(raw_file, out_file, save_settings=save_settings)
 
-    def _combine_files(self):
-        def copy_vendor(src_file, trg_file):
-            # Utility function for copying the filter coefficients from one file into another
-            src = netCDF4.Dataset(src_file)
-            trg = netCDF4.Dataset(trg_file, mode='a')
-            ds_vend = src.groups['Vendor']
-            vdr = trg.createGroup('Vendor')
-            complex64 = np.dtype([("real", np.float32), ("imag", np.float32)])
-            complex64_t = vdr.createCompoundType(complex64, "complex64")
-
-            # set decimation values
-            vdr.setncatts({a: ds_vend.getncattr(a) for a in ds_vend.ncattrs()})
-
-            # Create the dimensions of the file
-            for k, v in ds_vend.dimensions.items():
-                vdr.createDimension(k, len(v) if not v.isunlimited() else None)
-
-            # Create the variables in the file
-            for k, v in ds_vend.variables.items():
-                data = np.empty(len(v), complex64)
-                var = vdr.createVariable(k, complex64_t, v.dimensions)
-                var[:] = data
-
-            src.close()
-            trg.close()
-
-        # Do nothing if combine_opt is true if there is nothing to combine
-        if not self._temp_path:
-            return
-        save_path = self.save_path
-        split = os.path.splitext(self.save_path)
-        all_temp = os.listdir(self._temp_dir)
-        # Group files into cw (index 0) and broadband files (index 1)
-        file_groups = [[], []]
-        for f in all_temp:
-            if "_cw" in f:
-                file_groups[0].append(os.path.join(self._temp_dir, f))
-            else:
-                file_groups[1].append(os.path.join(self._temp_dir, f))
+    def _export_zarr_stream(self, save_settings, file_idx=0):
+        """
+        Parse a raw file and save it to Zarr in chunks of ``ping_chunk_size`` pings.
+
+        Each chunk is appended to the Beam, Platform and Platform/NMEA groups as soon as it
+        is parsed, so that memory use does not grow with the size of the raw file.
+        CW data are saved to a ``_cw`` file as when saving a whole file.
+        """
+        out_file = self.save_path[file_idx] if type(self.save_path) == list else self.save_path
+        raw_file = self.filename[file_idx]
+        ping_chunk_size = save_settings['ping_chunk_size']
 
-        for n, file_group in enumerate(file_groups):
-            if len(file_groups) > 1:
-                if not file_groups[n]:
-                    # Skip saving either bb or cw if only one or the other is present
+        split = os.path.splitext(out_file)
+        cw_path = split[0] + '_cw' + split[1]
+        if not self._append_zarr:
+            for path in [out_file, cw_path]:
+                if os.path.exists(path) and save_settings['overwrite']:
+                    print("          overwriting: " + path)
+                    shutil.rmtree(path)
+            if os.path.exists(out_file):
+                print(f'          ... this file has already been converted to .zarr, conversion not executed.')
+                return
+
+        print('%s  converting file in chunks of %d pings: %s' %
+              (dt.now().strftime('%H:%M:%S'), ping_chunk_size, os.path.basename(raw_file)))
+        self.reset_vars('EK80')
+        new_file = not self._append_zarr
+        with RawSimradFile(raw_file, 'r', use_mmap=True) as fid:
+            self._read_config(fid)
+            for end_offset in fid.get_chunk_offsets(ping_chunk_size) + [None]:
+                with stage('parse', file=os.path.basename(raw_file)) as record:
+                    self._read_datagrams(fid, end_offset)
+                    record.add(n_pings=len(self.ping_time))
+                if not self.ping_time:
                     continue
-                save_path = split[0] + '_cw' + split[1] if n == 0 else self.save_path
-            # Open multiple files as one dataset of each group and save them into a single file
-            with xr.open_dataset(file_group[0]) as ds_top:
-                ds_top.to_netcdf(path=save_path, mode='w')
-            with xr.open_dataset(file_group[0], group='Provenance') as ds_prov:
-                ds_prov.to_netcdf(path=save_path, mode='a', group='Provenance')
-            with xr.open_dataset(file_group[0], group='Sonar') as ds_sonar:
-                ds_sonar.to_netcdf(path=save_path, mode='a', group='Sonar')
-            with xr.open_mfdataset(file_group, group='Beam', combine='by_coords', data_vars='minimal') as ds_beam:
-                ds_beam.to_netcdf(path=save_path, mode='a', group='Beam')
-            with xr.open_dataset(file_group[0], group='Environment') as ds_env:
-                ds_env.to_netcdf(path=save_path, mode='a', group='Environment')
-            with xr.open_mfdataset(file_group, group='Platform', combine='nested',
-                                   concat_dim='location_time', data_vars='minimal') as ds_plat:
-                ds_plat.to_netcdf(path=save_path, mode='a', group='Platform')
-            with xr.open_mfdataset(file_group, group='Platform/NMEA',
-                                   combine='nested', concat_dim='time', decode_times=False) as ds_nmea:
-                ds_nmea.to_netcdf(path=save_path, mode='a', group='Platform/NMEA')
-            copy_vendor(file_group[0], save_path)
-        # Delete temporary folder:
-        shutil.rmtree(self._temp_dir)
-
-    def save(self, file_format, save_path=None, combine_opt=False, overwrite=False, compress=True):
-        """Save data from EK60 `.raw` to netCDF format.
+                self._remove_empty_channels()
+                self.nmea_data.trim()
+                self._write_zarr_chunk(raw_file, out_file, save_settings, new_file)
+                new_file = False
+
+                # Drop the saved chunk and keep the configuration for the next one
+                self._reset_ping_data()
+
+    def _write_zarr_chunk(self, raw_file, out_file, save_settings, new_file):
+        """Save a chunk of pings to a zarr file and, if there are both broadband and CW channels,
+        the CW channels to a ``_cw`` file.
+
+        All groups are created if ``new_file`` is True. Otherwise the pings are appended
+        to the Beam, Platform and Platform/NMEA groups and the other groups are left as they are.
         """
-        save_settings = dict(combine_opt=combine_opt, overwrite=overwrite, compress=compress)
-        self.validate_path(save_path, file_format, combine_opt)
-        # Loop over all files being parsed
-        for file_idx, file in enumerate(self.filename):
-            # Reset instance variables for each raw file. Always reset if there is more than 1 file being parsed
-            if file_idx > 0 or len(self.filename) > 1:
-                self.reset_vars('EK80')
-            # Load data if it has not already been loaded.
-            if self.config_datagram is None:
-                self.load_ek80_raw(file)
-            # multiple raw files are saved differently between the .nc and .zarr formats
-            if file_format == '.nc':
-                self._export_nc(save_settings, file_idx)
-            elif file_format == '.zarr':
-                # Sets flag for combining raw files into 1 zarr file
-                self._append_zarr = True if file_idx and combine_opt else False
+        for ch_ids, bb, path in self._beam_groups(out_file):
+            grp = SetGroups(file_path=path, echo_type='EK80',
+                            compress=save_settings['compress'], append_zarr=not new_file)
+            self._set_file_groups(grp, raw_file, ch_ids, bb, save_settings, new_file=new_file)
+
+    def _parse_file(self, file_format, file_idx, save_settings):
+        """Parse the raw file ``self.filename[file_idx]``, see ``ConvertBase._parse_file``.
+        """
+        file = self.filename[file_idx]
+        # Reset instance variables for each raw file. Always reset if there is more than 1 file being parsed
+        if file_idx > 0 or len(self.filename) > 1:
+            self.reset_vars('EK80')
+        # Load data if it has not already been loaded. Streamed conversion reads the file itself.
+        if self.config_datagram is None and not (file_format == '.zarr' and save_settings['ping_chunk_size']):
+            self.load_ek80_raw(file)
+            if not self.ping_time:
+                print('%s  no complete pings in the selected time window, file not converted: %s' %
+                      (dt.now().strftime('%H:%M:%S'), os.path.basename(file)))
+                return False
+        return True
+
+    def _save_file(self, file_format, file_idx, save_settings):
+        """Save the parsed raw file ``self.filename[file_idx]`` to netCDF4 or Zarr.
+        """
+        # multiple raw files are saved differently between the .nc and .zarr formats
+        if file_format == '.nc':
+            # Sets flag for combining raw files into 1 nc file
+            self._append_nc = file_idx > save_settings['first_file_idx'] and save_settings['combine_opt']
+            self._export_nc(save_settings, file_idx)
+        elif file_format == '.zarr':
+            # Sets flag for combining raw files into 1 zarr file
+            self._append_zarr = file_idx > save_settings['first_file_idx'] and save_settings['combine_opt']
+            if save_settings['ping_chunk_size']:
+                self._export_zarr_stream(save_settings, file_idx)
+            else:
                 self._export_zarr(save_settings, file_idx)
-        if combine_opt and file_format == '.nc':
-            self._combine_files()
+
+    def save(self, file_format, save_path=None, combine_opt=False, overwrite=False, compress=True,
+             n_workers=1, ping_chunk_size=None, start_time=None, end_time=None, channels=None, frequencies=None,
+             packed=False, pad_range_bin=False):
+        """Save data from EK80 `.raw` to netCDF or Zarr format.
+
+        If ``ping_chunk_size`` is given, each raw file is parsed and saved to Zarr
+        in chunks of that many pings, so that memory use stays bounded.
+        Only the pings in the time window from ``start_time`` to ``end_time`` and the
+        ``channels`` or ``frequencies`` selected are converted, see ``raw2nc``.
+        Packed storage is not supported for EK80 files and ``pad_range_bin`` is not used.
+        """
+        if packed:
+            raise ValueError("Packed storage is only supported for EK60 files")
+        save_settings = dict(combine_opt=combine_opt, overwrite=overwrite, compress=compress,
+                             ping_chunk_size=ping_chunk_size)
+        if self._set_selection(start_time, end_time, channels, frequencies):
+            self.reset_vars('EK80')
+        self.validate_path(save_path, file_format, combine_opt)
+        self._convert_files(file_format, save_settings, 'EK80', n_workers)
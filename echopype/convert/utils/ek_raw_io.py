@@ -7,14 +7,49 @@ Contains low-level functions called by ./ek_raw_parsers.py
 """
 
 from io import BufferedReader, FileIO, SEEK_SET, SEEK_CUR, SEEK_END
+import os
+import mmap
 import struct
 import logging
+import datetime
+import numpy as np
 from . import ek_raw_parsers as parsers
+from .ek_date_conversion import unix_to_nt
 
 __all__ = ['RawSimradFile']
 
 log = logging.getLogger(__name__)
 
+#: Record layout of the datagram index built by RawSimradFile.build_index
+#:   offset   byte offset of the leading datagram size field
+#:   size     datagram size as stored in the leading/trailing size fields
+#:   type     datagram type, e.g. b'RAW0'
+#:   channel  channel number of RAW0 datagrams, 1-based position in
+#:            index_channel_ids for RAW3 and FIL1 datagrams, 0 otherwise
+#:   nt_time  NT timestamp (100 ns intervals since 1601-01-01)
+DGRAM_INDEX_DTYPE = np.dtype([('offset', '<i8'),
+                              ('size', '<i4'),
+                              ('type', 'S4'),
+                              ('channel', '<i2'),
+                              ('nt_time', '<u8')])
+
+#: Suffix of the sidecar file the datagram index is cached in
+DGRAM_INDEX_SUFFIX = '.index.npz'
+
+#: Bump if DGRAM_INDEX_DTYPE changes so that old sidecar files are rebuilt
+DGRAM_INDEX_VERSION = 1
+
+
+def _to_nt_time(timestamp):
+    '''
+    Converts a datetime, numpy.datetime64 or ISO string (UTC) to an NT timestamp.
+    '''
+
+    if not isinstance(timestamp, datetime.datetime):
+        timestamp = np.datetime64(timestamp, 'us').astype(datetime.datetime)
+    low_date, high_date = unix_to_nt(timestamp)
+    return (high_date << 32) + low_date
+
 class SimradEOF(Exception):
 
     def __init__(self, message='EOF Reached!'):
@@ -67,6 +102,10 @@ class RawSimradFile(BufferedReader):
     of SIMRAD RAW files on datagram by datagram basis (instead of at the byte level.)
 
     Calls to the read method return parse datagrams as dicts.
+
+    With ``use_mmap=True`` the file is memory-mapped and datagrams are handed to
+    the parsers as ``memoryview`` slices of the mapping, so that sample data are
+    never copied between the file and the arrays returned by the parsers.
     '''
     #: Dict object with datagram header/python class key/value pairs
     DGRAM_TYPE_KEY = {'RAW': parsers.SimradRawParser(),
@@ -81,7 +120,8 @@ class RawSimradFile(BufferedReader):
                       }
 
 
-    def __init__(self, name, mode='rb', closefd=True, return_raw=False, buffer_size=1024*1024):
+    def __init__(self, name, mode='rb', closefd=True, return_raw=False, buffer_size=1024*1024,
+                 use_mmap=False):
 
         #  9-28-18 RHT: Changed RawSimradFile to implement BufferedReader instead of
         #  io.FileIO to increase performance.
@@ -95,6 +135,52 @@ class RawSimradFile(BufferedReader):
         self._total_dgram_count = None
         self._return_raw = return_raw
 
+        #  memory-mapped reader state, only used if use_mmap=True
+        self._mmap = None
+        self._mview = None
+        self._mmap_pos = 0
+        if use_mmap:
+            self._open_mmap()
+
+        #  datagram index, only built/loaded on request
+        self._index = None
+        self._index_channel_ids = None
+
+
+    def _open_mmap(self):
+        '''
+        Maps the whole file read-only into memory.
+
+        Empty files cannot be mapped, in which case the reader silently
+        stays with buffered reads.
+        '''
+
+        if os.fstat(self.fileno()).st_size == 0:
+            return
+
+        self._mmap = mmap.mmap(self.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mview = memoryview(self._mmap)
+        self._mmap_pos = BufferedReader.tell(self)
+
+
+    def close(self):
+        '''
+        Closes the file and releases the memory map if one was opened.
+        '''
+
+        if self._mmap is not None:
+            self._mview.release()
+            try:
+                self._mmap.close()
+            except BufferError:
+                #  arrays returned by the parsers still point into the mapping,
+                #  it is unmapped once the last of them is garbage collected
+                pass
+            self._mmap = None
+            self._mview = None
+
+        BufferedReader.close(self)
+
 
     def _seek_bytes(self, bytes_, whence=0):
         '''
@@ -106,7 +192,20 @@ class RawSimradFile(BufferedReader):
         Seeks a file by bytes instead of datagrams.
         '''
 
-        BufferedReader.seek(self, bytes_, whence)
+        if self._mmap is not None:
+            if whence == SEEK_SET:
+                pos = bytes_
+            elif whence == SEEK_CUR:
+                pos = self._mmap_pos + bytes_
+            elif whence == SEEK_END:
+                pos = len(self._mview) + bytes_
+            else:
+                raise ValueError('Illegal value for \'whence\' (%s)' % (str(whence)))
+            if pos < 0:
+                raise OSError('Cannot seek to negative byte offset %d' % pos)
+            self._mmap_pos = pos
+        else:
+            BufferedReader.seek(self, bytes_, whence)
 
 
     def _tell_bytes(self):
@@ -114,6 +213,8 @@ class RawSimradFile(BufferedReader):
         Returns the file pointer position in bytes.
         '''
 
+        if self._mmap is not None:
+            return self._mmap_pos
         return BufferedReader.tell(self)
 
 
@@ -213,9 +314,89 @@ class RawSimradFile(BufferedReader):
         Reads raw bytes from the file
         '''
 
+        if self._mmap is not None:
+            buf = self._mmap[self._mmap_pos:self._mmap_pos + k]
+            self._mmap_pos += len(buf)
+            return buf
         return BufferedReader.read(self, k)
 
 
+    def _read_next_dgram_mmap(self):
+        '''
+        Memory-mapped counterpart of _read_next_dgram.
+
+        The type, timestamp and payload of a datagram are contiguous in the
+        file, so the whole datagram is returned as a single memoryview slice
+        of the mapping without joining or copying any bytes.
+        '''
+
+        view = self._mview
+        file_size = len(view)
+
+        while True:
+            old_file_pos = self._mmap_pos
+
+            if old_file_pos + 16 > file_size:
+                if old_file_pos == file_size:
+                    raise SimradEOF()
+                raise DatagramReadError('Short read while getting raw file datagram header',
+                    (16, file_size - old_file_pos), file_pos=(old_file_pos, self.tell()))
+
+            dgram_size, low_date, high_date = struct.unpack_from('=l4xLL', view, old_file_pos)
+
+            #  check for invalid time data
+            if (low_date, high_date) == (0, 0):
+                log.warning('Skipping %s datagram w/ timestamp of (0, 0) at %sL:%d',
+                    bytes(view[old_file_pos + 4:old_file_pos + 8]).decode(errors='replace'),
+                    str(old_file_pos), self.tell())
+                self.skip()
+                continue
+
+            #  basic sanity check on size
+            if dgram_size < 16:
+                log.warning('Invalid datagram header: size: %d, type: %s, nt_date: %s.  dgram_size < 16',
+                    dgram_size, bytes(view[old_file_pos + 4:old_file_pos + 8]).decode(errors='replace'),
+                    str((low_date, high_date)))
+                self._mmap_pos += 16
+                self._find_next_datagram()
+                continue
+
+            dgram_end = old_file_pos + 4 + dgram_size
+            if dgram_end > file_size:
+                log.warning('Datagram %d (@%d) shorter than expected length:  %d < %d', self.tell(),
+                            old_file_pos, file_size - old_file_pos - 4, dgram_size)
+                self._mmap_pos += 16
+                self._find_next_datagram()
+                continue
+
+            #  now read the trailing size value
+            if dgram_end + 4 > file_size:
+                raise DatagramReadError('Short read while getting trailing raw file datagram size for check',
+                    (4, file_size - dgram_end), file_pos=(old_file_pos, self.tell()))
+
+            dgram_size_check = struct.unpack_from('=l', view, dgram_end)[0]
+
+            #  make sure they match
+            if dgram_size != dgram_size_check:
+                log.warning('Datagram failed size check:  %d != %d @ (%d, %d)',
+                    dgram_size, dgram_size_check, dgram_end + 4, self.tell())
+                log.warning('Skipping to next datagram...')
+                self._mmap_pos = dgram_end + 4
+                self._find_next_datagram()
+                continue
+
+            self._mmap_pos = dgram_end + 4
+            raw_dgram = view[old_file_pos + 4:dgram_end]
+
+            if self._return_raw:
+                self._current_dgram_offset += 1
+                return raw_dgram
+            else:
+                nice_dgram = self._convert_raw_datagram(raw_dgram, dgram_size + 20)
+                self._current_dgram_offset += 1
+                return nice_dgram
+
+
     def _read_next_dgram(self):
         '''
         Attempts to read the next datagram from the file.
@@ -230,6 +411,9 @@ class RawSimradFile(BufferedReader):
         #  allows us to pass them onto the parser without having to
         #  rewind and read again as was previously done.
 
+        if self._mmap is not None:
+            return self._read_next_dgram_mmap()
+
         #  store our current location in the file
         old_file_pos = self._tell_bytes()
 
@@ -323,12 +507,17 @@ class RawSimradFile(BufferedReader):
         #  11/26/19 - RHT - Modified this method to pass through the number of
         #  bytes read so we can bubble that up to the user.
 
-        dgram_type = raw_datagram_string[:3].decode()
+        dgram_type = bytes(raw_datagram_string[:3]).decode()
         try:
             parser = self.DGRAM_TYPE_KEY[dgram_type]
         except KeyError:
             #raise KeyError('Unknown datagram type %s, valid types: %s' % (str(dgram_type), str(self.DGRAM_TYPE_KEY.keys())))
-            return raw_datagram_string
+            return bytes(raw_datagram_string)
+
+        #  memoryview slices from the memory-mapped reader are only passed
+        #  through to parsers that unpack their contents with np.frombuffer
+        if isinstance(raw_datagram_string, memoryview) and not parser.accepts_buffer:
+            raw_datagram_string = raw_datagram_string.tobytes()
 
         nice_dgram = parser.from_string(raw_datagram_string, bytes_read)
         return nice_dgram
@@ -344,23 +533,239 @@ class RawSimradFile(BufferedReader):
         if self._total_dgram_count is not None:
             raise ValueError('self._total_dgram_count has already been set.  Call .reset() first if you really want to recount')
 
-        #Save current position for later
-        old_file_pos = self._tell_bytes()
-        old_dgram_offset = self.tell()
+        self._total_dgram_count = len(self.get_index())
 
-        self._current_dgram_offset = 0
-        self._seek_bytes(0, SEEK_SET)
 
-        while True:
-            try:
-                self.skip()
-            except (DatagramReadError, SimradEOF):
-                self._total_dgram_count = self.tell()
-                break
+    def build_index(self):
+        '''
+        Scans the file once and builds an index of all datagrams in it.
+
+        Only the datagram headers (and channel fields of RAW0/RAW3/FIL1
+        datagrams) are read, payloads are skipped.  The index is a numpy
+        structured array of dtype DGRAM_INDEX_DTYPE with one record per
+        datagram, in file order, so that record n is datagram number n as
+        returned by tell().  The file position is restored afterwards.
+
+        :returns: numpy structured array
+        '''
+
+        old_file_pos = self._tell_bytes()
+        self._seek_bytes(0, SEEK_END)
+        file_size = self._tell_bytes()
+
+        records = []
+        channel_ids = []
+        pos = 0
+        while pos + 16 <= file_size:
+            self._seek_bytes(pos, SEEK_SET)
+            dgram_size, dgram_type, low_date, high_date = struct.unpack('=l4sLL', self._read_bytes(16))
+            dgram_end = pos + 4 + dgram_size
+
+            dgram_size_check = None
+            if dgram_size >= 16 and dgram_end + 4 <= file_size:
+                self._seek_bytes(dgram_end, SEEK_SET)
+                dgram_size_check = struct.unpack('=l', self._read_bytes(4))[0]
+
+            if dgram_size != dgram_size_check:
+                log.warning('Invalid datagram while indexing @%d, size: %d, type: %s',
+                            pos, dgram_size, dgram_type)
+                self._seek_bytes(pos + 1, SEEK_SET)
+                try:
+                    self._find_next_datagram()
+                except (DatagramReadError, UnicodeDecodeError):
+                    break
+                pos = self._tell_bytes()
+                continue
+
+            channel = 0
+            if dgram_type == b'RAW0':
+                self._seek_bytes(pos + 16, SEEK_SET)
+                channel = struct.unpack('=h', self._read_bytes(2))[0]
+            elif dgram_type in (b'RAW3', b'FIL1'):
+                self._seek_bytes(pos + (16 if dgram_type == b'RAW3' else 20), SEEK_SET)
+                channel_id = self._read_bytes(128).strip(b'\x00').decode('latin_1')
+                if channel_id not in channel_ids:
+                    channel_ids.append(channel_id)
+                channel = channel_ids.index(channel_id) + 1
+
+            records.append((pos, dgram_size, dgram_type, channel, (high_date << 32) + low_date))
+            pos = dgram_end + 4
 
-        #Return to where we started
         self._seek_bytes(old_file_pos, SEEK_SET)
-        self._current_dgram_offset = old_dgram_offset
+
+        self._index = np.array(records, dtype=DGRAM_INDEX_DTYPE)
+        self._index_channel_ids = channel_ids
+        return self._index
+
+
+    def _index_cache_key(self):
+        stat = os.fstat(self.fileno())
+        return stat.st_size, stat.st_mtime_ns
+
+
+    def _load_index_cache(self):
+        '''
+        Loads the datagram index from the sidecar file, provided it is
+        valid for the current size and modification time of the raw file.
+        '''
+
+        index_path = self.name + DGRAM_INDEX_SUFFIX
+        if not os.path.isfile(index_path):
+            return False
+
+        try:
+            with np.load(index_path, allow_pickle=False) as cache:
+                if (int(cache['version']) != DGRAM_INDEX_VERSION or
+                        (int(cache['file_size']), int(cache['mtime'])) != self._index_cache_key()):
+                    return False
+                self._index = cache['index']
+                self._index_channel_ids = [str(ch_id) for ch_id in cache['channel_ids']]
+        except (OSError, ValueError, KeyError):
+            log.warning('Could not read datagram index file %s', index_path)
+            return False
+
+        return True
+
+
+    def _save_index_cache(self):
+        '''
+        Saves the datagram index next to the raw file.  Failing to write
+        (e.g. read-only location) only means the index is rebuilt next time.
+        '''
+
+        index_path = self.name + DGRAM_INDEX_SUFFIX
+        file_size, mtime = self._index_cache_key()
+        try:
+            with open(index_path + '.tmp', 'wb') as f:
+                np.savez(f, index=self._index,
+                         channel_ids=np.array(self._index_channel_ids, dtype=str),
+                         file_size=file_size, mtime=mtime, version=DGRAM_INDEX_VERSION)
+            os.replace(index_path + '.tmp', index_path)
+        except OSError:
+            log.info('Could not write datagram index file %s', index_path)
+
+
+    def get_index(self, use_cache=True):
+        '''
+        :param use_cache: load the index from and save it to a sidecar file
+            (raw file name + DGRAM_INDEX_SUFFIX) keyed by file size and mtime
+        :type use_cache: bool
+
+        Returns the datagram index of the file (see build_index), building it
+        only if it has not been built or cached before.
+        '''
+
+        if self._index is None:
+            if not (use_cache and self._load_index_cache()):
+                self.build_index()
+                if use_cache:
+                    self._save_index_cache()
+
+        return self._index
+
+
+    @property
+    def index_channel_ids(self):
+        '''
+        Channel IDs of RAW3/FIL1 datagrams, ordered as numbered in the index.
+        '''
+
+        self.get_index()
+        return self._index_channel_ids
+
+
+    def get_chunk_offsets(self, n_pings):
+        '''
+        :param n_pings: number of pings in each chunk
+        :type n_pings: int
+
+        Returns the byte offsets at which the file can be split into chunks
+        of n_pings pings, for use as end_offset of iter_indexed_dgrams.
+
+        A ping starts with a RAW datagram of the channel of the first RAW
+        datagram in the file. Each chunk ends right after the last RAW datagram
+        of its last ping, so that other datagrams recorded before a ping
+        (e.g. EK80 parameter datagrams) are read with it.
+        '''
+
+        index = self.get_index()
+        raw_pos = np.flatnonzero(np.char.startswith(index['type'], b'RAW'))
+        if raw_pos.size == 0:
+            return []
+        ping_pos = raw_pos[index['channel'][raw_pos] == index['channel'][raw_pos[0]]]
+        # Last RAW datagram before the first one of each chunk
+        last_raw = raw_pos[np.searchsorted(raw_pos, ping_pos[n_pings::n_pings]) - 1]
+        return [int(offset) for offset in index['offset'][last_raw + 1]]
+
+
+    def select_dgrams(self, types=None, start_time=None, end_time=None, end_offset=None, channels=None):
+        '''
+        :param types: datagram types (e.g. 'RAW0') or type prefixes (e.g. 'RAW')
+            to select, all types if None
+        :type types: list
+
+        :param start_time: only select datagrams at or after this time (UTC)
+        :type start_time: datetime.datetime, numpy.datetime64 or str
+
+        :param end_time: only select datagrams at or before this time (UTC)
+        :type end_time: datetime.datetime, numpy.datetime64 or str
+
+        :param end_offset: only select datagrams starting before this byte offset,
+            e.g. the offset of the first datagram of the next chunk of pings
+        :type end_offset: int
+
+        :param channels: only select RAW0, RAW3 and FIL1 datagrams of these
+            channels, numbered as in the index. Other datagram types are not filtered.
+        :type channels: list of int
+
+        Returns the numbers of the selected datagrams from the current file
+        position onwards, using only the datagram index.
+        Datagrams with invalid (0, 0) timestamps are never selected.
+        '''
+
+        index = self.get_index()
+
+        mask = (index['offset'] >= self._tell_bytes()) & (index['nt_time'] != 0)
+        if types is not None:
+            type_mask = np.zeros(len(index), dtype=bool)
+            for dgram_type in types:
+                type_mask |= np.char.startswith(index['type'], dgram_type.encode())
+            mask &= type_mask
+        if start_time is not None:
+            mask &= index['nt_time'] >= _to_nt_time(start_time)
+        if end_time is not None:
+            mask &= index['nt_time'] <= _to_nt_time(end_time)
+        if end_offset is not None:
+            mask &= index['offset'] < end_offset
+        if channels is not None:
+            mask &= ~np.isin(index['type'], [b'RAW0', b'RAW3', b'FIL1']) | np.isin(index['channel'], channels)
+
+        return np.flatnonzero(mask)
+
+
+    def read_dgrams(self, dgram_nums):
+        '''
+        :param dgram_nums: numbers of the datagrams to read, in file order
+        :type dgram_nums: list of int
+
+        Jumps straight to each datagram using the datagram index and reads it,
+        so that the payloads of all other datagrams are never read or decoded.
+        '''
+
+        index = self.get_index()
+        for dgram_num in dgram_nums:
+            self._seek_bytes(int(index['offset'][dgram_num]), SEEK_SET)
+            self._current_dgram_offset = int(dgram_num)
+            yield self._read_next_dgram()
+
+
+    def iter_indexed_dgrams(self, types=None, start_time=None, end_time=None, end_offset=None, channels=None):
+        '''
+        Reads the datagrams selected with select_dgrams (see there for the parameters),
+        from the current file position onwards, skipping over all others.
+        '''
+
+        return self.read_dgrams(self.select_dgrams(types, start_time, end_time, end_offset, channels))
 
 
     def at_eof(self):
@@ -621,7 +1026,19 @@ class RawSimradFile(BufferedReader):
         else:
             raise ValueError('Illegal value for \'whence\' (%s), use 0 (beginning), 1 (current), or 2 (end)' % (str(whence)))
 
-        if offset > 0:
+        #  jump straight to the datagram if the file has been indexed
+        if self._index is not None and offset != 0:
+            dgram_num = self._current_dgram_offset + offset
+            if not 0 <= dgram_num <= len(self._index):
+                raise ValueError('Cannot seek to datagram %d, file contains %d datagrams' %
+                                 (dgram_num, len(self._index)))
+            if dgram_num == len(self._index):
+                self._seek_bytes(0, SEEK_END)
+            else:
+                self._seek_bytes(int(self._index['offset'][dgram_num]), SEEK_SET)
+            self._current_dgram_offset = dgram_num
+
+        elif offset > 0:
             for k in range(offset):
                 self.skip()
         elif offset < 0:
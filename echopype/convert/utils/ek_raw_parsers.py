@@ -27,6 +27,9 @@ class _SimradDatagramParser(object):
     '''
     '''
 
+    #: True if _unpack_contents can work on a memoryview instead of bytes
+    accepts_buffer = False
+
     def __init__(self, header_type, header_formats):
         self._id      = header_type
         self._headers = header_formats
@@ -48,10 +51,11 @@ class _SimradDatagramParser(object):
     def validate_data_header(self, data):
 
         if isinstance(data, dict):
-            type_ = data['type'][:3]
-            version   = int(data['type'][3])
+            data = data['type']
+            if isinstance(data, bytes):
+                data = data.decode()
 
-        elif isinstance(data, str):
+        if isinstance(data, str):
             type_ = data[:3]
             version   = int(data[3])
 
@@ -68,7 +72,7 @@ class _SimradDatagramParser(object):
 
     def from_string(self, raw_string, bytes_read):
 
-        header = raw_string[:4]
+        header = bytes(raw_string[:4])
         if (sys.version_info.major > 2):
             header = header.decode()
         id_, version = self.validate_data_header(header)
@@ -525,26 +529,6 @@ class SimradMRUParser(_SimradDatagramParser):
             for field in self.header_fields(version):
                 datagram_contents.append(data[field])
 
-
-            if data['nmea_string'][-1] != '\x00':
-                tmp_string = data['nmea_string'] + '\x00'
-            else:
-                tmp_string = data['nmea_string']
-
-
-            #Pad with more nulls to 4-byte word boundry if necessary
-            if len(tmp_string) % 4:
-                tmp_string += '\x00' * (4 - (len(tmp_string) % 4))
-
-            datagram_fmt += '%ds' % (len(tmp_string))
-
-            #Convert to python string if needed
-            if isinstance(tmp_string, str):
-                tmp_string = tmp_string.encode('ascii', errors='replace')
-
-            datagram_contents.append(tmp_string)
-
-
         return struct.pack(datagram_fmt, *datagram_contents)
 
 
@@ -561,6 +545,8 @@ class SimradXMLParser(_SimradDatagramParser):
 
         [subtype]:    dict containing the data specific to the XML subtype.
 
+        xml_string:   XML string of the datagram, only used by to_string()
+
     The following methods are defined:
 
         from_string(str):    parse a raw EK80 XML datagram
@@ -789,7 +775,7 @@ class SimradXMLParser(_SimradDatagramParser):
                                      self.channel_parsing_options)
 
                         #  check if there are >1 transducer under a single transceiver channel
-                        if len(tcvr_ch.getchildren()) > 1:
+                        if len(list(tcvr_ch)) > 1:
                             ValueError('Found >1 transducer under a single transceiver channel!')
                         else:   # should only have 1 transducer
                             tcvr_ch_xducer = tcvr_ch.find('Transducer')  # get Element of this xducer
@@ -871,21 +857,6 @@ class SimradXMLParser(_SimradDatagramParser):
 
     def _pack_contents(self, data, version):
 
-        def to_CamelCase(xml_param):
-            '''
-            convert name from project's convention to CamelCase for converting back to
-            XML to in Kongsberg's convention.
-            '''
-            idx = list(reversed([i for i, c in enumerate(xml_param) if c.isupper()]))
-            param_len = len(xml_param)
-            for i in idx:
-                #  check if we should insert an underscore
-                if (idx > 0 and idx < param_len - 1):
-                    xml_param = xml_param[:idx] + '_' + xml_param[idx:]
-            xml_param = xml_param.lower()
-
-            return xml_param
-
         datagram_fmt      = self.header_fmt(version)
         datagram_contents = []
 
@@ -894,12 +865,11 @@ class SimradXMLParser(_SimradDatagramParser):
             for field in self.header_fields(version):
                 datagram_contents.append(data[field])
 
-
-            if data['nmea_string'][-1] != '\x00':
-                tmp_string = data['nmea_string'] + '\x00'
+            #  The XML string is written as is, the subtype dicts are not converted back to XML
+            if data['xml_string'][-1] != '\x00':
+                tmp_string = data['xml_string'] + '\x00'
             else:
-                tmp_string = data['nmea_string']
-
+                tmp_string = data['xml_string']
 
             #Pad with more nulls to 4-byte word boundry if necessary
             if len(tmp_string) % 4:
@@ -956,6 +926,8 @@ class SimradFILParser(_SimradDatagramParser):
 
         _SimradDatagramParser.__init__(self, 'FIL', headers)
 
+    accepts_buffer = True
+
 
     def _unpack_contents(self, raw_string, bytes_read, version):
 
@@ -979,7 +951,7 @@ class SimradFILParser(_SimradDatagramParser):
             #  unpack the coefficients
             indx = self.header_size(version)
             block_size = data['n_coefficients'] * 8
-            data['coefficients'] = np.fromstring(raw_string[indx:indx + block_size], dtype='complex64')
+            data['coefficients'] = np.frombuffer(raw_string[indx:indx + block_size], dtype='complex64')
 
         return data
 
@@ -997,8 +969,9 @@ class SimradFILParser(_SimradDatagramParser):
             for field in self.header_fields(version):
                 datagram_contents.append(data[field])
 
-            datagram_fmt += '%ds' %(len(data['beam_config']))
-            datagram_contents.append(data['beam_config'])
+            coefficients = np.asarray(data['coefficients'], dtype='complex64').tobytes()
+            datagram_fmt += '%ds' % (len(coefficients))
+            datagram_contents.append(coefficients)
 
         return struct.pack(datagram_fmt, *datagram_contents)
 
@@ -1305,6 +1278,8 @@ class SimradConfigParser(_SimradDatagramParser):
                 data['transceiver_count'] = len(data['transceivers'])
 
             sounder_name = data['sounder_name']
+            if isinstance(sounder_name, bytes):
+                sounder_name = sounder_name.decode()
             if sounder_name == 'MBES':
                 _packed_me70_values = struct.pack('=hLff', data['multiplexing'],
                     data['time_bias'], data['sound_velocity_avg'], data['sound_velocity_transducer'])
@@ -1446,6 +1421,8 @@ class SimradRawParser(_SimradDatagramParser):
                     }
         _SimradDatagramParser.__init__(self, 'RAW', headers)
 
+    accepts_buffer = True
+
     def _unpack_contents(self, raw_string, bytes_read, version):
 
         header_values = struct.unpack(self.header_fmt(version), raw_string[:self.header_size(version)])
@@ -1467,7 +1444,7 @@ class SimradRawParser(_SimradDatagramParser):
                 indx = self.header_size(version)
 
                 if int(data['mode']) & 0x1:
-                    data['power'] = np.fromstring(raw_string[indx:indx + block_size], dtype='int16')
+                    data['power'] = np.frombuffer(raw_string[indx:indx + block_size], dtype='int16')
                     indx += block_size
                 else:
                     data['power'] = None
@@ -1496,13 +1473,13 @@ class SimradRawParser(_SimradDatagramParser):
                 indx = self.header_size(version)
 
                 if data['data_type'] & 0b1:
-                    data['power'] = np.fromstring(raw_string[indx:indx + block_size], dtype='int16')
+                    data['power'] = np.frombuffer(raw_string[indx:indx + block_size], dtype='int16')
                     indx += block_size
                 else:
                     data['power'] = None
 
                 if data['data_type'] & 0b10:
-                    data['angle'] = np.fromstring(raw_string[indx:indx + block_size], dtype='int8')
+                    data['angle'] = np.frombuffer(raw_string[indx:indx + block_size], dtype='int8')
                     data['angle'] = data['angle'].reshape((-1, 2))
                     indx += block_size
                 else:
@@ -1524,8 +1501,8 @@ class SimradRawParser(_SimradDatagramParser):
                     #  determine the block size
                     block_size = data['count'] * data['n_complex'] * type_bytes
 
-                    data['complex'] = np.fromstring(raw_string[indx:indx + block_size], dtype=data['complex_dtype'])
-                    data['complex'].dtype = np.complex64
+                    data['complex'] = np.frombuffer(raw_string[indx:indx + block_size], dtype=data['complex_dtype'])
+                    data['complex'] = data['complex'].view(np.complex64)
                 else:
                     data['complex'] = None
 
@@ -1566,11 +1543,36 @@ class SimradRawParser(_SimradDatagramParser):
             if data['count'] > 0:
 
                 if int(data['mode']) & 0x1:
-                    datagram_fmt += '%dh' % (data['count'])
-                    datagram_contents.extend(data['power'])
+                    datagram_fmt += '%ds' % (data['count'] * 2)
+                    datagram_contents.append(np.asarray(data['power'], dtype='int16').tobytes())
 
                 if int(data['mode']) & 0x2:
-                    datagram_fmt += '%dH' % (data['count'])
-                    datagram_contents.extend(data['angle'])
+                    #  angles are either int8 (alongship, athwartship) pairs as unpacked or one uint16 per sample
+                    angle = np.asarray(data['angle'])
+                    if angle.dtype != np.int8:
+                        angle = angle.astype('uint16')
+                    datagram_fmt += '%ds' % (data['count'] * 2)
+                    datagram_contents.append(angle.tobytes())
+
+        elif version == 3:
+
+            for field in self.header_fields(version):
+                datagram_contents.append(data[field])
+
+            if data['count'] > 0:
+
+                if data['data_type'] & 0b1:
+                    datagram_fmt += '%ds' % (data['count'] * 2)
+                    datagram_contents.append(np.asarray(data['power'], dtype='int16').tobytes())
+
+                if data['data_type'] & 0b10:
+                    datagram_fmt += '%ds' % (data['count'] * 2)
+                    datagram_contents.append(np.asarray(data['angle'], dtype='int8').tobytes())
+
+                #  complex samples are written as stored, n_complex values per sample
+                if data['data_type'] >> 8:
+                    complex_str = np.asarray(data['complex']).tobytes()
+                    datagram_fmt += '%ds' % (len(complex_str))
+                    datagram_contents.append(complex_str)
 
         return struct.pack(datagram_fmt, *datagram_contents)
@@ -14,6 +14,183 @@ TODO: fix docstring
 
 
 import numpy as np
+import pynmea2
+
+# Indices of the latitude, latitude hemisphere, longitude and longitude hemisphere fields
+# of sentences with positions, with the sentence type as field 0
+POSITION_FIELDS = {'GGA': (2, 3, 4, 5),
+                   'GLL': (1, 2, 3, 4),
+                   'RMC': (3, 4, 5, 6)}
+
+
+# Sentences are decoded in blocks of this many rows to bound the memory of the character arrays
+BLOCK_SIZE = 2 ** 14
+
+_POW10 = 10 ** np.arange(19, dtype=np.int64)
+
+
+def _char_codes(strings, min_len=1):
+    """Return the unicode code points of an array of strings as a 2D array, padded with 0."""
+    strings = strings.astype('U%d' % max(strings.dtype.itemsize // 4, min_len))
+    return strings.view(np.uint32).reshape(strings.size, -1)
+
+
+def _hex_digit(codes):
+    """Convert code points of hexadecimal digits to integers, -1 where not valid."""
+    codes = codes.astype(np.int64)
+    return np.select([(codes >= ord('0')) & (codes <= ord('9')),
+                      (codes >= ord('A')) & (codes <= ord('F')),
+                      (codes >= ord('a')) & (codes <= ord('f'))],
+                     [codes - ord('0'), codes - ord('A') + 10, codes - ord('a') + 10], -1)
+
+
+def _dm_to_sd(codes, in_field):
+    """Convert coordinates in dddmm.mmmm format to decimal degrees
+    as ``pynmea2.nmea_utils.dm_to_sd``, without the sign.
+
+    Parameters
+    ----------
+    codes : np.ndarray
+        2D array of the code points of the coordinate fields, left aligned
+    in_field : np.ndarray
+        boolean mask of the characters of the fields in ``codes``
+
+    Returns
+    -------
+    Array of decimal degrees, 0 for empty coordinates and NaN where not valid
+    """
+    col = np.arange(codes.shape[1])
+    n_chars = in_field.sum(axis=1)
+    is_dot = in_field & (codes == ord('.'))
+    is_digit = in_field & (codes >= ord('0')) & (codes <= ord('9'))
+    dot_pos = is_dot.argmax(axis=1)[:, None]
+    int_mask = is_digit & (col < dot_pos)
+    frac_mask = is_digit & (col > dot_pos)
+    n_int, n_frac = int_mask.sum(axis=1), frac_mask.sum(axis=1)
+    # Degrees and minutes are integers below 2**53 so that they are exact as float
+    valid = (is_dot.sum(axis=1) == 1) & (n_int + n_frac + 1 == n_chars) & \
+        (n_int >= 3) & (n_int <= 17) & (n_frac >= 1) & (n_frac <= 13)
+    digits = codes.astype(np.int64) - ord('0')
+    dm_int = np.where(int_mask, digits * _POW10[np.clip(dot_pos - col - 1, 0, 18)], 0).sum(axis=1)
+    frac = np.where(frac_mask, digits * _POW10[np.clip(n_frac[:, None] - col + dot_pos, 0, 18)], 0).sum(axis=1)
+    # Dividing the exact integer digits of the minutes by an exact power of 10 rounds
+    # to the same float as parsing them, so results are identical to pynmea2
+    n_frac = np.clip(n_frac, 0, 18)
+    minutes = ((dm_int % 100) * _POW10[n_frac] + frac) / 10. ** n_frac
+    sd = np.where(valid, (dm_int // 100) + minutes / 60, np.nan)
+    sd[(n_chars == 0) | ((n_chars == 1) & (codes[:, 0] == ord('0')))] = 0.
+    return sd
+
+
+def _field_char(codes, in_field):
+    """Return the code point of single-character fields, 0 for other fields."""
+    return np.where(in_field.sum(axis=1) == 1, codes[:, 0], 0)
+
+
+def _get_field(codes, field, body_len, k):
+    """Gather the characters of field ``k`` of each sentence.
+
+    Parameters
+    ----------
+    codes : np.ndarray
+        2D array of the code points of the sentences
+    field : np.ndarray
+        number of commas up to each character of the sentences
+    body_len : np.ndarray
+        number of characters before the checksum of each sentence
+    k : int
+        field number, counting the sentence type as field 0
+
+    Returns
+    -------
+    2D array of the code points of the field, left aligned, and the boolean mask of its characters
+    """
+    n_fields = field[:, -1] + 1
+    start = (field >= k).argmax(axis=1) + (k > 0)
+    end = np.where(n_fields > k + 1, (field > k).argmax(axis=1), body_len)
+    # Missing fields are empty as in pynmea2
+    n_chars = np.where(n_fields > k, np.maximum(end - start, 0), 0)
+    col = np.arange(max(n_chars.max(), 1))
+    idx = np.minimum(start[:, None] + col, codes.shape[1] - 1)
+    return np.take_along_axis(codes, idx, axis=1), col < n_chars[:, None]
+
+
+def _decode_block(sentences, messages):
+    """Decode the positions of a block of sentences, see ``decode_positions``."""
+    lat = np.full(sentences.size, np.nan)
+    lon = np.full(sentences.size, np.nan)
+    # Pad so that the header and checksum can be indexed in all sentences
+    codes = _char_codes(np.char.strip(sentences), 10)
+    codes = np.pad(codes, ((0, 0), (0, 3)))
+    rows, col = np.arange(codes.shape[0]), np.arange(codes.shape[1])
+    length = (codes != 0).sum(axis=1)
+
+    # The checksum is the XOR of the characters between the leading '$' and the first '*',
+    # followed by 2 hexadecimal digits
+    is_star = codes == ord('*')
+    has_checksum = is_star.any(axis=1)
+    star_pos = np.where(has_checksum, is_star.argmax(axis=1), length)
+    in_body = col < star_pos[:, None]
+    checksum = _hex_digit(codes[rows, star_pos + 1]) * 16 + _hex_digit(codes[rows, star_pos + 2])
+    valid_checksum = (length == star_pos + 3) & (_hex_digit(codes[rows, star_pos + 1]) >= 0) & \
+        (_hex_digit(codes[rows, star_pos + 2]) >= 0)
+    # A sentence starts with '$' and a 5-letter header followed by ','
+    malformed = (codes[:, 0] != ord('$')) | (codes[:, 6] != ord(',')) | (has_checksum & ~valid_checksum)
+    body_xor = np.bitwise_xor.reduce(np.where(in_body, codes, 0)[:, 1:], axis=1)
+    bad_checksum = ~malformed & has_checksum & (checksum != body_xor)
+
+    for message, (i_lat, i_lat_dir, i_lon, i_lon_dir) in POSITION_FIELDS.items():
+        idx = np.flatnonzero(~malformed & ~bad_checksum & (messages == message))
+        if not idx.size:
+            continue
+        # Field numbers count the preceding commas
+        sub = codes[idx]
+        field = np.cumsum(in_body[idx] & (sub == ord(',')), axis=1, dtype=np.int32)
+        fields = [_get_field(sub, field, star_pos[idx], k) for k in (i_lat, i_lat_dir, i_lon, i_lon_dir)]
+        lat_sd, lat_dir = _dm_to_sd(*fields[0]), _field_char(*fields[1])
+        lon_sd, lon_dir = _dm_to_sd(*fields[2]), _field_char(*fields[3])
+        lat[idx] = np.select([lat_dir == ord('N'), lat_dir == ord('S')], [lat_sd, -lat_sd], 0.)
+        lon[idx] = np.select([lon_dir == ord('E'), lon_dir == ord('W')], [lon_sd, -lon_sd], 0.)
+        # Coordinates not in dddmm.mmmm format are left to pynmea2
+        malformed[idx[np.isnan(lat_sd) | np.isnan(lon_sd)]] = True
+
+    for i in np.flatnonzero(malformed):
+        try:
+            msg = pynmea2.parse(sentences[i])
+            lat[i], lon[i] = msg.latitude, msg.longitude
+        except (ValueError, AttributeError):   # includes pynmea2.ParseError
+            lat[i] = lon[i] = np.nan
+    return lat, lon
+
+
+def decode_positions(sentences, messages):
+    """Decode latitude and longitude from GGA, GLL and RMC NMEA sentences.
+
+    The fields, checksums and coordinates of all sentences are decoded with array operations
+    on their characters and give the same results as the ``latitude`` and ``longitude``
+    of ``pynmea2.parse``. Only malformed sentences are parsed one by one with pynmea2.
+    Positions of sentences with a wrong checksum or that pynmea2 cannot parse are NaN.
+
+    Parameters
+    ----------
+    sentences : np.ndarray of str
+        NMEA sentences
+    messages : np.ndarray of str
+        message ID of each sentence, one of 'GGA', 'GLL' and 'RMC'
+
+    Returns
+    -------
+    Arrays of latitude and longitude in signed decimal degrees
+    """
+    sentences = np.asarray(sentences).astype('U')
+    messages = np.asarray(messages)
+    lat = np.full(sentences.size, np.nan)
+    lon = np.full(sentences.size, np.nan)
+    for start in range(0, sentences.size, BLOCK_SIZE):
+        block = slice(start, start + BLOCK_SIZE)
+        lat[block], lon[block] = _decode_block(sentences[block], messages[block])
+    return lat, lon
+
 
 class NMEAData(object):
     """The nmea_data class provides storage for and parsing of NMEA data commonly
@@ -22,6 +199,7 @@ class NMEAData(object):
 
     def __init__(self):
 
+        # Initial size of the data arrays, which double in size when full
         self.CHUNK_SIZE = 500
 
         # Create a counter to keep track of the number of datagrams, This is
@@ -35,6 +213,9 @@ class NMEAData(object):
         self.talkers = np.empty(self.CHUNK_SIZE, dtype='U2')
         self.messages = np.empty(self.CHUNK_SIZE, dtype='U3')
 
+        # Set of (time in ms, header) of the stored datagrams to discard duplicates
+        self._keys = set()
+
         # Create a couple of lists to store the unique talkers and message IDs.
         self.talker_ids = []
         self.message_ids = []
@@ -92,45 +273,74 @@ class NMEAData(object):
                 existing datagram will be discarded.
 
         """
-        # Parse the NMEA message header
-        header = str(text[1:6].upper())
+        self.add_datagrams([time], [text], allow_duplicates)
+
+    def add_datagrams(self, times, texts, allow_duplicates=False):
+        """
+        Add a batch of NMEA datagrams to this object.
 
-        # Verify we have a plausible header and then process.
-        if header.isalpha() and len(header) == 5:
+        Datagrams are added in order as with add_datagram, with a single
+        resize of the data arrays.
+        Args:
+            times (array of datetime64): Timestamps of the NMEA datagrams.
+            texts (list of str): The raw NMEA strings.
+            allow_duplicates (bool): When False, NMEA datagrams that share
+                the same timestamp, talker ID, and message ID with an
+                existing or earlier datagram of the batch will be discarded.
+
+        """
+        times = np.asarray(times, dtype='datetime64[ms]')
+        keep, headers = [], []
+        for i, (time, text) in enumerate(zip(times.astype(np.int64).tolist(), texts)):
+            # Parse the NMEA message header
+            header = str(text[1:6].upper())
+
+            # Verify we have a plausible header and then process.
+            if not (header.isalpha() and len(header) == 5):
+                continue
 
             #  check if we're allowing duplicates and if this is one. We need
             #  to do this since .out files can contain duplicate NMEA data.
-            if (not allow_duplicates):
-                dup_idx = (self.nmea_times == time)
-                if (np.any(dup_idx)):
-                    #  We have a time match - check the talker and message id
-                    my_talker = self.talkers[dup_idx]
-                    my_message = self.messages[dup_idx]
-                    if ((header[0:2] in my_talker) and (header[2:6] in my_message)):
-                        #  this is the same - discard it
-                        return
-
-            # Increment datagram counter.
-            self.n_raw += 1
-
-            # Check if we need to resize our arrays. If so, resize arrays.
-            if self.n_raw > self.nmea_times.shape[0]:
-                self._resize_arrays(self.nmea_times.shape[0] +
-                                    self.CHUNK_SIZE)
-
-            # Add this datagram and associated data to our data arrays and
-            # then Add the talker and message ID to our list of unique talkers
-            # and messages.
-            self.raw_datagrams[self.n_raw-1] = text
-            self.nmea_times[self.n_raw-1] = time
-            self.talkers[self.n_raw-1] = header[0:2]
-            self.messages[self.n_raw-1] = header[2:6]
-
+            if not allow_duplicates:
+                if (time, header) in self._keys:
+                    continue
+                self._keys.add((time, header))
+            keep.append(i)
+            headers.append(header)
+        if not keep:
+            return
+
+        # Check if we need to resize our arrays. If so, resize arrays.
+        start, self.n_raw = self.n_raw, self.n_raw + len(keep)
+        if self.n_raw > self.nmea_times.shape[0]:
+            self._resize_arrays(max(self.n_raw, 2 * self.nmea_times.shape[0]))
+
+        # Add the datagrams and associated data to our data arrays and
+        # then add the talkers and message IDs to our list of unique talkers
+        # and messages.
+        self.raw_datagrams[start:self.n_raw] = [texts[i] for i in keep]
+        self.nmea_times[start:self.n_raw] = times[keep]
+        self.talkers[start:self.n_raw] = [h[0:2] for h in headers]
+        self.messages[start:self.n_raw] = [h[2:5] for h in headers]
+
+        for header in dict.fromkeys(headers):
             if not header[0:2] in self.talker_ids:
                 self.talker_ids.append(header[0:2])
             if not header[2:5] in self.message_ids:
                 self.message_ids.append(header[2:5])
 
+    def get_positions(self):
+        """
+        Decode the positions of all GGA, GLL and RMC datagrams.
+
+        Returns:
+            Index of the datagrams with positions, their latitude and longitude.
+            See ``decode_positions``.
+        """
+        idx = np.flatnonzero(np.isin(self.messages[:self.n_raw], list(POSITION_FIELDS)))
+        lat, lon = decode_positions(self.raw_datagrams[idx], self.messages[idx])
+        return idx, lat, lon
+
     def _resize_arrays(self, new_size):
         """
         Resize arrays if needed to hold more data.
@@ -0,0 +1,130 @@
+"""
+Contains class ``PingData`` for storing ping-by-ping data of one EK60 channel.
+Called by class ConvertEK60 in ``echopype/convert/ek60.py``.
+"""
+
+
+import numpy as np
+
+
+class PingData(object):
+    """The ping_data class provides growable, array-backed storage of the
+    RAW0 datagrams of one channel.
+
+    Ping-by-ping metadata are stored in one preallocated array per field and the
+    power and angle samples go directly into ``[ping x range_bin]`` int16 and
+    ``[ping x range_bin x 2]`` int8 arrays, so that no per-ping Python objects
+    are kept around while a file is parsed.
+    """
+
+    # Ping-by-ping metadata copied from RAW0 datagrams and their data types.
+    # Floats are kept as float64 since that is what struct unpacks them to.
+    FIELDS = [('mode', 'int16'),
+              ('transducer_depth', 'float64'),
+              ('transmit_power', 'float64'),
+              ('pulse_length', 'float64'),
+              ('bandwidth', 'float64'),
+              ('sample_interval', 'float64'),
+              ('sound_velocity', 'float64'),
+              ('absorption_coefficient', 'float64'),
+              ('heave', 'float64'),
+              ('roll', 'float64'),
+              ('pitch', 'float64'),
+              ('temperature', 'float64'),
+              ('heading', 'float64')]
+
+    def __init__(self, frequency=None):
+
+        self.CHUNK_SIZE = 500
+
+        # Channel frequency from the configuration datagram
+        self.frequency = frequency
+
+        # Create a counter to keep track of the number of pings, This is
+        # used to inform the array sizes.
+        self.n_pings = 0
+
+        # Create arrays to store ping metadata, the number of samples of each ping,
+        # and power and angle samples. Arrays are allocated with no range_bin
+        # columns until the first ping arrives.
+        self.ping_data = {field: np.empty(self.CHUNK_SIZE, dtype=dtype) for field, dtype in self.FIELDS}
+        self.n_samples = np.zeros(self.CHUNK_SIZE, dtype='int32')
+        self.power = np.zeros((self.CHUNK_SIZE, 0), dtype='int16')
+        self.angle = np.zeros((self.CHUNK_SIZE, 0, 2), dtype='int8')
+
+        # Set to True once a ping with angle data is added.
+        self.has_angle = False
+
+    def __getitem__(self, field):
+        """Return the values of a metadata field for all pings added so far.
+        """
+        if field == 'frequency':
+            return self.frequency
+        return self.ping_data[field][:self.n_pings]
+
+    def reserve(self, n_pings):
+        """
+        Make room for at least ``n_pings`` more pings.
+
+        Args:
+            n_pings (int): Number of pings expected to be added, e.g. the
+                number of RAW0 datagrams of this channel in the file.
+        """
+        if self.n_pings + n_pings > self.n_samples.shape[0]:
+            self._resize_arrays(self.n_pings + n_pings, self.power.shape[1])
+
+    def add_ping(self, datagram):
+        """
+        Add the metadata and samples of a RAW0 datagram as the next ping.
+
+        Args:
+            datagram (dict): RAW0 datagram as returned by the raw file parser.
+        """
+        n_samples = datagram['count']
+
+        # Check if we need to resize our arrays. If so, add another chunk
+        # of pings and/or widen the sample arrays to the longest ping.
+        n_alloc = self.n_samples.shape[0]
+        if self.n_pings == n_alloc or n_samples > self.power.shape[1]:
+            self._resize_arrays(n_alloc + self.CHUNK_SIZE if self.n_pings == n_alloc else n_alloc,
+                                max(n_samples, self.power.shape[1]))
+
+        idx = self.n_pings
+        for field, _ in self.FIELDS:
+            self.ping_data[field][idx] = datagram[field]
+        self.n_samples[idx] = n_samples
+        if datagram['power'] is not None:
+            self.power[idx, :n_samples] = datagram['power']
+        if datagram['angle'] is not None:
+            self.angle[idx, :n_samples, :] = datagram['angle']
+            self.has_angle = True
+
+        self.n_pings += 1
+
+    def _resize_arrays(self, new_size, new_range_size):
+        """
+        Resize arrays to hold ``new_size`` pings of up to ``new_range_size`` samples.
+
+        Args:
+            new_size (int): New number of pings.
+            new_range_size (int): New number of samples along range_bin.
+        """
+        for field in self.ping_data:
+            self.ping_data[field] = np.resize(self.ping_data[field], new_size)
+        self.n_samples = np.resize(self.n_samples, new_size)
+
+        n_copy = min(self.n_pings, new_size)
+        range_copy = min(self.power.shape[1], new_range_size)
+        power = np.zeros((new_size, new_range_size), dtype='int16')
+        power[:n_copy, :range_copy] = self.power[:n_copy, :range_copy]
+        self.power = power
+        angle = np.zeros((new_size, new_range_size, 2), dtype='int8')
+        angle[:n_copy, :range_copy, :] = self.angle[:n_copy, :range_copy, :]
+        self.angle = angle
+
+    def trim(self):
+        """
+        Trim arrays to proper size after all data are added.
+        """
+        if self.n_pings != self.n_samples.shape[0]:
+            self._resize_arrays(self.n_pings, self.power.shape[1])
@@ -8,7 +8,7 @@ from .set_groups_ek80 import SetGroupsEK80
 from .set_groups_azfp import SetGroupsAZFP
 
 
-def SetGroups(file_path, echo_type, compress=True, append_zarr=False):
+def SetGroups(file_path, echo_type, compress=True, append_zarr=False, combine_nc=False, append_nc=False):
     """Wrapper function to set groups in converted files.
 
     Parameters
@@ -19,6 +19,12 @@ def SetGroups(file_path, echo_type, compress=True, append_zarr=False):
         Type of echosounder from which data were generated
     compress: bool
         Whether or not to compress the backscatter data
+    append_zarr: bool
+        Whether or not to append to an existing .zarr file
+    combine_nc: bool
+        Whether or not the .nc file combines multiple raw files
+    append_nc: bool
+        Whether or not to append to an existing combined .nc file
 
     Returns
     -------
@@ -28,10 +34,10 @@ def SetGroups(file_path, echo_type, compress=True, append_zarr=False):
 
     # Returns specific EchoData object
     if echo_type == "EK60":
-        return SetGroupsEK60(file_path, compress, append_zarr)
+        return SetGroupsEK60(file_path, compress, append_zarr, combine_nc, append_nc)
     elif echo_type == "EK80":
-        return SetGroupsEK80(file_path, compress, append_zarr)
+        return SetGroupsEK80(file_path, compress, append_zarr, combine_nc, append_nc)
     elif echo_type == "AZFP":
-        return SetGroupsAZFP(file_path, compress, append_zarr)
+        return SetGroupsAZFP(file_path, compress, append_zarr, combine_nc, append_nc)
     else:
         raise ValueError("Unsupported file type")
@@ -2,13 +2,14 @@ import xarray as xr
 import netCDF4
 import zarr
 import os
-from .set_groups_base import SetGroupsBase
+from .set_groups_base import SetGroupsBase, profiled_group
 
 
 class SetGroupsAZFP(SetGroupsBase):
     """Class for setting groups in netCDF file for AZFP data.
     """
 
+    @profiled_group('env')
     def set_env(self, env_dict):
         """Set the Environment group in the AZFP netCDF file.
         AZFP includes additional variables 'salinity' and 'pressure'
@@ -37,13 +38,15 @@ class SetGroupsAZFP(SetGroupsBase):
 
             # save to file
             if self.format == '.nc':
-                ds.to_netcdf(path=self.file_path, mode='a', group='Environment')
+                self._save_nc(ds, self.file_path, 'Environment', append_dims=['ping_time'])
             elif self.format == '.zarr':
                 if not self.append_zarr:
                     ds.to_zarr(store=self.file_path, mode='a', group='Environment')
                 else:
+                    self._check_appended(ds, self.file_path, 'Environment', ['ping_time'])
                     ds.to_zarr(store=self.file_path, mode='a', group='Environment', append_dim='ping_time')
 
+    @profiled_group('platform')
     def set_platform(self, platform_dict):
         """Set the Platform group in the AZFP nc file. AZFP does not record pitch, roll, and heave.
 
@@ -54,7 +57,7 @@ class SetGroupsAZFP(SetGroupsBase):
         """
         if not os.path.exists(self.file_path):
             print("netCDF file does not exist, exiting without saving Platform group...")
-        elif self.format == '.nc':
+        elif self.format == '.nc' and not self.append_nc:    # Do not save platform if appending
             with netCDF4.Dataset(self.file_path, 'a', format='NETCDF4') as ncfile:
                 plat = ncfile.createGroup('Platform')
                 [plat.setncattr(k, v) for k, v in platform_dict.items()]
@@ -64,6 +67,7 @@ class SetGroupsAZFP(SetGroupsBase):
             for k, v in platform_dict.items():
                 plat.attrs[k] = v
 
+    @profiled_group('beam')
     def set_beam(self, beam_dict):
         """Set the Beam group in the AZFP nc file.
 
@@ -134,13 +138,15 @@ class SetGroupsAZFP(SetGroupsBase):
             z_settings = {'backscatter_r': {'compressor': zarr.Blosc(cname='zstd', clevel=3, shuffle=2)}}
 
         if self.format == '.nc':
-            ds.to_netcdf(path=self.file_path, mode='a', group='Beam', encoding=n_settings)
+            self._save_nc(ds, self.file_path, 'Beam', n_settings, append_dims=['ping_time'], pad_dims=['range_bin'])
         elif self.format == '.zarr':
             if not self.append_zarr:
                 ds.to_zarr(store=self.file_path, mode='a', group='Beam', encoding=z_settings)
             else:
+                self._check_appended(ds, self.file_path, 'Beam', ['ping_time'], ['range_bin'])
                 ds.to_zarr(store=self.file_path, mode='a', group='Beam', append_dim='ping_time')
 
+    @profiled_group('vendor')
     def set_vendor_specific(self, vendor_dict):
         """Set the Vendor-specific group in the AZFP nc file.
 
@@ -192,9 +198,10 @@ class SetGroupsAZFP(SetGroupsBase):
         )
 
         if self.format == '.nc':
-            ds.to_netcdf(path=self.file_path, mode='a', group='Vendor')
+            self._save_nc(ds, self.file_path, 'Vendor', append_dims=['ping_time'])
         elif self.format == '.zarr':
             if not self.append_zarr:
                 ds.to_zarr(store=self.file_path, mode='a', group='Vendor')
             else:
+                self._check_appended(ds, self.file_path, 'Vendor', ['ping_time'])
                 ds.to_zarr(store=self.file_path, mode='a', group='Vendor', append_dim='ping_time')
@@ -1,27 +1,294 @@
 from __future__ import absolute_import, division, print_function
 import os
+import functools
 import numpy as np
 import netCDF4
 import zarr
 import xarray as xr
+from ...utils.profiling import get_profiler, profiled, stage, get_path_size
+
+NC_CHUNK_SIZE = 2 ** 22   # bytes per chunk of variables along unlimited dimensions of combined .nc files
+
+
+def profiled_group(group):
+    """Decorator recording a ``set_*`` method as the ``set_groups.<group>`` stage,
+    with the number of bytes written to the output file.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, group_dict, *args, **kwargs):
+            if get_profiler() is None:
+                return func(self, group_dict, *args, **kwargs)
+            path = group_dict.get('path', self.file_path) if isinstance(group_dict, dict) else self.file_path
+            size = get_path_size(path)
+            with stage('set_groups.' + group, file=os.path.basename(path)) as record:
+                result = func(self, group_dict, *args, **kwargs)
+                record.add(n_bytes_written=max(get_path_size(path) - size, 0))
+            return result
+        return wrapper
+    return decorator
 
 
 class SetGroupsBase:
     """Base class for setting groups in netCDF file.
     """
 
-    def __init__(self, file_path='test.nc', compress=True, append_zarr=False):
+    def __init__(self, file_path='test.nc', compress=True, append_zarr=False, combine_nc=False, append_nc=False):
         self.file_path = file_path
         filename, ext = os.path.splitext(file_path)
         self.format = ext
         self.compress = compress
         self.append_zarr = append_zarr
+        self.combine_nc = combine_nc    # groups are created so that following raw files can be appended
+        self.append_nc = append_nc
+
+    @staticmethod
+    @profiled('combine')
+    def _append_to_zarr(ds, path, group, append_dims, encoding=None, pad_dims=()):
+        """Append a dataset to a group of an existing zarr file.
+
+        Each variable is appended along the one of ``append_dims`` it depends on,
+        so that groups with more than one time dimension grow along all of them.
+        Dimensions not yet in the group are created and variables that depend on
+        none of ``append_dims`` must be identical to the stored values, see ``_check_appended``.
+        As for netCDF in ``_append_to_nc``, data shorter than the stored ones along ``pad_dims``
+        are padded with fill values and longer data extend the stored arrays.
+
+        Parameters
+        ----------
+        ds : xarray.Dataset
+            data to append
+        path : str
+            path to the zarr file
+        group : str
+            group to append to
+        append_dims : list of str
+            dimensions to append along
+        encoding : dict
+            encoding of variables that are newly created
+        pad_dims : list of str
+            dimensions whose length can change between appended data
+        """
+        SetGroupsBase._check_appended(ds, path, group, append_dims, pad_dims)
+        root = zarr.open_group(path, mode='r+' if pad_dims else 'r')
+        stored_dims = set()
+        if group in root:
+            for _, arr in root[group].arrays():
+                stored_dims.update(arr.attrs.get('_ARRAY_DIMENSIONS', []))
+        for dim in pad_dims:
+            if dim not in stored_dims or dim not in ds.dims:
+                continue
+            stored = root[group][dim]
+            n_stored, n_new = stored.shape[0], ds.sizes[dim]
+            if n_new < n_stored:
+                ds = SetGroupsBase._pad_dim(ds, dim, stored[:])
+            elif n_new > n_stored:
+                # Extend the stored arrays, which are read as fill values beyond their previous length
+                for _, arr in root[group].arrays():
+                    arr_dims = arr.attrs.get('_ARRAY_DIMENSIONS', [])
+                    if dim in arr_dims:
+                        arr.resize(tuple(n_new if d == dim else n for d, n in zip(arr_dims, arr.shape)))
+                stored[n_stored:] = ds[dim].values[n_stored:]
+        for dim in append_dims:
+            var_names = [var for var in ds.data_vars if dim in ds[var].dims]
+            if not var_names or ds.dims[dim] == 0:
+                continue
+            if dim in stored_dims:
+                ds[var_names].to_zarr(store=path, mode='a', group=group, append_dim=dim)
+            else:
+                var_encoding = {var: encoding[var] for var in var_names if encoding and var in encoding}
+                ds[var_names].to_zarr(store=path, mode='a', group=group, encoding=var_encoding)
+
+    @staticmethod
+    def _check_appended(ds, path, group, append_dims=(), pad_dims=()):
+        """Raise ValueError if data of ``ds`` that are not appended differ from those stored in ``group``.
+
+        Variables that depend on none of ``append_dims`` and ``pad_dims``, such as calibration
+        and environmental parameters, are only saved from the first raw file,
+        so they must be identical in all raw files combined into one file.
+
+        Parameters
+        ----------
+        ds : xarray.Dataset
+            data to append
+        path : str
+            path to the .nc or .zarr file
+        group : str
+            group to append to
+        append_dims : list of str
+            dimensions to append along
+        pad_dims : list of str
+            dimensions whose length can change between appended data
+        """
+        engine = 'zarr' if os.path.splitext(path)[1] == '.zarr' else 'netcdf4'
+        with xr.open_dataset(path, group=group, engine=engine, decode_times=False) as ds_stored:
+            for name, var in ds.variables.items():
+                if set(var.dims) & (set(append_dims) | set(pad_dims)) or name not in ds_stored.variables:
+                    continue
+                if not var.equals(ds_stored.variables[name]):
+                    raise ValueError(f"{name} in group {group} differs from the data saved to "
+                                     f"{os.path.basename(path)}, files with different parameters "
+                                     f"cannot be combined")
+
+    @staticmethod
+    def _pad_dim(ds, dim, coord):
+        """Pad the variables of ``ds`` along ``dim`` to the coordinate values ``coord``.
+
+        Integer variables are padded with their ``_FillValue`` and other variables with NaN.
+        """
+        n_pad = coord.size - ds.sizes[dim]
+        padded = {}
+        for name, da in ds.data_vars.items():
+            if dim in da.dims:
+                padded[name] = da.drop_vars(dim).pad({dim: (0, n_pad)},
+                                                     constant_values=da.attrs.get('_FillValue', np.nan))
+        return ds.drop_vars([dim] + list(padded)).assign_coords({dim: coord}).assign(padded)
+
+    def _save_nc(self, ds, path, group, encoding=None, append_dims=(), pad_dims=()):
+        """Save a group to a netCDF file.
+
+        In a .nc file combining multiple raw files, ``append_dims`` and ``pad_dims`` are
+        created as unlimited dimensions, so that the data of the following raw files can be
+        appended in place by ``_append_to_nc`` instead of rewriting the file.
+        Groups without ``append_dims`` are only saved from the first raw file.
+        Data of following raw files that are not appended must be identical to the saved ones.
 
+        Parameters
+        ----------
+        ds : xarray.Dataset
+            data to save
+        path : str
+            path to the netCDF file
+        group : str
+            group to save to
+        encoding : dict
+            encoding of variables
+        append_dims : list of str
+            dimensions along which the data of following raw files are appended
+        pad_dims : list of str
+            dimensions whose length can change between raw files, shorter data are padded with fill values
+        """
+        if self.append_nc:
+            self._check_appended(ds, path, group, append_dims, pad_dims)
+            if append_dims:
+                self._append_to_nc(ds, path, group, append_dims, encoding)
+            return
+        if not self.combine_nc:
+            ds.to_netcdf(path=path, mode='a', group=group, encoding=encoding)
+            return
+        unlimited_dims = [dim for dim in list(append_dims) + list(pad_dims) if dim in ds.dims]
+        encoding = self._get_nc_chunks(ds, unlimited_dims, append_dims, encoding)
+        # Integer data padded along pad_dims need a fill value to be read as NaN
+        for name, da in ds.data_vars.items():
+            if da.dtype.kind in 'iu' and set(da.dims) & set(pad_dims) and '_FillValue' not in da.attrs:
+                encoding.setdefault(name, {})['_FillValue'] = netCDF4.default_fillvals[da.dtype.str[1:]]
+        ds.to_netcdf(path=path, mode='a', group=group, unlimited_dims=unlimited_dims, encoding=encoding)
+
+    @staticmethod
+    def _get_nc_chunks(ds, unlimited_dims, append_dims, encoding=None):
+        """Add chunk sizes to the encoding of variables along unlimited dimensions.
+
+        The default chunks of netCDF along unlimited dimensions are too small for echo data.
+        Chunks span the whole data along other dimensions and are split along ``append_dims``
+        to about ``NC_CHUNK_SIZE`` bytes.
+        """
+        encoding = {var: dict(enc) for var, enc in encoding.items()} if encoding else {}
+        for name, da in ds.variables.items():
+            if not set(da.dims) & set(unlimited_dims):
+                continue
+            chunks = [max(n, 1) for n in da.shape]
+            itemsize = da.dtype.itemsize if da.dtype.kind not in 'OSU' else 8
+            for i, dim in enumerate(da.dims):
+                if dim in append_dims:
+                    chunks[i] = max(1, min(chunks[i], NC_CHUNK_SIZE * chunks[i] // (np.prod(chunks) * itemsize)))
+            encoding.setdefault(name, {})['chunksizes'] = tuple(chunks)
+        return encoding
+
+    @staticmethod
+    def _encode_nc_values(da, var):
+        """Return the values of ``da`` as stored in the netCDF variable ``var``.
+
+        Times are encoded in the units and calendar of ``var``, strings are saved with
+        variable length and NaN in integer variables are masked to be saved as fill values.
+        """
+        data = da.transpose(*var.dimensions).values
+        if data.dtype.kind == 'M':
+            data, _, _ = xr.coding.times.encode_cf_datetime(data, units=var.units,
+                                                           calendar=getattr(var, 'calendar', None))
+        elif data.dtype.kind == 'U':
+            data = data.astype(object)    # variable length strings
+        elif np.dtype(var.dtype).kind in 'iu' and data.dtype.kind == 'f':
+            data = np.ma.masked_invalid(data)
+        return data
+
+    @staticmethod
+    @profiled('combine')
+    def _append_to_nc(ds, path, group, append_dims, encoding=None):
+        """Append a dataset to a group of a combined netCDF file.
+
+        As for zarr in ``_append_to_zarr``, each variable is appended along the one of ``append_dims``
+        it depends on. Variables that depend on none of ``append_dims`` are not written, they are
+        checked to be identical to the stored values by ``_save_nc``.
+        Data shorter than the stored ones along other unlimited dimensions are padded with fill values,
+        longer data extend these dimensions. Packed data are written as they are, without applying
+        the ``scale_factor`` of the stored variables again.
+
+        Parameters
+        ----------
+        ds : xarray.Dataset
+            data to append
+        path : str
+            path to the netCDF file
+        group : str
+            group to append to
+        append_dims : list of str
+            dimensions to append along, unlimited dimensions of the group
+        encoding : dict
+            encoding of variables that are newly created
+        """
+        new_dims = []
+        with netCDF4.Dataset(path, mode='a') as ncfile:
+            ncfile.set_auto_scale(False)
+            nc_grp = ncfile[group]
+            # Extend the coordinates of other unlimited dimensions if the new data are longer
+            for name, da in ds.variables.items():
+                if set(da.dims) & set(append_dims) or name not in nc_grp.variables:
+                    continue
+                var = nc_grp.variables[name]
+                if any(n > s for n, s in zip(da.shape, var.shape)):
+                    var[tuple(slice(0, n) for n in da.shape)] = SetGroupsBase._encode_nc_values(da, var)
+            for dim in append_dims:
+                if dim not in ds.dims or ds.sizes[dim] == 0:
+                    continue
+                if dim not in nc_grp.dimensions:
+                    new_dims.append(dim)
+                    continue
+                start = len(nc_grp.dimensions[dim])
+                for name, da in ds.variables.items():
+                    if dim not in da.dims:
+                        continue
+                    var = nc_grp.variables[name]
+                    data = SetGroupsBase._encode_nc_values(da, var)
+                    var[tuple(slice(start, start + n) if d == dim else slice(0, n)
+                              for d, n in zip(var.dimensions, data.shape))] = data
+
+        # Dimensions not yet in the group are created
+        for dim in new_dims:
+            var_names = [var for var in ds.data_vars if dim in ds[var].dims]
+            ds_new = ds[var_names]
+            ds_new.to_netcdf(path=path, mode='a', group=group, unlimited_dims=[dim],
+                             encoding=SetGroupsBase._get_nc_chunks(
+                                 ds_new, [dim], [dim],
+                                 {var: encoding[var] for var in var_names if encoding and var in encoding}))
+
+    @profiled_group('toplevel')
     def set_toplevel(self, tl_dict):
         """Set attributes in the Top-level group."""
         if self.format == '.nc':
-            with netCDF4.Dataset(self.file_path, "w", format="NETCDF4") as ncfile:
-                [ncfile.setncattr(k, v) for k, v in tl_dict.items()]
+            # Do not save toplevel if appending
+            if not self.append_nc:
+                with netCDF4.Dataset(self.file_path, "w", format="NETCDF4") as ncfile:
+                    [ncfile.setncattr(k, v) for k, v in tl_dict.items()]
         elif self.format == '.zarr':
             # Do not save toplevel if appending
             if not self.append_zarr:
@@ -31,6 +298,7 @@ class SetGroupsBase:
         else:
             raise ValueError("Unsupported file format")
 
+    @profiled_group('provenance')
     def set_provenance(self, prov_dict):
         """Set the Provenance group in the nc file.
 
@@ -57,12 +325,15 @@ class SetGroupsBase:
 
         # save to file
         if self.format == '.nc':
-            ds.to_netcdf(path=self.file_path, mode='a', group='Provenance')
+            # Do not save provenance group if appending
+            if not self.append_nc:
+                ds.to_netcdf(path=self.file_path, mode='a', group='Provenance')
         elif self.format == '.zarr':
             # Do not save provenance group if appending
             if not self.append_zarr:
                 ds.to_zarr(store=self.file_path, mode='a', group='Provenance')
 
+    @profiled_group('sonar')
     def set_sonar(self, sonar_dict):
         """Set the Sonar group in the nc file.
 
@@ -73,6 +344,9 @@ class SetGroupsBase:
         """
         # create group
         if self.format == '.nc':
+            # Do not save sonar group if appending
+            if self.append_nc:
+                return
             ncfile = netCDF4.Dataset(self.file_path, "a", format="NETCDF4")
             snr = ncfile.createGroup("Sonar")
 
@@ -91,6 +365,7 @@ class SetGroupsBase:
                 for k, v in sonar_dict.items():
                     snr.attrs[k] = v
 
+    @profiled_group('nmea')
     def set_nmea(self, nmea_dict):
         """Set the Platform/NMEA group in the nc file.
 
@@ -121,7 +396,7 @@ class SetGroupsBase:
                 attrs={'description': 'All NMEA sensor datagrams'})
 
             # Splits up the time dimension. Used for when range bin length varies with time
-            if 'ping_slice' in nmea_dict:
+            if 'ping_slice' in nmea_dict and time.size:
                 # Slice using ping_time which does not map perfectly with nmea_time.
                 # Rounds ping_time slice values to nmea_time
                 lower = (nmea_dict['ping_slice'][0] - np.datetime64('1900-01-01T00:00:00')) \
@@ -143,9 +418,9 @@ class SetGroupsBase:
 
             # save to file
             if self.format == '.nc':
-                ds.to_netcdf(path=save_path, mode='a', group='Platform/NMEA', encoding=nc_encoding)
+                self._save_nc(ds, save_path, 'Platform/NMEA', nc_encoding, append_dims=['time'])
             elif self.format == '.zarr':
                 if not self.append_zarr:
                     ds.to_zarr(store=save_path, mode='a', group='Platform/NMEA', encoding=zarr_encoding)
                 else:
-                    ds.to_zarr(store=save_path, mode='a', group='Platform/NMEA', append_dim='time')
+                    self._append_to_zarr(ds, save_path, 'Platform/NMEA', ['time'], zarr_encoding)
@@ -2,13 +2,14 @@ import xarray as xr
 import os
 import numpy as np
 import zarr
-from .set_groups_base import SetGroupsBase
+from .set_groups_base import SetGroupsBase, profiled_group
 
 
 class SetGroupsEK60(SetGroupsBase):
     """Class for setting groups in netCDF file for EK60 data.
     """
 
+    @profiled_group('env')
     def set_env(self, env_dict):
         """Set the Environment group in the EK60 netCDF file.
 
@@ -45,13 +46,19 @@ class SetGroupsEK60(SetGroupsBase):
             ds.frequency.attrs['valid_min'] = 0.0
 
             # save to file
+            # Only save environment group if not appending to an existing file
             if self.format == '.nc':
-                ds.to_netcdf(path=self.file_path, mode='a', group='Environment')
+                if not self.append_nc:
+                    ds.to_netcdf(path=self.file_path, mode='a', group='Environment')
+                else:
+                    self._check_appended(ds, self.file_path, 'Environment')
             elif self.format == '.zarr':
-                # Only save environment group if not appending to an existing .zarr file
                 if not self.append_zarr:
                     ds.to_zarr(store=self.file_path, mode='a', group='Environment')
+                else:
+                    self._check_appended(ds, self.file_path, 'Environment')
 
+    @profiled_group('platform')
     def set_platform(self, platform_dict):
         """Set the Platform group in the EK60 nc file.
 
@@ -127,7 +134,9 @@ class SetGroupsEK60(SetGroupsBase):
                             / np.timedelta64(1, 's')
                 upper = (platform_dict['ping_slice'][-1] - np.datetime64('1900-01-01T00:00:00')) \
                             / np.timedelta64(1, 's')
-                ds = ds.sel(ping_time=slice(lower, upper)).sel(location_time=slice(lower, upper))
+                ds = ds.sel(ping_time=slice(lower, upper))
+                if 'location_time' in ds.dims:
+                    ds = ds.sel(location_time=slice(lower, upper))
 
             # Configure compression settings
             nc_encoding = {}
@@ -140,13 +149,16 @@ class SetGroupsEK60(SetGroupsBase):
 
             # save to file
             if self.format == '.nc':
-                ds.to_netcdf(path=platform_dict['path'], mode='a', group='Platform', encoding=nc_encoding)
+                self._save_nc(ds, platform_dict['path'], 'Platform', nc_encoding,
+                              append_dims=['ping_time', 'location_time'])
             elif self.format == '.zarr':
                 if not self.append_zarr or platform_dict['overwrite_plat']:
                     ds.to_zarr(store=platform_dict['path'], mode='w', group='Platform', encoding=zarr_encoding)
                 else:
-                    ds.to_zarr(store=platform_dict['path'], mode='a', group='Platform', append_dim='ping_time')
+                    self._append_to_zarr(ds, platform_dict['path'], 'Platform',
+                                         ['ping_time', 'location_time'], zarr_encoding)
 
+    @profiled_group('beam')
     def set_beam(self, beam_dict):
         """Set the Beam group in the EK60 nc file.
 
@@ -167,11 +179,14 @@ class SetGroupsEK60(SetGroupsBase):
             ds = xr.Dataset(
                 {'backscatter_r': (['frequency', 'ping_time', 'range_bin'], beam_dict['backscatter_r'],
                                    {'long_name': 'Backscatter power',
-                                    'units': 'dB'}),
+                                    'units': 'dB',
+                                    **beam_dict['packed_attrs']['backscatter_r']}),
                  'angle_athwartship': (['frequency', 'ping_time', 'range_bin'], beam_dict['angle_dict'][:, :, :, 0],
-                                       {'long_name': 'electrical athwartship angle'}),
+                                       {'long_name': 'electrical athwartship angle',
+                                        **beam_dict['packed_attrs']['angle']}),
                  'angle_alongship': (['frequency', 'ping_time', 'range_bin'], beam_dict['angle_dict'][:, :, :, 1],
-                                       {'long_name': 'electrical alongship angle'}),
+                                       {'long_name': 'electrical alongship angle',
+                                        **beam_dict['packed_attrs']['angle']}),
                  'beam_type': ('frequency', beam_dict['beam_type'],
                                {'long_name': 'type of transducer (0-single, 1-split)'}),
                  'beamwidth_receive_alongship': (['frequency'], beam_dict['beamwidth_receive_major'],
@@ -282,6 +297,10 @@ class SetGroupsEK60(SetGroupsBase):
             ds['channel_id'] = ('frequency', beam_dict['channel_id'])
             ds['gpt_software_version'] = ('frequency', beam_dict['gpt_software_version'])
             ds['sa_correction'] = ('frequency', beam_dict['sa_correction'])
+            # Only saved for pings padded to the longest range_bin
+            if 'sample_count' in beam_dict:
+                ds['sample_count'] = (['frequency', 'ping_time'], beam_dict['sample_count'],
+                                      {'long_name': 'Number of samples recorded in each ping'})
 
             # Configure compression settings
             nc_encoding = {}
@@ -294,9 +313,11 @@ class SetGroupsEK60(SetGroupsBase):
 
             # save to file
             if self.format == '.nc':
-                ds.to_netcdf(path=beam_dict['path'], mode='a', group='Beam', encoding=nc_encoding)
+                self._save_nc(ds, beam_dict['path'], 'Beam', nc_encoding,
+                              append_dims=['ping_time'], pad_dims=['range_bin'])
             elif self.format == '.zarr':
                 if not self.append_zarr or beam_dict['overwrite_beam']:
                     ds.to_zarr(store=beam_dict['path'], mode='w', group='Beam', encoding=zarr_encoding)
                 else:
-                    ds.to_zarr(store=beam_dict['path'], mode='a', group='Beam', append_dim='ping_time')
+                    self._append_to_zarr(ds, beam_dict['path'], 'Beam', ['ping_time'], zarr_encoding,
+                                         pad_dims=['range_bin'])
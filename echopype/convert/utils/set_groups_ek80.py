@@ -3,13 +3,14 @@ import os
 import numpy as np
 import netCDF4
 import zarr
-from .set_groups_base import SetGroupsBase
+from .set_groups_base import SetGroupsBase, profiled_group
 
 
 class SetGroupsEK80(SetGroupsBase):
     """Class for setting groups in netCDF file for EK80 data.
     """
 
+    @profiled_group('env')
     def set_env(self, env_dict):
         """Set the Environment group in the EK80 netCDF file.
 
@@ -23,6 +24,9 @@ class SetGroupsEK80(SetGroupsBase):
         """
         # Only save environment group if file_path exists
         if self.format == '.nc':
+            # Only save environment group if not appending to an existing .nc file
+            if self.append_nc:
+                return
             ncfile = netCDF4.Dataset(self.file_path, "a", format="NETCDF4")
             env = ncfile.createGroup("Environment")
 
@@ -41,6 +45,7 @@ class SetGroupsEK80(SetGroupsBase):
                 for k, v in env_dict.items():
                     env.attrs[k] = v
 
+    @profiled_group('platform')
     def set_platform(self, platform_dict):
         """Set the Platform group in the EK60 nc file.
 
@@ -119,13 +124,16 @@ class SetGroupsEK80(SetGroupsBase):
 
             # save to file
             if self.format == '.nc':
-                ds.to_netcdf(path=self.file_path, mode='a', group='Platform', encoding=nc_encoding)
+                self._save_nc(ds, self.file_path, 'Platform', nc_encoding,
+                              append_dims=['mru_time', 'location_time'])
             elif self.format == '.zarr':
                 if not self.append_zarr:
                     ds.to_zarr(store=self.file_path, mode='w', group='Platform', encoding=zarr_encoding)
                 else:
-                    ds.to_zarr(store=self.file_path, mode='a', group='Platform', append_dim='ping_time')
+                    self._append_to_zarr(ds, self.file_path, 'Platform',
+                                         ['mru_time', 'location_time'], zarr_encoding)
 
+    @profiled_group('sonar')
     def set_sonar(self, sonar_dict):
         """Set the Sonar group in the nc file.
 
@@ -136,7 +144,7 @@ class SetGroupsEK80(SetGroupsBase):
         """
         # The following variables should be non-unique
         save_path = sonar_dict.pop('path')
-        sonar = list(sonar_dict)[1]
+        sonar = list(sonar_dict)[0]
         sonar_manufacturer = sonar_dict[sonar]['sonar_manufacturer']
         sonar_software_name = sonar_dict[sonar]['sonar_software_name']
         sonar_software_version = sonar_dict[sonar]['sonar_software_version']
@@ -161,12 +169,15 @@ class SetGroupsEK80(SetGroupsBase):
 
         # save to file
         if self.format == '.nc':
-            ds.to_netcdf(path=save_path, mode='a', group='Sonar')
+            # Don't save sonar if appending
+            if not self.append_nc:
+                ds.to_netcdf(path=save_path, mode='a', group='Sonar')
         elif self.format == '.zarr':
             # Don't save sonar if appending
             if not self.append_zarr:
                 ds.to_zarr(store=save_path, mode='a', group='Sonar')
 
+    @profiled_group('beam')
     def set_beam(self, beam_dict):
         """Set the Beam group in the EK80 nc file.
 
@@ -357,13 +368,16 @@ class SetGroupsEK80(SetGroupsBase):
 
             # save to file
             if self.format == '.nc':
-                ds.to_netcdf(path=beam_dict['path'], mode='a', group='Beam', encoding=nc_encoding)
+                self._save_nc(ds, beam_dict['path'], 'Beam', nc_encoding,
+                              append_dims=['ping_time'], pad_dims=['range_bin'])
             elif self.format == '.zarr':
                 if not self.append_zarr:
                     ds.to_zarr(store=beam_dict['path'], mode='w', group='Beam', encoding=zarr_encoding)
                 else:
+                    self._check_appended(ds, beam_dict['path'], 'Beam', ['ping_time'], ['range_bin'])
                     ds.to_zarr(store=beam_dict['path'], mode='a', group='Beam', append_dim='ping_time')
 
+    @profiled_group('vendor')
     def set_vendor(self, vendor_dict):
         """Set the Vendor group in the EK80 nc file.
 
@@ -378,6 +392,9 @@ class SetGroupsEK80(SetGroupsBase):
             print('netCDF file does not exist, exiting without saving Vendor group...')
         else:
             if self.format == '.nc':
+                # Filter coefficients are saved from the first file when appending
+                if self.append_nc:
+                    return
                 ncfile = netCDF4.Dataset(self.file_path, "a", format="NETCDF4")
                 vdr = ncfile.createGroup("Vendor")
                 # Create compound datatype. (2 f32 values to make a c64 value)
@@ -6,18 +6,19 @@ import datetime as dt
 import numpy as np
 import xarray as xr
 from ..utils import uwa
-from .processbase import ProcessBase
+from .processbase import ProcessBase, count_pings
+from ..utils.profiling import profiled
 
 
 class ProcessAZFP(ProcessBase):
     """Class for manipulating AZFP echo data already converted to netCDF.
     """
-    def __init__(self, file_path="", salinity=29.6, pressure=60, temperature=None):
-        ProcessBase.__init__(self, file_path)
+    def __init__(self, file_path="", salinity=29.6, pressure=60, temperature=None, chunks=None):
+        ProcessBase.__init__(self, file_path, chunks)
         self._salinity = salinity    # salinity in [psu]
         self._pressure = pressure    # pressure in [dbars] (approximately equal to depth in meters)
         if temperature is None:
-            with self._open_dataset(self.file_path, group='Environment') as ds_env:
+            with self._open_group(self.file_path, group='Environment') as ds_env:
                 print("Initialize using average temperature recorded by instrument")
                 self._temperature = np.nanmean(ds_env.temperature)   # temperature in [Celsius]
         else:
@@ -40,7 +41,7 @@ class ProcessAZFP(ProcessBase):
         Tilt of echosounder in degrees
         """
         if self._tilt_angle is None:
-            with self._open_dataset(self.file_path, group='Beam') as ds_beam:
+            with self._open_group(self.file_path, group='Beam') as ds_beam:
                 self._tilt_angle = np.rad2deg(np.arccos(ds_beam.cos_tilt_mag.mean().data))
         return self._tilt_angle
 
@@ -68,7 +69,7 @@ class ProcessAZFP(ProcessBase):
         -------
         An xarray DataArray containing the sea absorption with coordinate frequency
         """
-        with self._open_dataset(self.file_path, group='Beam') as ds_beam:
+        with self._open_group(self.file_path, group='Beam') as ds_beam:
             freq = ds_beam.frequency.astype(np.int64)  # should already be in unit [Hz]
         if src == 'user':
             return uwa.calc_seawater_absorption(freq,
@@ -85,7 +86,7 @@ class ProcessAZFP(ProcessBase):
 
         This will call ``calc_sound_speed`` since sound speed is `not` part of the raw AZFP .01A data file.
         """
-        with self._open_dataset(self.file_path, group="Beam") as ds_beam:
+        with self._open_group(self.file_path, group="Beam") as ds_beam:
             sth = self.sound_speed * ds_beam.sample_interval / 2
             return sth
 
@@ -101,8 +102,8 @@ class ProcessAZFP(ProcessBase):
         -------
         An xarray DataArray containing the range with coordinate frequency
         """
-        ds_beam = self._open_dataset(self.file_path, group='Beam')
-        ds_vend = self._open_dataset(self.file_path, group='Vendor')
+        ds_beam = self._get_group(self.file_path, group='Beam')
+        ds_vend = self._get_group(self.file_path, group='Vendor')
 
         range_samples = ds_vend.number_of_samples_per_average_bin   # WJ: same as "range_samples_per_bin" used to calculate "sample_interval"
         pulse_length = ds_beam.transmit_duration_nominal   # units: seconds
@@ -113,7 +114,7 @@ class ProcessAZFP(ProcessBase):
 
         # Below is from LoadAZFP.m, the output is effectively range_bin+1 when bins_to_avg=1
         range_mod = xr.DataArray(np.arange(1, len(ds_beam.range_bin) - bins_to_avg + 2, bins_to_avg),
-                                 coords=[('range_bin', ds_beam.range_bin)])
+                                 coords=[('range_bin', ds_beam.range_bin.values)])
 
         # Calculate range using parameters for each freq
         range_meter = (sound_speed * lockout_index / (2 * dig_rate) + sound_speed / 4 *
@@ -123,11 +124,9 @@ class ProcessAZFP(ProcessBase):
         if tilt_corrected:
             range_meter = ds_beam.cos_tilt_mag.mean() * range_meter
 
-        ds_beam.close()
-        ds_vend.close()
-
         return range_meter
 
+    @profiled('calibrate', counts=count_pings('Sv'))
     def calibrate(self, save=False, save_postfix='_Sv', save_path=None):
         """Perform echo-integration to get volume backscattering strength (Sv) from AZFP power data.
 
@@ -151,7 +150,7 @@ class ProcessAZFP(ProcessBase):
         print('%s  calibrating data in %s' % (dt.datetime.now().strftime('%H:%M:%S'), self.file_path))
 
         # Open data set for Environment and Beam groups
-        ds_beam = self._open_dataset(self.file_path, group="Beam")
+        ds_beam = self._get_group(self.file_path, group="Beam")
 
         range_meter = self.range
         Sv = (ds_beam.EL - 2.5 / ds_beam.DS + ds_beam.backscatter_r / (26214 * ds_beam.DS) -
@@ -165,7 +164,7 @@ class ProcessAZFP(ProcessBase):
         Sv = Sv.to_dataset()
 
         # Attached calculated range into the dataset
-        Sv['range'] = (('frequency', 'range_bin'), self.range)
+        Sv['range'] = (('frequency', 'range_bin'), self.range.data)
 
         # Save calibrated data into the calling instance and
         #  to a separate .nc file in the same directory as the data filef.Sv = Sv
@@ -175,9 +174,7 @@ class ProcessAZFP(ProcessBase):
             print("{} saving calibrated Sv to {}".format(dt.datetime.now().strftime('%H:%M:%S'), self.Sv_path))
             self._save_dataset(self.Sv, self.Sv_path, mode="w")
 
-        # Close opened resources
-        ds_beam.close()
-
+    @profiled('calibrate', counts=count_pings('TS'))
     def calibrate_TS(self, save=False, save_postfix='_TS', save_path=None):
         """Perform echo-integration to get Target Strength (TS) from AZFP power data.
 
@@ -201,7 +198,7 @@ class ProcessAZFP(ProcessBase):
             TS.name = "TS"
             TS = TS.to_dataset()
             # Attached calculated range into the dataset
-            TS['range'] = (('frequency', 'range_bin'), self.range)
+            TS['range'] = (('frequency', 'range_bin'), self.range.data)
             self.TS = TS
             if save:
                 self.TS_path = self.validate_path(save_path, save_postfix)
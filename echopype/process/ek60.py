@@ -5,14 +5,15 @@ echopype data model inherited from based class Process for EK60 data.
 import datetime as dt
 import numpy as np
 from ..utils import uwa
-from .processbase import ProcessBase
+from .processbase import ProcessBase, count_pings
+from ..utils.profiling import profiled
 
 
 class ProcessEK60(ProcessBase):
     """Class for manipulating EK60 echo data already converted to netCDF.
     """
-    def __init__(self, file_path=""):
-        ProcessBase.__init__(self, file_path)
+    def __init__(self, file_path="", chunks=None):
+        ProcessBase.__init__(self, file_path, chunks)
         self.tvg_correction_factor = 2  # range bin offset factor for calculating time-varying gain in EK60
 
         # Initialize environment-related parameters
@@ -22,7 +23,7 @@ class ProcessEK60(ProcessBase):
         self._seawater_absorption = self.calc_seawater_absorption()
 
         # Initialize calibration-related parameters
-        with self._open_dataset(self.file_path, group="Beam") as ds_beam:
+        with self._open_group(self.file_path, group="Beam") as ds_beam:
             self._gain_correction = ds_beam.gain_correction
             self._equivalent_beam_angle = ds_beam.equivalent_beam_angle
             self._sa_correction = ds_beam.sa_correction
@@ -55,7 +56,7 @@ class ProcessEK60(ProcessBase):
     # Environmental and derived parameters
     def calc_sound_speed(self, src='file'):
         if src == 'file':
-            with self._open_dataset(self.file_path, group="Environment") as ds_env:
+            with self._open_group(self.file_path, group="Environment") as ds_env:
                 return ds_env.sound_speed_indicative
         elif src == 'user':
             ss = uwa.calc_sound_speed(salinity=self.salinity,
@@ -79,10 +80,10 @@ class ProcessEK60(ProcessBase):
         Seawater absorption value
         """
         if src == 'file':
-            with self._open_dataset(self.file_path, group="Environment") as ds_env:
+            with self._open_group(self.file_path, group="Environment") as ds_env:
                 return ds_env.absorption_indicative
         elif src == 'user':
-            with self._open_dataset(self.file_path, group='Beam') as ds_beam:
+            with self._open_group(self.file_path, group='Beam') as ds_beam:
                 freq = ds_beam.frequency.astype(np.int64)  # should already be in unit [Hz]
             return uwa.calc_seawater_absorption(freq,
                                                 temperature=self.temperature,
@@ -93,19 +94,20 @@ class ProcessEK60(ProcessBase):
             ValueError('Not sure how to update seawater absorption!')
 
     def calc_sample_thickness(self):
-        with self._open_dataset(self.file_path, group="Beam") as ds_beam:
+        with self._open_group(self.file_path, group="Beam") as ds_beam:
             sth = self.sound_speed * ds_beam.sample_interval / 2  # sample thickness
             return sth
 
     def calc_range(self):
         """Calculates range in meters using parameters stored in the .nc file.
         """
-        with self._open_dataset(self.file_path, group="Beam") as ds_beam:
+        with self._open_group(self.file_path, group="Beam") as ds_beam:
             range_meter = self.sample_thickness * ds_beam.range_bin - \
                 self.tvg_correction_factor * self.sample_thickness  # DataArray [frequency x range_bin]
             range_meter = range_meter.where(range_meter > 0, other=0)
             return range_meter
 
+    @profiled('calibrate', counts=count_pings('Sv'))
     def calibrate(self, save=False, save_postfix='_Sv', save_path=None):
         """Perform echo-integration to get volume backscattering strength (Sv) from EK60 power data.
 
@@ -123,7 +125,7 @@ class ProcessEK60(ProcessBase):
         print('%s  calibrating data in %s' % (dt.datetime.now().strftime('%H:%M:%S'), self.file_path))
 
         # Open data set for Environment and Beam groups
-        ds_beam = self._open_dataset(self.file_path, group="Beam")
+        ds_beam = self._get_group(self.file_path, group="Beam")
 
         # Derived params
         wavelength = self.sound_speed / ds_beam.frequency  # wavelength
@@ -148,7 +150,7 @@ class ProcessEK60(ProcessBase):
         Sv = Sv.to_dataset()
 
         # Attach calculated range into data set
-        Sv['range'] = (('frequency', 'range_bin'), self.range)
+        Sv['range'] = (('frequency', 'range_bin'), self.range.data)
 
         # Save calibrated data into the calling instance and
         #  to a separate .nc file in the same directory as the data filef.Sv = Sv
@@ -158,9 +160,7 @@ class ProcessEK60(ProcessBase):
             print('%s  saving calibrated Sv to %s' % (dt.datetime.now().strftime('%H:%M:%S'), self.Sv_path))
             self._save_dataset(Sv, self.Sv_path, mode="w")
 
-        # Close opened resources
-        ds_beam.close()
-
+    @profiled('calibrate', counts=count_pings('TS'))
     def calibrate_TS(self, save=False, save_postfix='_TS', save_path=None):
         """Perform echo-integration to get Target Strength (TS) from EK60 power data.
 
@@ -176,8 +176,8 @@ class ProcessEK60(ProcessBase):
         """
 
         # Open data set for Environment and Beam groups
-        ds_env = self._open_dataset(self.file_path, group="Environment")
-        ds_beam = self._open_dataset(self.file_path, group="Beam")
+        ds_env = self._get_group(self.file_path, group="Environment")
+        ds_beam = self._get_group(self.file_path, group="Beam")
         # Derived params
         wavelength = self.sound_speed / ds_env.frequency  # wavelength
 
@@ -199,7 +199,7 @@ class ProcessEK60(ProcessBase):
         TS = TS.to_dataset()
 
         # Attach calculated range into data set
-        TS['range'] = (('frequency', 'range_bin'), self.range)
+        TS['range'] = (('frequency', 'range_bin'), self.range.data)
 
         # Save calibrated data into the calling instance and
         #  to a separate .nc file in the same directory as the data filef.Sv = Sv
@@ -208,7 +208,3 @@ class ProcessEK60(ProcessBase):
             self.TS_path = self.validate_path(save_path, save_postfix)
             print('%s  saving calibrated TS to %s' % (dt.datetime.now().strftime('%H:%M:%S'), self.TS_path))
             self._save_dataset(TS, self.TS_path, mode="w")
-
-        # Close opened resources
-        ds_env.close()
-        ds_beam.close()
@@ -4,18 +4,117 @@ echopype data model inherited from based class Process for EK80 data.
 
 import os
 import datetime as dt
+import functools
 import numpy as np
 import xarray as xr
-from scipy import signal
+from scipy import signal, fft
 from ..utils import uwa
-from .processbase import ProcessBase
+from .processbase import ProcessBase, count_pings
+from ..utils.profiling import profiled
+
+
+REPLICA_CACHE_SIZE = 64     # number of transmit configurations kept by ``get_transmit_replica``
+REPLICA_FFT_SIZES = 8       # number of FFT sizes kept for each replica
+
+
+def _to_complex(fil):
+    """Convert filter coefficients saved as a compound datatype in netCDF to complex64.
+    """
+    if fil.dtype.names is not None:
+        fil = fil[fil.dtype.names[0]] + 1j * fil[fil.dtype.names[1]]
+    return np.asarray(fil, dtype='complex64')
+
+
+class TransmitReplica(object):
+    """Decimated EK80 transmit signal used as replica in pulse compression,
+    together with the quantities derived from it.
+
+    Parameters
+    ----------
+    ytx : np.ndarray
+        transmit signal after the WBT and PC filters and decimations
+    """
+    def __init__(self, ytx):
+        ytx.setflags(write=False)   # replicas are shared by all files with the same settings
+        self.signal = ytx
+        self.matched = np.flipud(np.conj(ytx))
+        self.norm = np.linalg.norm(ytx)
+        ptxa = np.square(np.abs(signal.convolve(ytx, self.matched, method='direct') / self.norm ** 2))
+        # Effective pulse length in number of samples
+        self.tau_effective = np.sum(ptxa) / np.max(ptxa)
+        self._fft = {}
+
+    def get_fft(self, nfft):
+        """FFT of the time-reversed conjugate of the replica, with ``nfft`` points.
+        """
+        if nfft not in self._fft:
+            if len(self._fft) >= REPLICA_FFT_SIZES:
+                del self._fft[next(iter(self._fft))]
+            self._fft[nfft] = fft.fft(self.matched, nfft)
+        return self._fft[nfft]
+
+
+@functools.lru_cache(maxsize=REPLICA_CACHE_SIZE)
+def get_transmit_replica(f0, f1, tau, slope, amp, wbt_fil, wbt_decimation, pc_fil, pc_decimation):
+    """Generate the transmit signal of an EK80 channel as a replica for pulse compression.
+
+    Replicas are cached on all their arguments, so that files recorded with the same settings
+    only generate them once.
+
+    Parameters
+    ----------
+    f0, f1 : float
+        start and end frequencies of the chirp [Hz]
+    tau : float
+        nominal transmit duration [s]
+    slope : float
+        slope of the Hanning taper
+    amp : float
+        amplitude of the transmit signal, derived from the transmit power
+    wbt_fil, pc_fil : bytes
+        WBT and PC filter coefficients as complex64 bytes
+    wbt_decimation, pc_decimation : int
+        decimation factors after each filter
+
+    Returns
+    -------
+    TransmitReplica
+    """
+    def chirp_linear(t, f0, f1, tau):
+        beta = (f1 - f0) * (tau ** -1)
+        return np.cos(2 * np.pi * (beta / 2 * (t ** 2) + f0 * t))
+
+    delta = 1 / 1.5e6   # Hard-coded EK80 sample interval
+
+    # Create transmit signal
+    t = np.arange(0, tau, delta)
+    nt = len(t)
+    nwtx = (int(2 * np.floor(slope * nt)))
+    wtx_tmp = np.hanning(nwtx)
+    nwtxh = (int(np.round(nwtx / 2)))
+    wtx = np.concatenate([wtx_tmp[0:nwtxh], np.ones((nt - nwtx)), wtx_tmp[nwtxh:]])
+    y_tmp = amp * chirp_linear(t, f0, f1, tau) * wtx
+    # The transmit signal must have a max amplitude of 1
+    y = (y_tmp / np.max(np.abs(y_tmp)))
+
+    # Apply WBT filter and downsample
+    ytx = np.convolve(y, np.frombuffer(wbt_fil, dtype='complex64'))[0::wbt_decimation]
+
+    # Apply PC filter and downsample
+    ytx = np.convolve(ytx, np.frombuffer(pc_fil, dtype='complex64'))[0::pc_decimation]
+    return TransmitReplica(ytx)
+
+
+def _count_calibrated_pings(process, mode='Sv', *args, **kwargs):
+    """Count the pings of Sv or TS depending on the calibration ``mode``."""
+    return count_pings(mode)(process)
 
 
 class ProcessEK80(ProcessBase):
     """Class for manipulating EK80 echo data already converted to netCDF.
     """
-    def __init__(self, file_path=""):
-        ProcessBase.__init__(self, file_path)
+    def __init__(self, file_path="", chunks=None):
+        ProcessBase.__init__(self, file_path, chunks)
         self._acidity = None
         self._salinity = None
         self._temperature = None
@@ -23,6 +122,7 @@ class ProcessEK80(ProcessBase):
         self._ch_ids = None
         self._tau_effective = None
         self.ytx = []
+        self._replicas = []
         self.backscatter_compressed = []
         self._sound_speed = self.calc_sound_speed()
         self._salinity = self.get_salinity()
@@ -35,8 +135,8 @@ class ProcessEK80(ProcessBase):
     @property
     def ch_ids(self):
         if self._ch_ids is None:
-            with self._open_dataset(self.file_path, group="Beam") as ds_beam:
-                self._ch_ids = ds_beam.channel_id.data
+            with self._open_group(self.file_path, group="Beam") as ds_beam:
+                self._ch_ids = ds_beam.channel_id.values
         return self._ch_ids
 
     @property
@@ -45,18 +145,18 @@ class ProcessEK80(ProcessBase):
 
     def get_salinity(self):
         if self._salinity is None:
-            with self._open_dataset(self.file_path, group="Environment") as ds_env:
+            with self._open_group(self.file_path, group="Environment") as ds_env:
                 return ds_env.salinity
 
     def get_temperature(self, path=''):
         path = path if path else self.file_path
         if self._temperature is None:
-            with self._open_dataset(path, group="Environment") as ds_env:
+            with self._open_group(path, group="Environment") as ds_env:
                 return ds_env.temperature
 
     def get_pressure(self):
         if self._pressure is None:
-            with self._open_dataset(self.file_path, group="Environment") as ds_env:
+            with self._open_group(self.file_path, group="Environment") as ds_env:
                 return ds_env.depth
 
     def calc_sound_speed(self, src='file'):
@@ -64,7 +164,7 @@ class ProcessEK80(ProcessBase):
         Will use a custom path if one is provided
         """
         if src == 'file':
-            with self._open_dataset(self.file_path, group="Environment") as ds_env:
+            with self._open_group(self.file_path, group="Environment") as ds_env:
                 return ds_env.sound_speed_indicative
         elif src == 'user':
             ss = uwa.calc_sound_speed(salinity=self.salinity,
@@ -89,7 +189,7 @@ class ProcessEK80(ProcessBase):
         """
         if src == 'user':
             path = path if path else self.file_path
-            with self._open_dataset(path, group='Beam') as ds_beam:
+            with self._open_group(path, group='Beam') as ds_beam:
                 try:
                     f0 = ds_beam.frequency_start
                     f1 = ds_beam.frequency_end
@@ -110,7 +210,7 @@ class ProcessEK80(ProcessBase):
         Will use a custom path if one is provided
         """
         path = path if path else self.file_path
-        with self._open_dataset(path, group="Beam") as ds_beam:
+        with self._open_group(path, group="Beam") as ds_beam:
             sth = self.sound_speed * ds_beam.sample_interval / 2  # sample thickness
             return sth
 
@@ -120,7 +220,7 @@ class ProcessEK80(ProcessBase):
         """
         st = self.calc_sample_thickness(path) if path else self.sample_thickness
         path = path if path else self.file_path
-        with self._open_dataset(path, group="Beam") as ds_beam:
+        with self._open_group(path, group="Beam") as ds_beam:
             if range_bins:
                 range_bin = np.arange(range_bins)
                 range_bin = xr.DataArray(range_bin, coords=[('range_bin', range_bin)])
@@ -133,64 +233,76 @@ class ProcessEK80(ProcessBase):
 
     def calc_transmit_signal(self):
         """Generate transmit signal as replica for pulse compression.
-        """
-        def chirp_linear(t, f0, f1, tau):
-            beta = (f1 - f0) * (tau ** -1)
-            return np.cos(2 * np.pi * (beta / 2 * (t ** 2) + f0 * t))
 
+        Replicas are shared through a cache across all files recorded with the same settings,
+        see ``get_transmit_replica``.
+        """
         # Retrieve filter coefficients
-        with self._open_dataset(self.file_path, group="Vendor") as ds_fil, \
-            self._open_dataset(self.file_path, group="Beam") as ds_beam:
+        with self._open_group(self.file_path, group="Vendor") as ds_fil, \
+            self._open_group(self.file_path, group="Beam") as ds_beam:
 
             # Get various parameters
+            tau = ds_beam.transmit_duration_nominal.values
+            txpower = ds_beam.transmit_power.values
+            f0 = ds_beam.frequency_start.values
+            f1 = ds_beam.frequency_end.values
+            slope = ds_beam.slope[:, 0].values  # Use slope of first ping
             Ztrd = 75  # Transducer quadrant nominal impedance [Ohms] (Supplied by Simrad)
-            delta = 1 / 1.5e6   # Hard-coded EK80 sample interval
-            tau = ds_beam.transmit_duration_nominal.data
-            txpower = ds_beam.transmit_power.data
-            f0 = ds_beam.frequency_start.data
-            f1 = ds_beam.frequency_end.data
-            slope = ds_beam.slope[:, 0].data  # Use slope of first ping
             amp = np.sqrt((txpower / 4) * (2 * Ztrd))
 
-            # Create transmit signal
-            ytx = []
+            replicas = []
             for ch in range(ds_beam.frequency.size):
-                t = np.arange(0, tau[ch], delta)
-                nt = len(t)
-                nwtx = (int(2 * np.floor(slope[ch] * nt)))
-                wtx_tmp = np.hanning(nwtx)
-                nwtxh = (int(np.round(nwtx / 2)))
-                wtx = np.concatenate([wtx_tmp[0:nwtxh], np.ones((nt - nwtx)), wtx_tmp[nwtxh:]])
-                y_tmp = amp[ch] * chirp_linear(t, f0[ch], f1[ch], tau[ch]) * wtx
-                # The transmit signal must have a max amplitude of 1
-                y = (y_tmp / np.max(np.abs(y_tmp)))
-
                 # filter and decimation
-                wbt_fil = ds_fil[self.ch_ids[ch] + "_WBT_filter"].data
-                pc_fil = ds_fil[self.ch_ids[ch] + "_PC_filter"].data
-                # if saved as netCDF4, convert compound complex datatype to complex64
-                if wbt_fil.ndim == 1:
-                    wbt_fil = np.array([complex(n[0], n[1]) for n in wbt_fil], dtype='complex64')
-                    pc_fil = np.array([complex(n[0], n[1]) for n in pc_fil], dtype='complex64')
-
-                # Apply WBT filter and downsample
-                ytx_tmp = np.convolve(y, wbt_fil)
-                ytx_tmp = ytx_tmp[0::ds_fil.attrs[self.ch_ids[ch] + "_WBT_decimation"]]
-
-                # Apply PC filter and downsample
-                ytx_tmp = np.convolve(ytx_tmp, pc_fil)
-                ytx_tmp = ytx_tmp[0::ds_fil.attrs[self.ch_ids[ch] + "_PC_decimation"]]
-                ytx.append(ytx_tmp)
-                del nwtx, wtx_tmp, nwtxh, wtx, y_tmp, y, ytx_tmp
+                wbt_fil = _to_complex(ds_fil[self.ch_ids[ch] + "_WBT_filter"].values)
+                pc_fil = _to_complex(ds_fil[self.ch_ids[ch] + "_PC_filter"].values)
+                replicas.append(get_transmit_replica(
+                    f0[ch], f1[ch], tau[ch], slope[ch], amp[ch],
+                    wbt_fil.tobytes(), int(ds_fil.attrs[self.ch_ids[ch] + "_WBT_decimation"]),
+                    pc_fil.tobytes(), int(ds_fil.attrs[self.ch_ids[ch] + "_PC_decimation"])))
 
             # TODO: rename ytx into something like 'transmit_signal' and
             #  also package the sampling interval together with the signal
-            self.ytx = ytx
+            self._replicas = replicas
+            self.ytx = [r.signal for r in replicas]
+
+    @staticmethod
+    def _matched_filter(x, replica_fft, n_replica):
+        """Full convolution of ``x`` along the last axis with a replica, computed with FFT.
 
+        Parameters
+        ----------
+        x : np.ndarray
+            complex backscatter, with range_bin along the last axis
+        replica_fft : np.ndarray
+            FFT of the time-reversed conjugate of the replica, its length sets the FFT size
+        n_replica : int
+            number of samples of the replica
+
+        Returns
+        -------
+        Convolution output of ``x.shape[-1] + n_replica - 1`` samples along the last axis.
+        As in direct convolution, outputs that overlap with NaN samples are NaN.
+        """
+        n_out = x.shape[-1] + n_replica - 1
+        is_nan = np.isnan(x)
+        x_fft = fft.fft(np.where(is_nan, 0, x), replica_fft.size, axis=-1)
+        compressed = fft.ifft(x_fft * replica_fft, axis=-1)[..., :n_out]
+        if is_nan.any():
+            # Number of NaN samples within the replica window ending at each output sample
+            nan_cnt = np.cumsum(is_nan, axis=-1)
+            nan_cnt = np.concatenate([nan_cnt, np.repeat(nan_cnt[..., -1:], n_replica - 1, axis=-1)], axis=-1)
+            nan_cnt[..., n_replica:] -= nan_cnt[..., :-n_replica].copy()
+            compressed[nan_cnt > 0] = np.nan
+        return compressed
+
+    @profiled('pulse_compression')
     def pulse_compression(self):
         """Pulse compression using transmit signal as replica.
+
+        The matched filter is applied with a single FFT over all quadrants and pings of each channel,
+        lazily on each chunk along ping_time if the backscatter data are dask arrays.
         """
-        with self._open_dataset(self.file_path, group="Beam") as ds_beam:
+        with self._open_group(self.file_path, group="Beam") as ds_beam:
             sample_interval = ds_beam.sample_interval
             backscatter = ds_beam.backscatter_r + ds_beam.backscatter_i * 1j  # Construct complex backscatter
 
@@ -198,43 +310,36 @@ class ProcessEK80(ProcessBase):
             tau_constants = []
             # Loop over channels
             for ch in range(ds_beam.frequency.size):
-                # tmp_x = np.fft.fft(backscatter[i].dropna('range_bin'))
-                # tmp_y = np.fft.fft(np.flipud(np.conj(ytx[i])))
                 # remove quadrants that are nans across all samples
                 tmp_b = backscatter[ch].dropna('range_bin', how='all')
                 # remove samples that are nans across all quadrants
                 tmp_b = tmp_b.dropna('quadrant', how='all')
-                # tmp_b = tmp_b[:, 0, :]        # 1 ping
-                tmp_y = np.flipud(np.conj(self.ytx[ch]))
+                replica = self._replicas[ch]
 
-                # Convolve tx signal with backscatter. atol=1e-7 between fft and direct convolution
-                compressed = xr.apply_ufunc(lambda m: np.apply_along_axis(
-                                            lambda m: signal.convolve(m, tmp_y), axis=2, arr=m),
-                                            tmp_b,
+                # Convolve tx signal with backscatter using a FFT size fast to compute
+                n_out = tmp_b.range_bin.size + replica.signal.size - 1
+                compressed = xr.apply_ufunc(self._matched_filter, tmp_b,
+                                            kwargs={'replica_fft': replica.get_fft(fft.next_fast_len(n_out)),
+                                                    'n_replica': replica.signal.size},
                                             input_core_dims=[['range_bin']],
                                             output_core_dims=[['range_bin']],
-                                            exclude_dims={'range_bin'}) / np.linalg.norm(self.ytx[ch]) ** 2
-                # Average across quadrants
+                                            exclude_dims={'range_bin'},
+                                            dask='parallelized',
+                                            output_dtypes=[np.complex128],
+                                            dask_gufunc_kwargs={'output_sizes': {'range_bin': n_out}}) / \
+                    replica.norm ** 2
                 backscatter_compressed.append(compressed)
 
                 # Effective pulse length
-                ptxa = np.square(np.abs(signal.convolve(self.ytx[ch], tmp_y, method='direct') /
-                                        np.linalg.norm(self.ytx[ch]) ** 2))
-                tau_constants.append(np.sum(ptxa) / (np.max(ptxa)))
+                tau_constants.append(replica.tau_effective)
             self._tau_effective = np.array(tau_constants) * sample_interval
             # Pad nans so that each channel has the same range_bin length
             largest_range_bin = max([bc.shape[2] for bc in backscatter_compressed])
-            for i, ds in enumerate(backscatter_compressed):
-                pad_width = largest_range_bin - ds.shape[2]
-                backscatter_compressed[i] = xr.apply_ufunc(lambda x: np.pad(x, ((0,0), (0,0), (0,pad_width)),
-                                                                            constant_values=np.nan),
-                                                           ds,
-                                                           input_core_dims=[['range_bin']],
-                                                           output_core_dims=[['range_bin']],
-                                                           exclude_dims={'range_bin'})
+            backscatter_compressed = [bc.pad(range_bin=(0, largest_range_bin - bc.shape[2]))
+                                      for bc in backscatter_compressed]
             self.backscatter_compressed = xr.concat(backscatter_compressed, dim='frequency')
 
-
+    @profiled('calibrate', counts=_count_calibrated_pings)
     def calibrate(self, mode='Sv', save=False, save_path=None, save_postfix=None):
         """Perform echo-integration to get volume backscattering strength (Sv)
         or target strength (TS) from EK80 power data.
@@ -253,7 +358,7 @@ class ProcessEK80(ProcessBase):
             Filename postfix, default to '_Sv' or '_TS'
         """
 
-        ds_beam = self._open_dataset(self.file_path, group="Beam")
+        ds_beam = self._get_group(self.file_path, group="Beam")
 
         # Check for cw data file
         split = os.path.splitext(self.file_path)
@@ -302,12 +407,11 @@ class ProcessEK80(ProcessBase):
                       10 * np.log10(ds_beam.transmit_power * la2 / (16 * np.pi * np.pi)) -
                       2 * Gfc
                 )
-            ds_beam.close()     # Close opened dataset
             # Save Sv calibrated data
             if mode == 'Sv':
                 Sv.name = 'Sv'
                 Sv = Sv.to_dataset()
-                Sv['range'] = (('frequency', 'range_bin'), ranges)
+                Sv['range'] = (('frequency', 'range_bin'), ranges.data)
                 self.Sv = Sv
                 if save:
                     self.Sv_path = self.validate_path(save_path, save_postfix)
@@ -317,7 +421,7 @@ class ProcessEK80(ProcessBase):
             elif mode == 'TS':
                 TS.name = 'TS'
                 TS = TS.to_dataset()
-                TS['range'] = (('frequency', 'range_bin'), ranges)
+                TS['range'] = (('frequency', 'range_bin'), ranges.data)
                 self.TS = TS
                 if save:
                     self.TS_path = self.validate_path(save_path, save_postfix)
@@ -347,10 +451,10 @@ class ProcessEK80(ProcessBase):
         """
         # Open data set for and Beam groups
         if file_path and os.path.exists(file_path):
-            ds_beam = self._open_dataset(file_path, group="Beam")
+            ds_beam = self._get_group(file_path, group="Beam")
         else:
             file_path = self.file_path
-            ds_beam = self._open_dataset(self.file_path, group="Beam")
+            ds_beam = self._get_group(self.file_path, group="Beam")
 
         # Derived params
         wavelength = self.sound_speed / ds_beam.frequency  # wavelength
@@ -377,7 +481,7 @@ class ProcessEK80(ProcessBase):
             Sv = Sv.to_dataset()
 
             # Attach calculated range into data set
-            Sv['range'] = (('frequency', 'range_bin'), range_meter)
+            Sv['range'] = (('frequency', 'range_bin'), range_meter.data)
 
             # Save calibrated data into the calling instance and
             #  to a separate .nc file in the same directory as the data filef.Sv = Sv
@@ -400,7 +504,7 @@ class ProcessEK80(ProcessBase):
             TS = TS.to_dataset()
 
             # Attach calculated range into data set
-            TS['range'] = (('frequency', 'range_bin'), range_meter)
+            TS['range'] = (('frequency', 'range_bin'), range_meter.data)
 
             # Save calibrated data into the calling instance and
             #  to a separate .nc file in the same directory as the data filef.Sv = Sv
@@ -409,6 +513,3 @@ class ProcessEK80(ProcessBase):
                 self.TS_path = self.validate_path(save_path, save_postfix)
                 print('%s  saving calibrated TS to %s' % (dt.datetime.now().strftime('%H:%M:%S'), self.TS_path))
                 self._save_dataset(TS, self.TS_path, mode="w")
-
-        # Close opened resources
-        ds_beam.close()
@@ -7,16 +7,24 @@ import xarray as xr
 from echopype.process.azfp import ProcessAZFP
 from echopype.process.ek60 import ProcessEK60
 from echopype.process.ek80 import ProcessEK80
+from echopype.process.processbase import get_file_list
 
 
-def Process(nc_path):
+def Process(nc_path, chunks=None):
     """
     Provides data analysis and computation tools for sonar data in netCDF form.
 
     Parameters
     ----------
-    nc_path : str
-        The path to a .nc or .zarr file generated by `echopype`
+    nc_path : str or list of str
+        The path to a .nc or .zarr file generated by `echopype`,
+        or a list, glob pattern or directory of such files.
+        Several files are sorted by ping_time and processed as one dataset.
+    chunks : int or dict, optional
+        Open the data lazily as dask arrays with these chunks.
+        An integer is the number of pings per chunk and a dict maps dimension names
+        to chunk sizes as in :py:func:`xarray.open_dataset`.
+        Calibrated data then stay lazy and are computed chunk by chunk when saved.
 
     Returns
     -------
@@ -24,7 +32,8 @@ def Process(nc_path):
         the type of echosounder the .nc file was produced with
     """
 
-    fname = os.path.basename(nc_path)
+    file_list = get_file_list(nc_path)
+    fname = os.path.basename(file_list[0])
     _, ext = os.path.splitext(fname)
 
     if fname.endswith('.nc'):
@@ -35,7 +44,7 @@ def Process(nc_path):
         raise ValueError(f"{ext} is not a valid file format.")
 
     # Open nc file in order to determine what echosounder produced the original dataset
-    with open_dataset(nc_path) as nc_file:
+    with open_dataset(file_list[0]) as nc_file:
         try:
             echo_type = nc_file.keywords
         except AttributeError:
@@ -43,10 +52,10 @@ def Process(nc_path):
 
     # Returns specific Process object
     if echo_type == "EK60":
-        return ProcessEK60(nc_path)
+        return ProcessEK60(file_list, chunks=chunks)
     elif echo_type == "EK80":
-        return ProcessEK80(nc_path)
+        return ProcessEK80(file_list, chunks=chunks)
     elif echo_type == "AZFP":
-        return ProcessAZFP(nc_path)
+        return ProcessAZFP(file_list, chunks=chunks)
     else:
         raise ValueError("Unsupported file type")
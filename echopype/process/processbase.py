@@ -4,29 +4,91 @@ its connection to data files.
 """
 
 import os
+import glob
+import functools
+import contextlib
 import datetime as dt
 import numpy as np
 import xarray as xr
 import zarr
+import netCDF4
+from ..utils.binning import get_bin_index, bin_mean, bin_sum, pyramid_levels
+from ..utils.profiling import profiled, stage
+
+
+# Postfixes of the files saved by processing, which are not converted data files
+PROCESSED_POSTFIXES = ('_Sv', '_Sv_clean', '_TS', '_MVBS')
+
+
+def get_file_list(path):
+    """Return the list of converted files given by ``path``.
+
+    Parameters
+    ----------
+    path : str or list of str
+        a .nc or .zarr file, a list of files, a glob pattern or a directory.
+        Files saved by processing (``_Sv``, ``_Sv_clean``, ``_TS``, ``_MVBS``) in a directory are left out.
+
+    Returns
+    -------
+    List of files, sorted by name for a glob pattern or a directory
+    """
+    if isinstance(path, (list, tuple)):
+        file_list = list(path)
+    elif os.path.isdir(path) and not path.rstrip('/\\').endswith('.zarr'):
+        file_list = sorted(os.path.join(path, f) for f in os.listdir(path)
+                           if os.path.splitext(f)[1] in ('.nc', '.zarr') and
+                           not os.path.splitext(f)[0].endswith(PROCESSED_POSTFIXES))
+    elif any(c in path for c in '*?['):
+        file_list = sorted(glob.glob(path))
+    else:
+        return [path]
+
+    if not file_list:
+        raise FileNotFoundError(f"No converted files found in {path}")
+    if len({os.path.splitext(f)[1] for f in file_list}) > 1:
+        raise ValueError("Not all files are in the same format.")
+    return file_list
+
+
+def count_pings(attr):
+    """Return a function counting the pings of the ``attr`` data of a Process object,
+    used to record the pings handled by profiled stages.
+    """
+    def counts(process, *args, **kwargs):
+        data = getattr(process, attr, None)
+        return {} if data is None else {'n_pings': data.ping_time.size}
+    return counts
+
+
+def count_beam_pings(process, *args, **kwargs):
+    """Count the pings of the Beam group of a Process object, for stages not keeping the calibrated data.
+    """
+    return {'n_pings': process._get_group(process.file_path, 'Beam').ping_time.size}
 
 
 class ProcessBase(object):
     """Class for manipulating echo data that is already converted to netCDF."""
 
-    def __init__(self, file_path=""):
-        self.file_path = file_path  # this passes the input through file name test
+    def __init__(self, file_path="", chunks=None):
+        self.file_list = get_file_list(file_path)  # files combined along ping_time
+        self.file_path = self.file_list[0]  # this passes the input through file name test
+        self.chunks = chunks      # dask chunks used when opening data files
         self.noise_est_range_bin_size = 5  # meters per tile for noise estimation
         self.noise_est_ping_size = 30  # number of pings per tile for noise estimation
         self.MVBS_range_bin_size = 5  # meters per tile for MVBS
         self.MVBS_ping_size = 30  # number of pings per tile for MVBS
+        self.MVBS_ping_interval = None  # time interval per tile for MVBS, overrides MVBS_ping_size
         self.Sv = None            # calibrated volume backscattering strength
         self.Sv_path = None       # path to save calibrated results
         self.Sv_clean = None      # denoised volume backscattering strength
         self.TS = None            # calibrated target strength
         self.TS_path = None       # path to save TS calculation results
         self.MVBS = None          # mean volume backscattering strength
+        self.pyramid = {}         # downsampled levels of Sv or TS for plotting, by form and factor
         self._file_format = None
         self._open_dataset = None
+        self._dataset_pool = {}   # groups of data files opened once and shared, keyed on (path, group)
         self._salinity = None
         self._temperature = None
         self._pressure = None
@@ -37,6 +99,14 @@ class ProcessBase(object):
 
         self._set_file_format()
         self._set_open_dataset()
+        if len(self.file_list) > 1:
+            self._sort_file_list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
     @property
     def salinity(self):
@@ -322,6 +392,37 @@ class ProcessBase(object):
                 self.calibrate()  # calibrate, have Sv in memory
         return self.Sv
 
+    def _get_TVG_ABS(self):
+        """Return the time-varying gain and absorption compensating for transmission loss [frequency x range_bin].
+        """
+        range_meter = self.range
+        TVG = np.real(20 * np.log10(range_meter.where(range_meter >= 1, other=1)))
+        ABS = 2 * self.seawater_absorption * range_meter
+        return TVG, ABS
+
+    def _get_noise_bins(self, n_ping, n_range):
+        """Return the tile index of each ping and of each sample along range for noise estimation.
+
+        ``noise_est_range_bin_size`` is adjusted to a whole number of range_bin per tile for each channel.
+        """
+        num_r_per_tile = np.maximum(np.round(self.noise_est_range_bin_size / self.sample_thickness), 1).astype(int)
+        self.noise_est_range_bin_size = num_r_per_tile * self.sample_thickness
+        ping_bin = np.arange(n_ping) // self.noise_est_ping_size
+        range_bin = np.arange(n_range) // num_r_per_tile.values[:, None]
+        return ping_bin, range_bin
+
+    @staticmethod
+    def _noise_floor(p_c_lin, ping_bin, range_bin, block_size=None):
+        """Return the noise estimate [dB] of each channel and ping [frequency x ping_time].
+
+        Noise estimates are the minimum over range of the power ``p_c_lin``, compensated for
+        transmission loss, averaged over the pings and then over the range_bin of each tile.
+        """
+        p_c_ping_mean, _ = bin_mean(p_c_lin, ping_bin, np.arange(p_c_lin.shape[2]), block_size=block_size)
+        p_c_tile_mean, _ = bin_mean(p_c_ping_mean, np.arange(p_c_ping_mean.shape[1]), range_bin)
+        return 10 * np.log10(np.fmin.reduce(p_c_tile_mean, axis=2)[:, ping_bin])
+
+    @profiled('noise', counts=count_pings('Sv'))
     def remove_noise(self, source_postfix='_Sv', source_path=None,
                      noise_est_range_bin_size=None, noise_est_ping_size=None,
                      SNR=0, Sv_threshold=None,
@@ -332,6 +433,9 @@ class ProcessBase(object):
         See method noise_estimates() for details of noise estimation.
         Reference: De Robertis & Higginbottom, 2007, ICES Journal of Marine Sciences
 
+        If Sv is stored as a dask array, noise estimates are computed block by block
+        and the denoised Sv stays lazy until it is saved or loaded.
+
         Parameters
         ----------
         source_postfix : str
@@ -379,64 +483,35 @@ class ProcessBase(object):
             print('%s  Remove noise from Sv stored in: %s' %
                   (dt.datetime.now().strftime('%H:%M:%S'), self.Sv_path))
 
-        # Get tile indexing parameters
-        self.noise_est_range_bin_size, range_bin_tile_bin_edge, ping_tile_bin_edge = \
-            self.get_tile_params(r_data_sz=proc_data.range_bin.size,
-                                 p_data_sz=proc_data.ping_time.size,
-                                 r_tile_sz=self.noise_est_range_bin_size,
-                                 p_tile_sz=self.noise_est_ping_size,
-                                 sample_thickness=self.sample_thickness)
+        ping_bin, range_bin = self._get_noise_bins(proc_data.ping_time.size, proc_data.range_bin.size)
 
         # Get TVG and ABS for compensating for transmission loss
-        range_meter = self.range
-        TVG = np.real(20 * np.log10(range_meter.where(range_meter >= 1, other=1)))
-        ABS = 2 * self.seawater_absorption * range_meter
-
-        # Function for use with apply
-        def remove_n(x, rr):
-            p_c_lin = 10 ** ((x.Sv - x.ABS - x.TVG) / 10)
-            nn = 10 * np.log10(p_c_lin.mean(dim='ping_time').groupby_bins('range_bin', rr).mean().min(
-                dim='range_bin_bins')) + x.ABS + x.TVG
-            # Return values where signal is [SNR] dB above noise and at least [Sv_threshold] dB
-            if not Sv_threshold:
-                return x.Sv.where(x.Sv > (nn + SNR), other=np.nan)
-            else:
-                return x.Sv.where((x.Sv > (nn + SNR)) & (x > Sv_threshold), other=np.nan)
-
-        # Groupby noise removal operation
-        proc_data.coords['ping_idx'] = ('ping_time', np.arange(proc_data.Sv['ping_time'].size))
-        ABS.name = 'ABS'
-        TVG.name = 'TVG'
-        pp = xr.merge([proc_data, ABS])
-        pp = xr.merge([pp, TVG])
-        # check if number of range_bin per tile the same for all freq channels
-        if np.unique([np.array(x).size for x in range_bin_tile_bin_edge]).size == 1:
-            Sv_clean = pp.groupby_bins('ping_idx', ping_tile_bin_edge).\
-                            map(remove_n, rr=range_bin_tile_bin_edge[0])
-            Sv_clean = Sv_clean.drop_vars(['ping_idx'])
+        TVG, ABS = self._get_TVG_ABS()
+
+        # Noise estimates for all channels and ping tiles at once
+        Sv = proc_data.Sv.transpose('frequency', 'ping_time', 'range_bin')
+        p_c_lin = 10 ** ((Sv - ABS - TVG) / 10)
+        block_size = max(Sv.chunks[1]) if Sv.chunks is not None else None
+        nn = xr.DataArray(self._noise_floor(p_c_lin.data, ping_bin, range_bin, block_size=block_size),
+                          coords=[('frequency', Sv['frequency'].values), ('ping_time', Sv['ping_time'].values)])
+        if Sv.chunks is not None:
+            nn = nn.chunk({'ping_time': Sv.chunks[1]})   # keep noise removal lazy
+        nn = nn + ABS + TVG
+
+        # Return values where signal is [SNR] dB above noise and at least [Sv_threshold] dB
+        if not Sv_threshold:
+            Sv_clean = Sv.where(Sv > (nn + SNR), other=np.nan)
         else:
-            tmp_clean = []
-            cnt = 0
-            for key, val in pp.groupby('frequency'):  # iterate over different frequency channel
-                tmp = val.groupby_bins('ping_idx', ping_tile_bin_edge). \
-                    map(remove_n, rr=range_bin_tile_bin_edge[cnt])
-                cnt += 1
-                tmp_clean.append(tmp)
-            clean_val = np.array([zz.values for zz in xr.align(*tmp_clean, join='outer')])
-            Sv_clean = xr.DataArray(clean_val,
-                                    coords={'frequency': proc_data['frequency'].values,
-                                            'ping_time': tmp_clean[0]['ping_time'].values,
-                                            'range_bin': tmp_clean[0]['range_bin'].values},
-                                    dims=['frequency', 'ping_time', 'range_bin'])
+            Sv_clean = Sv.where((Sv > (nn + SNR)) & (Sv > Sv_threshold), other=np.nan)
 
         # Set up DataSet
         Sv_clean.name = 'Sv'
         Sv_clean = Sv_clean.to_dataset()
-        Sv_clean['noise_est_range_bin_size'] = ('frequency', self.noise_est_range_bin_size)
+        Sv_clean['noise_est_range_bin_size'] = ('frequency', self.noise_est_range_bin_size.data)
         Sv_clean.attrs['noise_est_ping_size'] = self.noise_est_ping_size
 
         # Attach calculated range into data set
-        Sv_clean['range'] = (('frequency', 'range_bin'), self.range)
+        Sv_clean['range'] = (('frequency', 'range_bin'), self.range.data)
 
         # Save as object attributes as a netCDF file
         self.Sv_clean = Sv_clean
@@ -530,7 +605,7 @@ class ProcessBase(object):
                                         'ping_time': tmp_noise[0]['ping_time'].values},
                                 dims=['frequency', 'ping_time'])
         noise_est = noise_est.to_dataset(name='noise_est')
-        noise_est['noise_est_range_bin_size'] = ('frequency', self.noise_est_range_bin_size)
+        noise_est['noise_est_range_bin_size'] = ('frequency', self.noise_est_range_bin_size.data)
         noise_est.attrs['noise_est_ping_size'] = self.noise_est_ping_size
 
         # Close opened resources
@@ -538,16 +613,86 @@ class ProcessBase(object):
 
         return noise_est
 
+    def _get_ping_interval(self):
+        """Return ``MVBS_ping_interval`` as a np.timedelta64, or None if MVBS tiles are made of ``MVBS_ping_size`` pings.
+        """
+        ping_interval = self.MVBS_ping_interval
+        if ping_interval is not None and not isinstance(ping_interval, np.timedelta64):
+            ping_interval = np.timedelta64(int(ping_interval * 1e9), 'ns')
+        return ping_interval
+
+    def _get_MVBS_bins(self, proc_data, range_in_meters=False):
+        """Return the tile index of each ping and of each sample along range for MVBS, see ``get_MVBS``.
+        """
+        # Bin index of each ping
+        ping_time = proc_data['ping_time'].values
+        ping_interval = self._get_ping_interval()
+        if ping_interval is not None:
+            ping_bin = get_bin_index((ping_time - ping_time[0]) / np.timedelta64(1, 's'),
+                                     ping_interval / np.timedelta64(1, 's'))
+        else:
+            ping_bin = np.arange(ping_time.size) // self.MVBS_ping_size
+
+        # Bin index of each sample along range for each frequency channel
+        if range_in_meters:
+            range_meter = self.range.transpose('frequency', 'range_bin').sel(frequency=proc_data['frequency'])
+            range_bin_size = np.broadcast_to(np.asarray(self.MVBS_range_bin_size, dtype=float),
+                                             proc_data.frequency.shape)
+            self.MVBS_range_bin_size = xr.DataArray(range_bin_size,
+                                                    coords=[('frequency', proc_data['frequency'].values)])
+            range_bin = get_bin_index(range_meter.values[:, :proc_data.range_bin.size],
+                                      self.MVBS_range_bin_size.values, origin=0)
+        else:
+            # Adjust MVBS_range_bin_size to a whole number of range_bin per tile for each channel
+            num_r_per_tile = np.maximum(np.round(self.MVBS_range_bin_size / self.sample_thickness), 1).astype(int)
+            self.MVBS_range_bin_size = num_r_per_tile * self.sample_thickness
+            range_bin = np.arange(proc_data.range_bin.size) // num_r_per_tile.values[:, None]
+        return ping_bin, range_bin
+
+    def _set_MVBS(self, MVBS_val, ping_start, ping_bin, proc_data):
+        """Return the MVBS dataset from the tile means ``MVBS_val`` of linear Sv.
+        """
+        ping_time = proc_data['ping_time'].values
+        ping_interval = self._get_ping_interval()
+        if ping_interval is not None:
+            MVBS_ping_time = ping_time[0] + ping_bin[ping_start] * ping_interval
+        else:
+            # Mean time of the pings of each tile
+            offset = ping_time - ping_time[0]
+            is_time = offset.dtype.kind == 'm'
+            if is_time:
+                offset = offset.astype('timedelta64[ns]').astype(np.int64)
+            mean_offset = np.add.reduceat(offset, ping_start) / np.diff(np.r_[ping_start, ping_time.size])
+            if is_time:
+                mean_offset = np.round(mean_offset).astype('timedelta64[ns]')
+            MVBS_ping_time = ping_time[0] + mean_offset
+        MVBS = xr.DataArray(10 * np.log10(MVBS_val),
+                            coords={'frequency': proc_data['frequency'].values,
+                                    'ping_time': MVBS_ping_time,
+                                    'range_bin': np.arange(MVBS_val.shape[2])},
+                            dims=['frequency', 'ping_time', 'range_bin']).dropna(dim='range_bin', how='all')
+
+        # Set MVBS attributes
+        MVBS.name = 'MVBS'
+        MVBS = MVBS.to_dataset()
+        MVBS['MVBS_range_bin_size'] = ('frequency', self.MVBS_range_bin_size.data)
+        if ping_interval is not None:
+            MVBS.attrs['MVBS_ping_interval'] = str(ping_interval.astype('timedelta64[ms]'))
+        else:
+            MVBS.attrs['MVBS_ping_size'] = self.MVBS_ping_size
+        return MVBS
+
+    @profiled('MVBS', counts=count_pings('Sv'))
     def get_MVBS(self, source_postfix='_Sv', source_path=None,
-                 MVBS_range_bin_size=None, MVBS_ping_size=None,
-                 save=False, save_postfix='_MVBS', save_path=None):
+                 MVBS_range_bin_size=None, MVBS_ping_size=None, MVBS_ping_interval=None,
+                 range_in_meters=False, save=False, save_postfix='_MVBS', save_path=None):
         """Calculate Mean Volume Backscattering Strength (MVBS).
 
         The calculation uses class attributes MVBS_ping_size and MVBS_range_bin_size to
         calculate and save MVBS as a new attribute to the calling Process instance.
-        MVBS is an xarray DataArray with dimensions ``ping_time`` and ``range_bin``
-        that are from the first elements of each tile along the corresponding dimensions
-        in the original Sv or Sv_clean DataArray.
+        MVBS is an xarray DataArray with dimensions ``ping_time`` and ``range_bin``.
+        ``ping_time`` is the mean time of the pings of each tile, or the start of each
+        time interval with ``MVBS_ping_interval``, and ``range_bin`` is the index of each tile along range.
 
         Parameters
         ----------
@@ -564,6 +709,13 @@ class ProcessBase(object):
             meters per tile for calculating MVBS [m]
         MVBS_ping_size : int, optional
             number of pings per tile for calculating MVBS
+        MVBS_ping_interval : float or np.timedelta64, optional
+            time interval per tile for calculating MVBS [s], used instead of ``MVBS_ping_size`` if given.
+            Tiles of ``MVBS_ping_size`` pings are used again once ``MVBS_ping_size`` is given
+        range_in_meters : bool, optional
+            whether to bin by range in meters, with tiles every ``MVBS_range_bin_size`` meters
+            starting at 0 m, instead of by a number of range_bin per tile determined by
+            ``MVBS_range_bin_size`` and ``sample_thickness``. Default to ``False``
         save : bool, optional
             whether to save the calculated MVBS into a new .nc file, default to ``False``
         save_postfix : str
@@ -572,10 +724,13 @@ class ProcessBase(object):
             Full filename to save to, overwriting the RAWFILENAME_MVBS.nc default
         """
         # Check params
-        if (MVBS_range_bin_size is not None) and (self.MVBS_range_bin_size != MVBS_range_bin_size):
+        if MVBS_range_bin_size is not None:
             self.MVBS_range_bin_size = MVBS_range_bin_size
-        if (MVBS_ping_size is not None) and (self.MVBS_ping_size != MVBS_ping_size):
+        if MVBS_ping_size is not None:
             self.MVBS_ping_size = MVBS_ping_size
+            self.MVBS_ping_interval = None
+        if MVBS_ping_interval is not None:
+            self.MVBS_ping_interval = MVBS_ping_interval
 
         # Get Sv by validating path and calibrate if not already done
         if self.Sv is not None:
@@ -599,48 +754,13 @@ class ProcessBase(object):
                 print('%s  Sv source used to calculate MVBS: memory' %
                       dt.datetime.now().strftime('%H:%M:%S'))
 
-        # Get tile indexing parameters
-        self.MVBS_range_bin_size, range_bin_tile_bin_edge, ping_tile_bin_edge = \
-            self.get_tile_params(r_data_sz=proc_data.range_bin.size,
-                                 p_data_sz=proc_data.ping_time.size,
-                                 r_tile_sz=self.MVBS_range_bin_size,
-                                 p_tile_sz=self.MVBS_ping_size,
-                                 sample_thickness=self.sample_thickness)
-        # Calculate MVBS
-        Sv_linear = 10 ** (proc_data.Sv / 10)  # convert to linear domain before averaging
-        # check if number of range_bin per tile the same for all freq channels
-        if np.unique([np.array(x).size for x in range_bin_tile_bin_edge]).size == 1:
-            MVBS = 10 * np.log10(Sv_linear.coarsen(
-                ping_time=self.MVBS_ping_size,
-                range_bin=int(np.unique(self.MVBS_range_bin_size / self.sample_thickness)),
-                boundary='pad').mean())
-            MVBS.coords['range_bin'] = ('range_bin', np.arange(MVBS['range_bin'].size))
-        else:
-            range_bin_coarsen_idx = (self.MVBS_range_bin_size / self.sample_thickness).astype(int)
-            tmp_MVBS = []
-            for r_bin in range_bin_coarsen_idx:
-                freq = r_bin.frequency.values
-                tmp_da = 10 * np.log10(Sv_linear.sel(frequency=freq).coarsen(
-                        ping_time=self.MVBS_ping_size,
-                        range_bin=r_bin.values,
-                        boundary='pad').mean())
-                tmp_da.coords['range_bin'] = ('range_bin', np.arange(tmp_da['range_bin'].size))
-                tmp_da.name = 'MVBS'
-                tmp_MVBS.append(tmp_da)
+        ping_bin, range_bin = self._get_MVBS_bins(proc_data, range_in_meters)
 
-            # Construct a dataArray  TODO: this can probably be done smarter using xarray native functions
-            MVBS_val = np.array([zz.values for zz in xr.align(*tmp_MVBS, join='outer')])
-            MVBS = xr.DataArray(MVBS_val,
-                                coords={'frequency': Sv_linear['frequency'].values,
-                                        'ping_time': tmp_MVBS[0]['ping_time'].values,
-                                        'range_bin': np.arange(MVBS_val.shape[2])},
-                                dims=['frequency', 'ping_time', 'range_bin']).dropna(dim='range_bin', how='all')
-
-        # Set MVBS attributes
-        MVBS.name = 'MVBS'
-        MVBS = MVBS.to_dataset()
-        MVBS['MVBS_range_bin_size'] = ('frequency', self.MVBS_range_bin_size)
-        MVBS.attrs['MVBS_ping_size'] = self.MVBS_ping_size
+        # Calculate MVBS by averaging in the linear domain all channels at once
+        Sv_linear = 10 ** (proc_data.Sv / 10)  # convert to linear domain before averaging
+        block_size = max(Sv_linear.chunks[1]) if Sv_linear.chunks is not None else None
+        MVBS_val, ping_start = bin_mean(Sv_linear.data, ping_bin, range_bin, block_size=block_size)
+        MVBS = self._set_MVBS(MVBS_val, ping_start, ping_bin, proc_data)
 
         # Save results in object and as a netCDF file
         self.MVBS = MVBS
@@ -652,7 +772,212 @@ class ProcessBase(object):
         # Close opened resources
         proc_data.close()
     
-    def _save_dataset(self, ds, path, mode="w"):
+    @profiled('calibrate_MVBS', counts=count_beam_pings)
+    def calibrate_MVBS(self, remove_noise=True, noise_est_range_bin_size=None, noise_est_ping_size=None,
+                       SNR=0, Sv_threshold=None, MVBS_range_bin_size=None, MVBS_ping_size=None,
+                       MVBS_ping_interval=None, range_in_meters=False, block_size=None,
+                       save=False, save_postfix='_MVBS', save_path=None):
+        """Calibrate, remove noise and calculate MVBS in one pass over the pings.
+
+        Gives the same MVBS as ``calibrate``, ``remove_noise`` and ``get_MVBS(source_postfix='_Sv_clean')``
+        without saving or holding in memory the calibrated and denoised Sv at full resolution.
+        Pings are processed in blocks made of whole noise estimation tiles, and the sums and counts
+        of MVBS tiles spanning two blocks are carried over to the next block.
+        Data not opened with ``chunks`` are read lazily in blocks of ``block_size`` pings.
+        Sv is only kept in ``Sv`` if it was calibrated before calling this method.
+
+        Parameters
+        ----------
+        remove_noise : bool, optional
+            whether to remove noise before calculating MVBS, see ``remove_noise``. Default to ``True``
+        noise_est_range_bin_size, noise_est_ping_size, SNR, Sv_threshold : optional
+            noise removal parameters, see ``remove_noise``
+        MVBS_range_bin_size, MVBS_ping_size, MVBS_ping_interval, range_in_meters : optional
+            MVBS parameters, see ``get_MVBS``
+        block_size : int, optional
+            approximate number of pings processed at once,
+            defaults to the chunk size of the data or all pings if they are not chunked
+        save : bool, optional
+            whether to save the calculated MVBS into a new .nc file, default to ``False``
+        save_postfix : str
+            Filename postfix, default to '_MVBS'
+        save_path : str
+            Full filename to save to, overwriting the RAWFILENAME_MVBS.nc default
+        """
+        # Check params
+        if noise_est_range_bin_size is not None:
+            self.noise_est_range_bin_size = noise_est_range_bin_size
+        if noise_est_ping_size is not None:
+            self.noise_est_ping_size = noise_est_ping_size
+        if MVBS_range_bin_size is not None:
+            self.MVBS_range_bin_size = MVBS_range_bin_size
+        if MVBS_ping_size is not None:
+            self.MVBS_ping_size = MVBS_ping_size
+            self.MVBS_ping_interval = None
+        if MVBS_ping_interval is not None:
+            self.MVBS_ping_interval = MVBS_ping_interval
+
+        if self.Sv is not None:
+            self._calibrate_MVBS(self.Sv, remove_noise, SNR, Sv_threshold, range_in_meters, block_size)
+        elif self.chunks is None and block_size is not None:
+            # Calibrate each block when it is read from the data files opened lazily
+            with self._read_lazily(block_size):
+                self.calibrate()
+                proc_data, self.Sv = self.Sv, None
+                self._calibrate_MVBS(proc_data, remove_noise, SNR, Sv_threshold, range_in_meters, block_size)
+        else:
+            self.calibrate()
+            proc_data, self.Sv = self.Sv, None
+            self._calibrate_MVBS(proc_data, remove_noise, SNR, Sv_threshold, range_in_meters, block_size)
+
+        # Save results as a netCDF file
+        if save:
+            self.MVBS_path = self.validate_path(save_path=save_path, save_postfix=save_postfix)
+            print('%s  saving MVBS to %s' % (dt.datetime.now().strftime('%H:%M:%S'), self.MVBS_path))
+            self._save_dataset(self.MVBS, self.MVBS_path)
+
+    def _calibrate_MVBS(self, proc_data, remove_noise, SNR, Sv_threshold, range_in_meters, block_size):
+        """Remove noise from the calibrated Sv ``proc_data`` and calculate MVBS block by block, see ``calibrate_MVBS``.
+        """
+        Sv = proc_data.Sv.transpose('frequency', 'ping_time', 'range_bin')
+        n_ping, n_range = Sv.ping_time.size, Sv.range_bin.size
+
+        # MVBS tiles, summed over the blocks they span
+        ping_bin, range_bin = self._get_MVBS_bins(proc_data, range_in_meters)
+        ping_tile = np.cumsum(np.r_[True, ping_bin[1:] != ping_bin[:-1]]) - 1
+        n_range_tiles = range_bin.max() + 1
+        tile_sum = np.zeros((Sv.frequency.size, ping_tile[-1] + 1, n_range_tiles))
+        tile_cnt = np.zeros((Sv.frequency.size, ping_tile[-1] + 1, n_range_tiles), dtype=np.int64)
+
+        # Blocks are made of whole noise estimation tiles
+        if remove_noise:
+            noise_ping_bin, noise_range_bin = self._get_noise_bins(n_ping, n_range)
+            block_edge = np.flatnonzero(np.r_[True, noise_ping_bin[1:] != noise_ping_bin[:-1]])
+            TVG, ABS = self._get_TVG_ABS()
+            TVG = TVG.transpose('frequency', 'range_bin').values[:, None, :]
+            ABS = ABS.transpose('frequency', 'range_bin').values[:, None, :]
+        else:
+            block_edge = np.arange(n_ping)
+        if block_size is None:
+            block_size = max(Sv.chunks[1]) if Sv.chunks is not None else n_ping
+        block_edge = np.r_[block_edge, n_ping]
+
+        t0 = 0
+        while t0 < block_edge.size - 1:
+            t1 = max(t0 + 1, np.searchsorted(block_edge, block_edge[t0] + block_size, side='right') - 1)
+            p0, p1 = block_edge[t0], block_edge[t1]
+            Sv_block = np.asarray(Sv.data[:, p0:p1, :], dtype='float64')
+            if remove_noise:
+                # Same as remove_noise, on the pings of this block
+                p_c_lin = 10 ** ((Sv_block - ABS - TVG) / 10)
+                nn = self._noise_floor(p_c_lin, noise_ping_bin[p0:p1] - noise_ping_bin[p0], noise_range_bin)
+                nn = nn[:, :, None] + ABS + TVG
+                if not Sv_threshold:
+                    valid = Sv_block > (nn + SNR)
+                else:
+                    valid = (Sv_block > (nn + SNR)) & (Sv_block > Sv_threshold)
+                Sv_block = np.where(valid, Sv_block, np.nan)
+            block_sum, block_cnt, _ = bin_sum(10 ** (Sv_block / 10), ping_bin[p0:p1], range_bin)
+            tiles = slice(ping_tile[p0], ping_tile[p1 - 1] + 1)
+            tile_sum[:, tiles] += block_sum
+            tile_cnt[:, tiles] += block_cnt
+            t0 = t1
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            MVBS_val = tile_sum / tile_cnt
+        ping_start = np.flatnonzero(np.r_[True, ping_bin[1:] != ping_bin[:-1]])
+        self.MVBS = self._set_MVBS(MVBS_val, ping_start, ping_bin, proc_data)
+
+    @profiled('pyramid')
+    def get_pyramid(self, form='Sv', n_levels=6, block_size=None, save=False):
+        """Downsample calibrated data into a pyramid of levels for fast plotting of long datasets.
+
+        Level ``k`` averages tiles of ``2 ** k`` pings by ``2 ** k`` range_bin in the linear domain,
+        and also keeps the maximum of each tile. The ping_time and range_bin of each level are those
+        of the first ping and sample of each tile. Levels are stored in ``pyramid[form]`` by factor.
+
+        Parameters
+        ----------
+        form : str
+            ``Sv`` or ``TS``, default to ``Sv``.
+            Sv is loaded from the _Sv file or calibrated if not in memory.
+        n_levels : int
+            number of levels, default to 6 (factors of 2 to 64)
+        block_size : int, optional
+            approximate number of pings processed at once,
+            defaults to the chunk size of the data or all pings if they are not chunked
+        save : bool, optional
+            whether to add the levels as groups ``<form>_pyramid_<factor>`` to the _Sv or _TS file,
+            default to ``False``. The calibrated data are saved first if the file does not exist.
+        """
+        if form == 'Sv':
+            proc_data = self._get_proc_Sv()
+        elif form == 'TS':
+            if self.TS is None:
+                self.calibrate_TS()
+            proc_data = self.TS
+        else:
+            raise ValueError("form must be 'Sv' or 'TS'")
+
+        data = proc_data[form].transpose('frequency', 'ping_time', 'range_bin')
+        if block_size is None and data.chunks is not None:
+            block_size = max(data.chunks[1])
+        levels = pyramid_levels(10 ** (data.data / 10), n_levels, block_size=block_size)
+
+        pyramid = {}
+        for k, (tile_mean, tile_max) in enumerate(levels, start=1):
+            factor = 2 ** k
+            level = xr.Dataset({form: (('frequency', 'ping_time', 'range_bin'), 10 * np.log10(tile_mean)),
+                                form + '_max': (('frequency', 'ping_time', 'range_bin'), 10 * np.log10(tile_max))},
+                               coords={'frequency': data['frequency'].values,
+                                       'ping_time': data['ping_time'].values[::factor],
+                                       'range_bin': data['range_bin'].values[::factor]},
+                               attrs={'pyramid_factor': factor})
+            pyramid[factor] = level
+        self.pyramid[form] = pyramid
+
+        if save:
+            path = getattr(self, form + '_path') or self.validate_path(save_postfix='_' + form)
+            setattr(self, form + '_path', path)
+            if not os.path.exists(path):
+                print('%s  saving %s to %s' % (dt.datetime.now().strftime('%H:%M:%S'), form, path))
+                self._save_dataset(proc_data, path)
+            # A netCDF file cannot be added to while it is open for reading,
+            # so data read from the file are closed and opened again once the levels are saved
+            reopen = self._file_format == 'netcdf' and \
+                os.path.abspath(proc_data.encoding.get('source', '')) == os.path.abspath(path)
+            if reopen:
+                proc_data.close()
+            for key in [key for key in self._dataset_pool if key[0] == path]:
+                self._dataset_pool.pop(key).close()
+            print('%s  saving %s pyramid to %s' % (dt.datetime.now().strftime('%H:%M:%S'), form, path))
+            for factor, level in pyramid.items():
+                self._save_dataset(level, path, mode='a', group='%s_pyramid_%d' % (form, factor))
+            if reopen:
+                setattr(self, form, self._open_dataset(path))
+
+    def _get_pyramid(self, form='Sv'):
+        """Return the pyramid levels of ``form`` from memory or from the _Sv or _TS file.
+
+        Returns
+        -------
+        A dict of the levels by factor, empty if no pyramid was computed
+        """
+        if form in self.pyramid:
+            return self.pyramid[form]
+        path = getattr(self, form + '_path', None) or self.validate_path(save_postfix='_' + form)
+        if not os.path.exists(path):
+            return {}
+        if self._file_format == 'netcdf':
+            with netCDF4.Dataset(path) as ds:
+                groups = list(ds.groups)
+        else:
+            groups = list(zarr.open_group(path, mode='r').group_keys())
+        prefix = form + '_pyramid_'
+        return {int(g[len(prefix):]): self._get_file_group(path, g)
+                for g in groups if g.startswith(prefix) and g[len(prefix):].isdigit()}
+
+    def _save_dataset(self, ds, path, mode="w", group=None):
         """Save dataset to the appropriate formats.
 
         A utility method to use the correct function to save the dataset,
@@ -664,14 +989,135 @@ class ProcessBase(object):
             xarray dataset object
         path : str
             output file
+        mode : str
+            ``w`` to overwrite the file or ``a`` to add to it
+        group : str, optional
+            group of the file to save to, default to the root group
         """
         if self._file_format == 'netcdf':
-            ds.to_netcdf(path, mode=mode)
+            ds.to_netcdf(path, mode=mode, group=group)
         elif self._file_format == 'zarr':
-            ds.to_zarr(path, mode=mode)
+            ds.to_zarr(path, mode=mode, group=group)
+
+    def _get_group(self, path, group):
+        """Get a group of a data file from the pool of opened datasets.
+
+        Each group is opened on first use and stays open until ``close`` is called,
+        so that all computations on the same file share one handle per group.
+        When several files are processed, the group of ``file_path`` is that of all files
+        combined along ping_time.
+
+        Parameters
+        ----------
+        path : str
+            path to the netCDF or zarr data file
+        group : str
+            name of the group to open
+
+        Returns
+        -------
+        A shallow copy of the pooled dataset, so that changes to it do not affect later accesses
+        """
+        if path == self.file_path and len(self.file_list) > 1:
+            key = (tuple(self.file_list), group)
+            if key not in self._dataset_pool:
+                self._dataset_pool[key] = self._combine_group(group)
+            return self._dataset_pool[key].copy(deep=False)
+        return self._get_file_group(path, group).copy(deep=False)
+
+    def _get_file_group(self, path, group):
+        """Get a group of a single data file from the pool of opened datasets, see ``_get_group``.
+        """
+        key = (path, group)
+        if key not in self._dataset_pool:
+            with stage('open', file=os.path.basename(path), group=group):
+                self._dataset_pool[key] = self._open_dataset(path, group=group)
+        return self._dataset_pool[key]
+
+    def _combine_group(self, group):
+        """Concatenate a group of all files along ping_time, in the order of ``file_list``.
+
+        Variables without a ping_time dimension, such as calibration and environmental parameters,
+        must be identical in all files since they are taken from the first file.
+        Files with fewer range_bin, such as the ``_partXX`` files of a raw file, are padded with NaN.
+        """
+        ds_list = [self._get_file_group(path, group) for path in self.file_list]
+        for path, ds in zip(self.file_list[1:], ds_list[1:]):
+            for name, var in ds_list[0].variables.items():
+                if 'ping_time' in var.dims or name == 'range_bin':
+                    continue
+                if name not in ds.variables or not var.equals(ds.variables[name]):
+                    self.close()
+                    raise ValueError(f"{name} in group {group} of {os.path.basename(path)} differs from "
+                                     f"{os.path.basename(self.file_list[0])}, files with different "
+                                     f"parameters cannot be processed together")
+        if 'ping_time' not in ds_list[0].dims:
+            return ds_list[0]
+        with stage('combine', group=group, n_files=len(ds_list)):
+            return xr.concat(ds_list, dim='ping_time', data_vars='minimal', coords='minimal',
+                             compat='override', join='outer', combine_attrs='override')
+
+    def _sort_file_list(self):
+        """Sort the data files by their first ping and check that they can be combined along ping_time.
+        """
+        ping_ranges, frequency = [], None
+        for path in self.file_list:
+            ds_beam = self._get_file_group(path, 'Beam')
+            if frequency is None:
+                frequency = ds_beam.frequency.values
+            elif not np.array_equal(ds_beam.frequency.values, frequency):
+                self.close()
+                raise ValueError(f"{os.path.basename(path)} does not have the same frequency channels "
+                                 f"as {os.path.basename(self.file_list[0])}")
+            ping_time = ds_beam.ping_time.values
+            ping_ranges.append((ping_time[0], ping_time[-1]))
+
+        order = sorted(range(len(self.file_list)), key=lambda i: ping_ranges[i])
+        for i, j in zip(order[:-1], order[1:]):
+            if ping_ranges[i][1] >= ping_ranges[j][0]:
+                self.close()
+                raise ValueError(f"Pings of {os.path.basename(self.file_list[i])} and "
+                                 f"{os.path.basename(self.file_list[j])} overlap")
+        self.file_list = [self.file_list[i] for i in order]
+        if self.file_list[0] != self.file_path:
+            self.file_path = self.file_list[0]
+
+    @contextlib.contextmanager
+    def _open_group(self, path, group):
+        """Context manager version of ``_get_group``, the group is not closed when exiting.
+        """
+        yield self._get_group(path, group)
+
+    @contextlib.contextmanager
+    def _read_lazily(self, n_ping):
+        """Context manager chunking the opened groups into dask arrays of ``n_ping`` pings,
+        so that computations on them read the data block by block.
+        """
+        dataset_pool = self._dataset_pool
+        self._dataset_pool = {key: ds.chunk({'ping_time': n_ping}) if 'ping_time' in ds.dims else ds
+                              for key, ds in dataset_pool.items()}
+        try:
+            yield
+        finally:
+            # Groups opened in the meantime stay in the pool
+            dataset_pool.update({key: ds for key, ds in self._dataset_pool.items() if key not in dataset_pool})
+            self._dataset_pool = dataset_pool
+
+    def close(self):
+        """Close all data files opened by this object.
+        """
+        for ds in self._dataset_pool.values():
+            ds.close()
+        self._dataset_pool = {}
 
     def _set_open_dataset(self):
         if self._file_format == 'netcdf':
             self._open_dataset = xr.open_dataset
         elif self._file_format == 'zarr':
             self._open_dataset = xr.open_zarr
+
+        # Open data lazily as dask arrays with the requested chunks,
+        # an integer being the number of pings per chunk
+        if self.chunks is not None:
+            chunks = {'ping_time': self.chunks} if isinstance(self.chunks, int) else self.chunks
+            self._open_dataset = functools.partial(self._open_dataset, chunks=chunks)
@@ -1,9 +1,11 @@
 import os
 import shutil
+import pytest
 import numpy as np
 import xarray as xr
 import pandas as pd
 from ..convert import Convert
+from ..convert.azfp import ConvertAZFP
 
 # raw_path = './echopype/data/azfp/17031001.01A'     # Canada (Different ranges)
 # xml_path = './echopype/data/azfp/17030815.XML'     # Canada (Different ranges)
@@ -124,12 +126,10 @@ def test_validate_path():
     # Tests cases involving 2 files
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     tmp.filename = [raw_path, raw_path]
-    tmp_path = './echopype/test_data/azfp/temp_test_folder/.echopype_tmp'       # Path where temp files are stored
-    # Combining and path is a file
+    # Combining and path is a file (files are appended directly, no temporary folder is created)
     tmp.validate_path(save_path=file, file_format='.nc', combine_opt=True)
     assert os.path.exists(directory)
-    assert os.path.exists(tmp_path)
-    os.rmdir(tmp_path)
+    assert os.listdir(directory) == []
     os.rmdir(directory)
 
     # Combining and path is a folder (should error)
@@ -151,3 +151,34 @@ def test_validate_path():
     tmp.validate_path(save_path=directory, file_format='.nc', combine_opt=False)
     assert os.path.exists(directory)
     os.rmdir(directory)
+
+
+def test_invalid_header(tmp_path):
+    """Check that pings with an invalid header raise an error instead of being misread"""
+    path = str(tmp_path / '17082117.01A')
+    tmp = ConvertAZFP(path, xml_path)
+    header_dtype = np.dtype([(field[0], '>' + field[1]) + field[2:] for field in tmp.get_fields()])
+    header = np.zeros(1, dtype=header_dtype)
+    header['profile_flag'] = tmp.FILE_TYPE
+    header['num_bins'] = 2
+
+    header['num_chan'] = 5
+    header.tofile(path)
+    with pytest.raises(ValueError, match='num_chan 5 at byte offset 0'):
+        tmp.parse_raw(path)
+
+    header['num_chan'] = 1
+    header['profile_flag'] = 1
+    header.tofile(path)
+    with pytest.raises(ValueError, match='profile_flag 1 at byte offset 0'):
+        tmp.parse_raw(path)
+
+    # The number of bins of the second ping differs from that of the first ping
+    header['profile_flag'] = tmp.FILE_TYPE
+    pings = np.zeros(2, dtype=tmp._get_ping_dtype(header[0]))
+    for field in header_dtype.names:
+        pings[field] = header[field]
+    pings['num_bins'][1, 0] = 3
+    pings.tofile(path)
+    with pytest.raises(ValueError, match='num_bins .* byte offset %d' % pings.dtype.itemsize):
+        tmp.parse_raw(path)
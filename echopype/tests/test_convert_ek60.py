@@ -1,9 +1,16 @@
 import os
 import shutil
+import struct
 import numpy as np
 import xarray as xr
 import pandas as pd
 from ..convert import Convert
+from ..convert.ek60 import ConvertEK60, INDEX2POWER
+from ..convert.utils.ek_raw_io import RawSimradFile, SimradEOF, DGRAM_INDEX_SUFFIX
+from ..convert.utils.ek_date_conversion import nt_to_unix, unix_to_nt
+from ..convert.utils.ek_raw_parsers import SimradRawParser
+from ..convert.utils.ping_data import PingData
+from ..convert.utils.nmea_data import NMEAData, decode_positions
 
 raw_path = './echopype/test_data/ek60/DY1801_EK60-D20180211-T164025.raw'     # Standard test
 test_path = './echopype/test_data/ek60/from_matlab/DY1801_EK60-D20180211-T164025.nc'
@@ -77,3 +84,372 @@ def test_convert_zarr():
         assert np.allclose(ds_test.power, ds_beam.backscatter_r)
 
     shutil.rmtree(tmp.zarr_path, ignore_errors=True)    # Delete non-empty folder
+
+
+def test_mmap_reader():
+    """Check that memory-mapped reading returns the same datagrams as buffered reading"""
+    def read_all(use_mmap):
+        dgrams = []
+        with RawSimradFile(raw_path, 'r', use_mmap=use_mmap) as fid:
+            while True:
+                try:
+                    dgrams.append(fid.read(1))
+                except SimradEOF:
+                    break
+        return dgrams
+
+    dgrams_buffered = read_all(False)
+    dgrams_mmap = read_all(True)
+    assert len(dgrams_buffered) == len(dgrams_mmap)
+    for d_buf, d_mmap in zip(dgrams_buffered, dgrams_mmap):
+        assert d_buf['type'] == d_mmap['type']
+        assert d_buf['bytes_read'] == d_mmap['bytes_read']
+        if d_buf['type'].startswith('RAW'):
+            assert np.array_equal(d_buf['power'], d_mmap['power'])
+            assert np.array_equal(d_buf['angle'], d_mmap['angle'])
+
+
+def test_datagram_index():
+    """Check the datagram index against sequential reading and its sidecar cache"""
+    index_path = raw_path + DGRAM_INDEX_SUFFIX
+    if os.path.exists(index_path):
+        os.remove(index_path)
+
+    with RawSimradFile(raw_path, 'r') as fid:
+        dgram_types = []
+        while True:
+            try:
+                dgram_types.append(fid.read(1)['type'])
+            except SimradEOF:
+                break
+        index = fid.get_index()
+        assert [t.decode() for t in index['type']] == dgram_types
+        assert os.path.exists(index_path)
+
+        # Seeking by datagram number jumps to the indexed offsets
+        fid.seek(0, 2)
+        assert fid.tell() == len(index)
+        fid.seek(3, 0)
+        assert fid.read(1)['type'] == dgram_types[3]
+
+        # Only RAW datagrams after a given time are returned
+        nt_time = int(index['nt_time'][len(index) // 2])
+        start_time = nt_to_unix((nt_time & 0xFFFFFFFF, nt_time >> 32))
+        fid.seek(0, 0)
+        raw_dgrams = list(fid.iter_indexed_dgrams(types=['RAW'], start_time=start_time))
+        assert len(raw_dgrams) == np.sum((index['type'] == b'RAW0') &
+                                         (index['nt_time'] >= index['nt_time'][len(index) // 2]))
+
+    # The cached index is reused on reopening
+    with RawSimradFile(raw_path, 'r') as fid:
+        assert fid._load_index_cache()
+        assert np.array_equal(fid.get_index(), index)
+    os.remove(index_path)
+
+
+def test_ping_data_growth():
+    """Check that PingData grows along ping and range_bin without losing data"""
+    def make_datagram(ping, count):
+        datagram = {field: ping for field, _ in PingData.FIELDS}
+        datagram['count'] = count
+        datagram['power'] = np.full(count, ping, dtype='int16')
+        datagram['angle'] = np.full((count, 2), ping % 100, dtype='int8')
+        return datagram
+
+    ping_data = PingData(frequency=38000)
+    ping_data.CHUNK_SIZE = 7
+    counts = [10] * 12 + [15] * 9
+    for ping, count in enumerate(counts):
+        ping_data.add_ping(make_datagram(ping, count))
+    ping_data.trim()
+
+    assert ping_data['frequency'] == 38000
+    assert ping_data.power.shape == (len(counts), 15)
+    assert ping_data.angle.shape == (len(counts), 15, 2)
+    assert np.array_equal(ping_data.n_samples, counts)
+    assert np.array_equal(ping_data['pulse_length'], np.arange(len(counts)))
+    for ping, count in enumerate(counts):
+        assert np.all(ping_data.power[ping, :count] == ping)
+        assert np.all(ping_data.angle[ping, :count] == ping % 100)
+
+
+def test_split_by_range_group():
+    """Check that consecutive pings with the same number of range_bin form a range_bin group"""
+    counts = [10] * 12 + [15] * 5 + [10] * 3
+    ping_data = PingData(frequency=38000)
+    for ping, count in enumerate(counts):
+        datagram = {field: 1 for field, _ in PingData.FIELDS}
+        datagram.update(count=count, power=np.full(count, ping, dtype='int16'),
+                        angle=np.full((count, 2), ping, dtype='int8'))
+        ping_data.add_ping(datagram)
+    ping_data.trim()
+
+    tmp = ConvertEK60()
+    tmp.config_datagram = {'transceivers': {1: {'beam_type': 1}}, 'transceiver_count': 1}
+    tmp.ping_data_dict = {1: ping_data}
+    tmp.ping_time = list(np.datetime64('2018-02-11T16:40:25') + np.arange(len(counts)) * np.timedelta64(1, 's'))
+    tmp.split_by_range_group()
+
+    assert len(tmp.range_lengths) == 3
+    assert [(x.start, x.stop) for x in tmp.ping_slices] == [(0, 12), (12, 17), (17, 20)]
+    assert [tmp.power_dict_split[n].shape[2] for n in range(3)] == [10, 15, 10]
+    for n, ping_slice in enumerate(tmp.ping_slices):
+        assert np.array_equal(tmp.angle_dict_split[n][0, :, 0, 0], np.arange(ping_slice.start, ping_slice.stop))
+
+
+def test_sample_count_pad_range_bin(tmp_path):
+    """Check that the number of samples of each ping is only saved when padding range_bin groups"""
+    tmp = Convert(raw_path)
+    tmp.raw2nc(save_path=str(tmp_path / 'default.nc'))
+    with xr.open_dataset(tmp.nc_path, group='Beam') as ds_beam:
+        assert 'sample_count' not in ds_beam
+    tmp.raw2nc(save_path=str(tmp_path / 'padded.nc'), pad_range_bin=True)
+    with xr.open_dataset(tmp.nc_path, group='Beam') as ds_beam:
+        assert ds_beam.sample_count.dims == ('frequency', 'ping_time')
+        assert (ds_beam.sample_count <= ds_beam.range_bin.size).all()
+
+
+def test_convert_parallel(tmp_path):
+    """Check that converting files in parallel gives the same output as converting them one by one"""
+    raw_files = [str(tmp_path / ('copy%d-D20180211-T164025.raw' % n)) for n in range(3)]
+    for f in raw_files:
+        shutil.copyfile(raw_path, f)
+
+    Convert(raw_files).raw2nc(save_path=str(tmp_path / 'serial'))
+    tmp = Convert(raw_files)
+    tmp.raw2nc(save_path=str(tmp_path / 'parallel'), n_workers=2)
+    assert tmp.conversion_errors == {}
+
+    for f in raw_files:
+        nc_name = os.path.basename(f).replace('.raw', '.nc')
+        with xr.open_dataset(tmp_path / 'serial' / nc_name, group='Beam') as ds_serial, \
+                xr.open_dataset(tmp_path / 'parallel' / nc_name, group='Beam') as ds_parallel:
+            assert ds_serial.identical(ds_parallel)
+
+
+def test_convert_parallel_combine(tmp_path):
+    """Check that files combined in parallel are appended in order, as when combining them one by one"""
+    raw_files = [str(tmp_path / ('copy%d-D20180211-T164025.raw' % n)) for n in range(3)]
+    for f in raw_files:
+        shutil.copyfile(raw_path, f)
+
+    Convert(raw_files).raw2nc(save_path=str(tmp_path / 'serial.nc'), combine_opt=True)
+    tmp = Convert(raw_files)
+    tmp.raw2nc(save_path=str(tmp_path / 'parallel.nc'), combine_opt=True, n_workers=2)
+    assert tmp.conversion_errors == {}
+
+    for group in ['Beam', 'Environment', 'Platform', 'Platform/NMEA']:
+        with xr.open_dataset(tmp_path / 'serial.nc', group=group) as ds_serial, \
+                xr.open_dataset(tmp_path / 'parallel.nc', group=group) as ds_parallel:
+            assert ds_serial.identical(ds_parallel)
+
+
+def test_convert_corrupt_file(tmp_path):
+    """Check that a corrupt file does not stop the conversion of the other files, with any number of workers"""
+    raw_files = [str(tmp_path / ('copy%d-D20180211-T164025.raw' % n)) for n in range(3)]
+    for f in raw_files:
+        shutil.copyfile(raw_path, f)
+    with open(raw_files[1], 'wb') as f:
+        f.write(np.random.RandomState(0).bytes(5000))
+
+    for n_workers in [1, 2]:
+        save_path = tmp_path / ('workers%d' % n_workers)
+        tmp = Convert(raw_files)
+        tmp.raw2nc(save_path=str(save_path), n_workers=n_workers)
+        assert list(tmp.conversion_errors) == [raw_files[1]]
+        assert sorted(os.listdir(save_path)) == ['copy0-D20180211-T164025.nc', 'copy2-D20180211-T164025.nc']
+
+
+def test_convert_zarr_chunked(tmp_path):
+    """Check that converting to zarr in chunks of pings gives the same output as converting in one go"""
+    Convert(raw_path).raw2zarr(save_path=str(tmp_path / 'full'))
+    Convert(raw_path).raw2zarr(save_path=str(tmp_path / 'chunked'), ping_chunk_size=7)
+
+    zarr_name = os.path.basename(raw_path).replace('.raw', '.zarr')
+    for group in ['Beam', 'Platform', 'Platform/NMEA']:
+        with xr.open_zarr(str(tmp_path / 'full' / zarr_name), group=group) as ds_full, \
+                xr.open_zarr(str(tmp_path / 'chunked' / zarr_name), group=group) as ds_chunked:
+            assert ds_full.identical(ds_chunked)
+
+
+def test_convert_nc_combine(tmp_path):
+    """Check that files combined into one .nc file hold the data of the files converted separately"""
+    raw_files = [str(tmp_path / ('copy%d-D20180211-T164025.raw' % n)) for n in range(2)]
+    for f in raw_files:
+        shutil.copyfile(raw_path, f)
+
+    Convert(raw_files).raw2nc(save_path=str(tmp_path / 'separate'))
+    Convert(raw_files).raw2nc(save_path=str(tmp_path / 'combined.nc'), combine_opt=True)
+
+    nc_files = [str(tmp_path / 'separate' / os.path.basename(f).replace('.raw', '.nc')) for f in raw_files]
+    for group, dim in [('Beam', 'ping_time'), ('Platform/NMEA', 'time')]:
+        with xr.open_mfdataset(nc_files, group=group, combine='nested', concat_dim=dim,
+                               data_vars='minimal') as ds_separate, \
+                xr.open_dataset(tmp_path / 'combined.nc', group=group) as ds_combined:
+            assert ds_combined.dims == ds_separate.dims
+            for var in ds_separate.data_vars:
+                assert np.array_equal(ds_combined[var].values, ds_separate[var].values)
+
+
+def test_convert_combine_different_settings(tmp_path):
+    """Check that a file recorded with a different transmit power is not combined with the others"""
+    raw_files = [str(tmp_path / ('copy%d-D20180211-T164025.raw' % n)) for n in range(2)]
+    shutil.copyfile(raw_path, raw_files[0])
+    # Set the transmit_power of all RAW0 datagrams of the second file to 500 W
+    with open(raw_path, 'rb') as f:
+        data = bytearray(f.read())
+    pos = 0
+    while pos < len(data):
+        size = struct.unpack_from('<l', data, pos)[0]
+        if data[pos + 4:pos + 8] == b'RAW0':
+            struct.pack_into('<f', data, pos + 28, 500.0)
+        pos += size + 8
+    with open(raw_files[1], 'wb') as f:
+        f.write(data)
+
+    tmp = Convert(raw_files[0])
+    tmp.raw2nc(save_path=str(tmp_path / 'single'))
+    with xr.open_dataset(tmp.nc_path, group='Beam') as ds_single:
+        ping_time = ds_single.ping_time.values
+
+    for n_workers in [1, 2]:
+        tmp = Convert(raw_files)
+        tmp.raw2nc(save_path=str(tmp_path / ('combined%d.nc' % n_workers)), combine_opt=True,
+                   n_workers=n_workers)
+        assert list(tmp.conversion_errors) == [raw_files[1]]
+        assert 'transmit_power' in str(tmp.conversion_errors[raw_files[1]])
+        # No group of the combined file holds data of the second file
+        for group in ['Beam', 'Platform']:
+            with xr.open_dataset(tmp.nc_path, group=group) as ds_combined:
+                assert np.array_equal(ds_combined.ping_time.values, ping_time)
+
+
+def test_convert_subset(tmp_path):
+    """Check that converting a time window and a subset of channels gives the same data as the full file"""
+    tmp = Convert(raw_path)
+    tmp.raw2nc(save_path=str(tmp_path / 'full'))
+    with xr.open_dataset(tmp.nc_path, group='Beam') as ds_full:
+        ping_time = ds_full.ping_time.values
+        start_time, end_time = ping_time[10], ping_time[20]
+        frequencies = ds_full.frequency.values[[1, 3]]
+
+        tmp = Convert(raw_path)
+        tmp.raw2nc(save_path=str(tmp_path / 'subset'), start_time=start_time, end_time=end_time,
+                   frequencies=frequencies)
+        with xr.open_dataset(tmp.nc_path, group='Beam') as ds_subset:
+            assert np.array_equal(ds_subset.ping_time.values, ping_time[10:21])
+            assert np.array_equal(ds_subset.frequency.values, frequencies)
+            ds_full = ds_full.sel(ping_time=ds_subset.ping_time, frequency=ds_subset.frequency)
+            for var in ['backscatter_r', 'angle_athwartship', 'angle_alongship', 'transmit_power']:
+                assert np.array_equal(ds_subset[var].values, ds_full[var].values, equal_nan=True)
+        with xr.open_dataset(tmp.nc_path, group='Platform') as ds_platform:
+            assert (ds_platform.location_time.values >= start_time).all()
+            assert (ds_platform.location_time.values <= end_time).all()
+
+
+def test_convert_packed(tmp_path):
+    """Check that packed power and angles are stored as integers and decoded to the unpacked values"""
+    tmp = Convert(raw_path)
+    tmp.raw2nc(save_path=str(tmp_path / 'float'))
+    float_path = tmp.nc_path
+    tmp.raw2nc(save_path=str(tmp_path / 'packed'), packed=True)
+    assert tmp.power_dict_split[0].dtype == np.int16
+    assert tmp.angle_dict_split[0].dtype == np.int16
+
+    with xr.open_dataset(tmp.nc_path, group='Beam', mask_and_scale=False) as ds_raw:
+        assert ds_raw.backscatter_r.dtype == np.int16
+        assert ds_raw.angle_alongship.dtype == np.int16
+    with xr.open_dataset(float_path, group='Beam') as ds_float, \
+            xr.open_dataset(tmp.nc_path, group='Beam') as ds_packed:
+        for var in ['backscatter_r', 'angle_athwartship', 'angle_alongship']:
+            assert np.array_equal(ds_packed[var].values, ds_float[var].values, equal_nan=True)
+
+
+def test_convert_packed_range_edges(tmp_path):
+    """Check that packed power and angles at the edges of their integer range are not read as missing"""
+    tmp = ConvertEK60(raw_path)
+    tmp._packed = True
+    tmp.load_ek60_raw(raw_path)
+    power_edges = [np.iinfo('int16').min, np.iinfo('int16').max]
+    angle_edges = [np.iinfo('int8').min, np.iinfo('int8').max]
+    tmp.power_dict_split[0][0, 0, :2] = power_edges
+    tmp.angle_dict_split[0][0, 0, :2, :] = np.array(angle_edges)[:, None]
+    tmp.raw2nc(save_path=str(tmp_path / 'packed.nc'), packed=True)
+
+    with xr.open_dataset(tmp.nc_path, group='Beam') as ds_beam:
+        assert np.allclose(ds_beam.backscatter_r.values[0, 0, :2], np.array(power_edges) * INDEX2POWER)
+        for var in ['angle_athwartship', 'angle_alongship']:
+            assert np.array_equal(ds_beam[var].values[0, 0, :2], angle_edges)
+
+
+def test_raw0_roundtrip():
+    # Test that a RAW0 datagram packed with to_string is parsed back unchanged
+    low_date, high_date = unix_to_nt(1518367225.0)
+    power = np.arange(-500, 500, 10, dtype='int16')
+    angle = np.stack([np.arange(100) % 20 - 10, np.arange(100) % 7], axis=1).astype('int8')
+    dgram = SimradRawParser().to_string(dict(
+        type=b'RAW0', low_date=low_date, high_date=high_date, channel=1, mode=3, transducer_depth=9.15,
+        frequency=38000, transmit_power=1000.0, pulse_length=0.001024, bandwidth=2425.0,
+        sample_interval=0.000256, sound_velocity=1493.0, absorption_coefficient=0.01, heave=0.0,
+        roll=0.0, pitch=0.0, temperature=8.0, heading=0.0, transmit_mode=0, spare0=b'', offset=0,
+        count=power.size, power=power, angle=angle))
+    parsed = SimradRawParser().from_string(dgram[4:-4], len(dgram))
+    assert parsed['frequency'] == 38000
+    assert parsed['count'] == power.size
+    assert np.array_equal(parsed['power'], power)
+    assert np.array_equal(parsed['angle'], angle)
+
+
+def test_decode_nmea_positions():
+    # Test that positions decoded in bulk are identical to those of pynmea2
+    import pynmea2
+    sentences = np.array([
+        '$GPGGA,164025,4739.1234,N,12218.56789,W,1,08,0.9,545.4,M,46.9,M,,*5E',
+        '$GPGLL,4739.1234,S,00218.5,E,164025,A',
+        '$GPRMC,164025,A,4739.1234,N,12218.5678,W,022.4,084.4,110218,003.1,W*6A',
+        '$GPGGA,164025,,,,,0,00,,,M,,M,,*69',               # no fix
+        '$GPGGA,164025,4739.1234,N,12218.5678,W*00',         # wrong checksum
+        '$GPGGA,164025,47x9.1234,N,12218.5678,W',            # not a coordinate
+        'GPGLL,4739.1234,N,12218.5678,W',                    # no leading $
+    ], dtype=object)
+    # Fix the checksums of the first sentences
+    for i in range(4):
+        body = sentences[i].split('*')[0]
+        sentences[i] = body + '*%02X' % np.bitwise_xor.reduce([ord(c) for c in body[1:]])
+    messages = np.array(['GGA', 'GLL', 'RMC', 'GGA', 'GGA', 'GGA', 'GLL'])
+    lat, lon = decode_positions(sentences, messages)
+
+    for i in range(len(sentences)):
+        try:
+            msg = pynmea2.parse(sentences[i])
+            assert lat[i] == msg.latitude and lon[i] == msg.longitude
+        except (ValueError, AttributeError):
+            assert np.isnan(lat[i]) and np.isnan(lon[i])
+    assert lat[3] == 0 and lon[3] == 0
+    assert np.isnan(lat[4]) and np.isnan(lat[5])
+
+
+def test_nmea_data_duplicates():
+    # Test that duplicate NMEA datagrams are discarded when added one by one or in a batch
+    times = np.datetime64('2018-02-11T16:40:25', 'ms') + np.arange(2000).repeat(2)
+    texts = ['$GPGGA,164025,4739.1234,N', '$GPHDT,123.4,T'] * 2000
+    times, texts = np.concatenate([times, times[:10]]), texts + texts[:10]
+
+    nmea = NMEAData()
+    for t, s in zip(times, texts):
+        nmea.add_datagram(t, s)
+    nmea_batch = NMEAData()
+    nmea_batch.add_datagrams(times[:1500], texts[:1500])
+    nmea_batch.add_datagrams(times[1500:], texts[1500:])
+    nmea_batch.add_datagram(times[0], 'not NMEA')
+
+    for n in (nmea, nmea_batch):
+        assert n.n_raw == 4000
+        assert n.nmea_times.shape[0] < 2 * 4000
+        n.trim()
+        assert (n.nmea_times == times[:4000]).all()
+        assert (n.messages == ['GGA', 'HDT'] * 2000).all()
+        assert n.talker_ids == ['GP'] and n.message_ids == ['GGA', 'HDT']
+
+    nmea.add_datagrams(times[:10], texts[:10], allow_duplicates=True)
+    assert nmea.n_raw == 4010
@@ -4,6 +4,8 @@ import numpy as np
 import xarray as xr
 import pandas as pd
 from ..convert.ek80 import ConvertEK80
+from ..convert.utils.ek_raw_parsers import SimradRawParser, SimradFILParser, SimradXMLParser
+from ..convert.utils.ek_date_conversion import unix_to_nt
 
 raw_path_bb = './echopype/test_data/ek80/D20170912-T234910.raw'       # Large file (BB)
 raw_path_cw = './echopype/test_data/ek80/D20190822-T161221.raw'       # Small file (CW) (Standard test)
@@ -93,6 +95,18 @@ def test_bb():
     shutil.rmtree(tmp.zarr_path, ignore_errors=True)
 
 
+def test_bb_zarr_chunked(tmp_path):
+    # Test converting EK80 data to zarr in chunks of pings gives the same output as converting in one go
+    ConvertEK80(raw_path_bb_cw).raw2zarr(save_path=str(tmp_path / 'full'))
+    ConvertEK80(raw_path_bb_cw).raw2zarr(save_path=str(tmp_path / 'chunked'), ping_chunk_size=3)
+
+    for zarr_name in ['Summer2018--D20180905-T033113.zarr', 'Summer2018--D20180905-T033113_cw.zarr']:
+        for group in ['Beam', 'Platform']:
+            with xr.open_zarr(str(tmp_path / 'full' / zarr_name), group=group) as ds_full, \
+                    xr.open_zarr(str(tmp_path / 'chunked' / zarr_name), group=group) as ds_chunked:
+                assert ds_full.identical(ds_chunked)
+
+
 def test_sort_ch_ids():
     # Test sorting the channels in the file into broadband channels and continuous wave channels
 
@@ -115,6 +129,12 @@ def test_cw_bb():
     nc_path = './echopype/test_data/ek80/Summer2018--D20180905-T033113.nc'
     assert os.path.exists(cw_path)
     assert os.path.exists(nc_path)
+    # Shared groups are written to both files, each Beam group holds its own channels
+    with xr.open_dataset(nc_path, group='Platform') as ds_bb, xr.open_dataset(cw_path, group='Platform') as ds_cw:
+        assert ds_bb.identical(ds_cw)
+    with xr.open_dataset(nc_path, group='Beam') as ds_bb, xr.open_dataset(cw_path, group='Beam') as ds_cw:
+        assert ds_bb.frequency.size == 3
+        assert ds_cw.frequency.size == 2
     os.remove(cw_path)
     os.remove(nc_path)
 
@@ -128,3 +148,34 @@ def test_freq_subset():
     with xr.open_dataset(tmp.nc_path, group='Beam') as ds_beam:
         assert ds_beam.backscatter_r.shape == (2, 4, 1, 191327)
     os.remove(tmp.nc_path)
+
+
+def test_datagram_roundtrip():
+    # Test that datagrams packed with to_string are parsed back unchanged
+    low_date, high_date = unix_to_nt(1518367225.0)
+    dates = dict(low_date=low_date, high_date=high_date)
+    ch_id = b'WBT 545600-15 ES38-7C_ES'
+
+    # RAW3 with 4 quadrants of complex samples
+    samples = (np.arange(40).reshape(10, 4) * (1 + 2j)).astype('complex64')
+    dgram = SimradRawParser().to_string(dict(type=b'RAW3', channel_id=ch_id, spare=b'', offset=0, count=10,
+                                             data_type=(4 << 8) | 0b1100, complex=samples, **dates))
+    parsed = SimradRawParser().from_string(dgram[4:-4], len(dgram))
+    assert parsed['channel_id'] == ch_id.decode()
+    assert parsed['n_complex'] == 4
+    assert np.array_equal(parsed['complex'], samples.ravel())
+
+    # FIL1 filter coefficients
+    coefficients = np.arange(8, dtype='complex64') * 1j
+    dgram = SimradFILParser().to_string(dict(type=b'FIL1', stage=1, spare=b'', channel_id=ch_id, n_coefficients=8,
+                                             decimation_factor=6, coefficients=coefficients, **dates))
+    parsed = SimradFILParser().from_string(dgram[4:-4], len(dgram))
+    assert parsed['decimation_factor'] == 6
+    assert np.array_equal(parsed['coefficients'], coefficients)
+
+    # XML0 environment
+    xml_string = '<Environment Depth="100" Salinity="35" SoundSpeed="1493" Temperature="8"/>'
+    dgram = SimradXMLParser().to_string(dict(type=b'XML0', xml_string=xml_string, **dates))
+    parsed = SimradXMLParser().from_string(dgram[4:-4], len(dgram))
+    assert parsed['subtype'] == 'environment'
+    assert parsed['environment']['sound_speed'] == 1493
@@ -1,7 +1,9 @@
 import os
+import pytest
 import numpy as np
 import pandas as pd
 import xarray as xr
+import netCDF4
 from ..convert import Convert
 from ..process import ProcessEK60
 from ..process import Process
@@ -155,3 +157,132 @@ def test_calibrate():
     e_data.calibrate()
     # Check if Sv is strictly increasing by differentiating along range
     assert np.all(np.diff(e_data.Sv.Sv) >= 0)
+
+
+def test_calibrate_chunks():
+    """Check that calibration with ``chunks`` stays lazy and matches in-memory calibration.
+    """
+    tmp = Convert(ek60_raw_path)
+    tmp.raw2nc(overwrite=True)
+
+    e_data = Process(nc_path)
+    e_data.calibrate()
+    e_data_chunked = Process(nc_path, chunks=10)
+    e_data_chunked.calibrate(save=True)
+
+    # Sv is a dask array chunked along ping_time until it is computed
+    assert e_data_chunked.Sv.Sv.chunks is not None
+    assert max(e_data_chunked.Sv.Sv.chunks[1]) == 10
+    assert np.allclose(e_data.Sv.Sv.values, e_data_chunked.Sv.Sv.values, equal_nan=True)
+    with xr.open_dataset(Sv_path) as ds_Sv:
+        assert np.allclose(e_data.Sv.Sv.values, ds_Sv.Sv.values, equal_nan=True)
+
+    del tmp
+    del e_data
+    del e_data_chunked
+    os.remove(nc_path)
+    os.remove(Sv_path)
+
+
+def test_calibrate_MVBS():
+    """Check that MVBS calculated in one pass matches calibration, noise removal and MVBS done in turn.
+    """
+    tmp = Convert(ek60_raw_path)
+    tmp.raw2nc(overwrite=True)
+
+    e_data = Process(nc_path)
+    e_data.remove_noise(noise_est_ping_size=15, SNR=3)
+    e_data.get_MVBS(source_postfix='_Sv_clean', MVBS_ping_size=10)
+    e_data_fused = Process(nc_path, chunks=20)
+    e_data_fused.calibrate_MVBS(noise_est_ping_size=15, SNR=3, MVBS_ping_size=10)
+    xr.testing.assert_allclose(e_data.MVBS, e_data_fused.MVBS)
+
+    # Intermediate results are not saved nor kept
+    assert e_data_fused.Sv is None
+    assert e_data_fused.Sv_clean is None
+    assert not os.path.exists(Sv_path)
+
+    # MVBS tiles spanning blocks of noise estimation tiles, from data not opened with chunks
+    e_data.get_MVBS(source_postfix='_Sv_clean', MVBS_ping_interval=7)
+    e_data_blocks = Process(nc_path)
+    e_data_blocks.calibrate_MVBS(noise_est_ping_size=15, SNR=3, MVBS_ping_interval=7, block_size=20)
+    xr.testing.assert_allclose(e_data.MVBS, e_data_blocks.MVBS)
+    assert e_data_blocks.Sv is None
+
+    del tmp
+    del e_data
+    del e_data_fused
+    del e_data_blocks
+    os.remove(nc_path)
+
+
+def test_process_multiple_files(tmp_path):
+    """Check that files converted from parts of a raw file are calibrated as one dataset.
+    """
+    full_path = str(tmp_path / 'full.nc')
+    multi_dir = str(tmp_path / 'multi')
+    Convert(ek60_raw_path).raw2nc(save_path=full_path)
+    with xr.open_dataset(full_path, group='Beam') as ds_beam:
+        ping_time = ds_beam.ping_time.values
+    for n, (start_time, end_time) in enumerate([(ping_time[0], ping_time[9]), (ping_time[10], ping_time[-1])]):
+        tmp = Convert(ek60_raw_path)
+        tmp.raw2nc(save_path=os.path.join(multi_dir, 'part%d.nc' % n), start_time=start_time, end_time=end_time)
+
+    e_data = Process(full_path)
+    e_data.calibrate()
+    for src in [os.path.join(multi_dir, '*.nc'), multi_dir]:
+        with Process(src, chunks=5) as e_data_multi:
+            assert [os.path.basename(f) for f in e_data_multi.file_list] == ['part0.nc', 'part1.nc']
+            e_data_multi.calibrate()
+            assert np.array_equal(e_data_multi.Sv.ping_time.values, ping_time)
+            assert np.allclose(e_data.Sv.Sv.values, e_data_multi.Sv.Sv.values, equal_nan=True)
+
+    # Files are sorted by ping_time, overlapping files cannot be combined
+    parts = [os.path.join(multi_dir, 'part1.nc'), os.path.join(multi_dir, 'part0.nc')]
+    with Process(parts) as e_data_multi:
+        assert e_data_multi.file_list == parts[::-1]
+    with pytest.raises(ValueError):
+        Process(parts + [full_path])
+
+    del tmp
+    e_data.close()
+
+
+def test_process_multiple_files_parameters(tmp_path):
+    """Check that files with different calibration parameters are not processed together.
+    """
+    full_path = str(tmp_path / 'full.nc')
+    Convert(ek60_raw_path).raw2nc(save_path=full_path)
+    with xr.open_dataset(full_path, group='Beam') as ds_beam:
+        ping_time = ds_beam.ping_time.values
+    parts = [str(tmp_path / 'part0.nc'), str(tmp_path / 'part1.nc')]
+    for path, (start_time, end_time) in zip(parts, [(ping_time[0], ping_time[9]), (ping_time[10], ping_time[-1])]):
+        Convert(ek60_raw_path).raw2nc(save_path=path, start_time=start_time, end_time=end_time)
+    with netCDF4.Dataset(parts[1], 'a') as nc:
+        nc['Beam']['transmit_power'][:] = nc['Beam']['transmit_power'][:] / 2
+
+    with pytest.raises(ValueError, match='transmit_power'):
+        Process(parts)
+
+
+def test_dataset_pool():
+    """Check that each group of the data file is opened once and closed with the Process object.
+    """
+    tmp = Convert(ek60_raw_path)
+    tmp.raw2nc(overwrite=True)
+
+    with Process(nc_path) as e_data:
+        assert set(e_data._dataset_pool) == {(nc_path, 'Beam'), (nc_path, 'Environment')}
+        e_data.calibrate()
+        e_data.calibrate_TS()
+        assert len(e_data._dataset_pool) == 2
+
+        # Setting parameters does not change the values read from the data file
+        sound_speed = e_data.sound_speed.values.copy()
+        e_data.sound_speed = sound_speed + 10
+        assert np.array_equal(e_data.calc_sound_speed(), sound_speed)
+    assert e_data._dataset_pool == {}
+
+    del tmp
+    del e_data
+    os.remove(nc_path)
@@ -1,6 +1,10 @@
 import os
+import numpy as np
+from scipy import signal, fft
 from ..convert import Convert
 from ..process import Process
+from ..process import ProcessEK80
+from ..process.ek80 import get_transmit_replica
 
 # ek80_raw_path = './echopype/test_data/ek80/D20170912-T234910.raw'   # Large dataset (BB)
 # ek80_raw_path = './echopype/test_data/ek80/D20190822-T161221.raw'     # Small dataset (CW)
@@ -34,3 +38,38 @@ def test_noise_estimates_removal():
     os.remove(Sv_path)
     os.remove(cw_path)
     os.remove(cw_Sv_path)
+
+
+def test_matched_filter():
+    """Check FFT matched filter against direct convolution, including NaN samples.
+    """
+    np.random.seed(1)
+    backscatter = np.random.normal(size=(4, 3, 50)) + 1j * np.random.normal(size=(4, 3, 50))
+    backscatter[0, 1, 10] = np.nan
+    backscatter[1, 2, 45:] = np.nan
+    replica = np.random.normal(size=7) + 1j * np.random.normal(size=7)
+
+    compressed_test = np.apply_along_axis(lambda m: signal.convolve(m, replica, method='direct'),
+                                          axis=2, arr=backscatter)
+    compressed = ProcessEK80._matched_filter(backscatter, fft.fft(replica, fft.next_fast_len(56)), replica.size)
+    assert np.array_equal(np.isnan(compressed), np.isnan(compressed_test))
+    assert np.allclose(compressed, compressed_test, atol=1e-10, equal_nan=True)
+
+
+def test_transmit_replica_cache():
+    """Check that transmit replicas are generated once for the same transmit settings.
+    """
+    wbt_fil = (np.ones(8) + 1j * np.arange(8)).astype('complex64').tobytes()
+    pc_fil = np.ones(4, dtype='complex64').tobytes()
+    get_transmit_replica.cache_clear()
+    replica = get_transmit_replica(34000, 45000, 1.024e-3, 0.0156, 50., wbt_fil, 6, pc_fil, 4)
+    assert get_transmit_replica(34000, 45000, 1.024e-3, 0.0156, 50., wbt_fil, 6, pc_fil, 4) is replica
+    assert get_transmit_replica.cache_info().hits == 1
+
+    # Derived quantities match the ones computed from the replica directly
+    matched = np.flipud(np.conj(replica.signal))
+    assert np.isclose(replica.norm, np.linalg.norm(replica.signal))
+    assert np.allclose(replica.get_fft(64), fft.fft(matched, 64))
+    assert replica.get_fft(64) is replica.get_fft(64)
+    ptxa = np.abs(signal.convolve(replica.signal, matched)) ** 2
+    assert np.isclose(replica.tau_effective, ptxa.sum() / ptxa.max())
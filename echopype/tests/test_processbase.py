@@ -158,6 +158,8 @@ def test_get_MVBS():
     shape = (nfreq, npings / MVBS_ping_size, nrange / MVBS_range_bin_size)
     assert e_data.MVBS.MVBS.shape == shape
     assert np.all(e_data.MVBS.MVBS.round() == 1)
+    # ping_time of each tile is the mean of its pings
+    assert np.array_equal(e_data.MVBS.ping_time.values, ping_index.reshape(-1, MVBS_ping_size).mean(axis=1))
 
     # Try new ping and range_bin tile size
     # reset the necessary variables
@@ -186,3 +188,109 @@ def test_get_MVBS():
 
     # delete created nc file
     os.remove(tmp.nc_path)
+
+
+def test_get_MVBS_interval():
+    # Create process object
+    tmp = ConvertEK60(ek60_raw_path)
+    tmp.raw2nc()
+    e_data = Process(tmp.nc_path)
+    nfreq, npings, nrange = 2, 10, 100
+    freq_index = np.arange(nfreq)
+    # Pings every 2 seconds with a gap of 1 minute after the 5th ping
+    ping_time = np.datetime64('2018-02-11T16:40:00', 'ns') + \
+        np.r_[np.arange(5), np.arange(5) + 35] * np.timedelta64(2, 's')
+    np.random.seed(1)
+    data = np.random.random((nfreq, npings, nrange))
+    Sv = xr.DataArray(data, coords=[('frequency', freq_index),
+                                    ('ping_time', ping_time),
+                                    ('range_bin', np.arange(nrange))])
+    Sv.name = "Sv"
+    e_data.Sv = Sv.to_dataset()
+    # Different sample thickness for each channel
+    e_data.sample_thickness = xr.DataArray([1, 2], coords=[('frequency', freq_index)])
+    e_data._range = e_data.sample_thickness * xr.DataArray(np.arange(nrange),
+                                                           coords=[('range_bin', np.arange(nrange))])
+
+    # Tiles of 6 seconds and 10 meters
+    e_data.get_MVBS(MVBS_ping_interval=6, MVBS_range_bin_size=10, range_in_meters=True)
+    # Empty tiles along ping_time are dropped, longest range is 198 m
+    assert e_data.MVBS.MVBS.shape == (nfreq, 5, 20)
+    assert np.all(e_data.MVBS.ping_time.values ==
+                  ping_time[0] + np.array([0, 6, 66, 72, 78]) * np.timedelta64(1, 's'))
+    # Range tiles are 10 samples long in the first channel and 5 samples long in the second channel
+    Sv_linear = 10 ** (data / 10)
+    assert np.isclose(e_data.MVBS.MVBS[0, 1, 1], 10 * np.log10(Sv_linear[0, 3:5, 10:20].mean()))
+    assert np.isclose(e_data.MVBS.MVBS[1, 2, 19], 10 * np.log10(Sv_linear[1, 5:6, 95:].mean()))
+    assert np.all(np.isnan(e_data.MVBS.MVBS[0, :, 10:]))
+
+    # Tiles of a number of pings are used again once MVBS_ping_size is given
+    e_data.get_MVBS(MVBS_ping_size=5, MVBS_range_bin_size=10, range_in_meters=True)
+    assert e_data.MVBS_ping_interval is None
+    assert e_data.MVBS.MVBS.shape == (nfreq, 2, 20)
+    assert np.all(e_data.MVBS.ping_time.values == ping_time[[2, 7]])
+
+    # delete created nc file
+    os.remove(tmp.nc_path)
+
+
+def test_get_pyramid():
+    # Create process object
+    tmp = ConvertEK60(ek60_raw_path)
+    tmp.raw2nc()
+    e_data = Process(tmp.nc_path)
+    nfreq, npings, nrange = 2, 13, 21
+    np.random.seed(1)
+    data = np.random.random((nfreq, npings, nrange))
+    data[0, 3, :10] = np.nan
+    Sv = xr.DataArray(data, coords=[('frequency', np.arange(nfreq)),
+                                    ('ping_time', np.arange(npings).astype('datetime64[s]')),
+                                    ('range_bin', np.arange(nrange))])
+    Sv.name = 'Sv'
+    e_data.Sv = Sv.to_dataset()
+
+    e_data.get_pyramid(n_levels=3, block_size=5, save=True)
+    assert sorted(e_data.pyramid['Sv']) == [2, 4, 8]
+    level = e_data.pyramid['Sv'][4]
+    assert level.Sv.shape == (nfreq, 4, 6)
+    assert np.array_equal(level.ping_time, Sv.ping_time[::4])
+    assert np.array_equal(level.range_bin, Sv.range_bin[::4])
+    # Tiles are averaged in the linear domain over valid samples, smaller tiles at the ends
+    Sv_linear = 10 ** (data / 10)
+    assert np.isclose(level.Sv[0, 0, 2], 10 * np.log10(np.nanmean(Sv_linear[0, :4, 8:12])))
+    assert np.isclose(level.Sv[1, 3, 5], 10 * np.log10(Sv_linear[1, 12:, 20:].mean()))
+    assert np.isclose(level.Sv_max[0, 0, 2], np.nanmax(data[0, :4, 8:12]))
+
+    # Levels are saved as groups of the _Sv file
+    e_data_saved = Process(tmp.nc_path)
+    pyramid = e_data_saved._get_pyramid('Sv')
+    assert sorted(pyramid) == [2, 4, 8]
+    assert np.allclose(pyramid[4].Sv, level.Sv)
+
+    # delete created nc file
+    e_data_saved.close()
+    os.remove(tmp.nc_path)
+    os.remove(e_data.Sv_path)
+
+
+def test_get_pyramid_saved_Sv(tmp_path):
+    # Test saving the pyramid of Sv read from the _Sv file to the same file
+    nc_path = str(tmp_path / os.path.basename(ek60_raw_path).replace('.raw', '.nc'))
+    ConvertEK60(ek60_raw_path).raw2nc(save_path=nc_path)
+    with Process(nc_path) as e_data:
+        e_data.calibrate(save=True)
+        Sv_path = e_data.Sv_path
+
+    with Process(nc_path) as e_data:
+        e_data.get_pyramid(n_levels=2, save=True)
+        assert sorted(e_data.pyramid['Sv']) == [2, 4]
+        # Sv is read from the _Sv file again after the levels are added to it
+        assert e_data.Sv.encoding['source'] == os.path.abspath(Sv_path)
+        with xr.open_dataset(Sv_path) as ds_Sv:
+            assert e_data.Sv.identical(ds_Sv)
+        level = e_data.pyramid['Sv'][4]
+
+    with Process(nc_path) as e_data_saved:
+        pyramid = e_data_saved._get_pyramid('Sv')
+        assert sorted(pyramid) == [2, 4]
+        assert np.allclose(pyramid[4].Sv, level.Sv, equal_nan=True)
@@ -0,0 +1,50 @@
+import json
+import numpy as np
+from ..utils.profiling import Profiler, stage, profiled, get_profiler
+
+
+def test_profiler_stages(tmp_path):
+    # Test recording nested stages, their counts and the exported report
+    finished = []
+
+    @profiled('square', counts=lambda x: {'n_pings': len(x)})
+    def square(x):
+        return x ** 2
+
+    # Stages are not recorded without an active profiler
+    with stage('parse') as record:
+        record.add(n_pings=10)
+    assert get_profiler() is None
+
+    with Profiler(trace_memory=True, callbacks=[finished.append]) as prof:
+        assert get_profiler() is prof
+        with stage('convert', file='a.raw') as record:
+            record.add(n_bytes_read=2e6)
+            with stage('parse', file='a.raw') as record:
+                record.add(n_datagrams=30, n_pings=10)
+                np.ones(10 ** 6)
+        square(np.arange(5))
+        square(np.arange(3))
+    assert get_profiler() is None
+
+    # Stages are listed in the order they finished
+    assert [r['stage'] for r in finished] == ['parse', 'convert', 'square', 'square']
+    parse, convert = finished[:2]
+    assert parse['depth'] == 1 and convert['depth'] == 0
+    assert parse['file'] == 'a.raw'
+    assert parse['pings_per_s'] == parse['n_pings'] / parse['duration']
+    assert convert['MB_read_per_s'] == 2 / convert['duration']
+    # Peak memory of the enclosing stage includes that of the nested stage
+    assert parse['peak_memory'] >= 8e6
+    assert convert['peak_memory'] >= parse['peak_memory']
+
+    summary = prof.summary()
+    assert summary['square']['n_runs'] == 2
+    assert summary['square']['n_pings'] == 8
+
+    json_path = str(tmp_path / 'profile.json')
+    prof.to_json(json_path)
+    with open(json_path) as f:
+        report = json.load(f)
+    assert len(report['stages']) == 4
+    assert report['summary']['parse']['n_datagrams'] == 30
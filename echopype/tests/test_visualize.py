@@ -0,0 +1,62 @@
+import numpy as np
+import xarray as xr
+from ..visualize.echogram import EchoGram, burst_gaps, find_gaps, insert_gaps
+
+
+def test_insert_gaps():
+    """Check that a ping of NaN is inserted after each burst of pings."""
+    nfreq, nping, nrange = 2, 10, 5
+    # Bursts of 4 pings every second, 60 seconds apart
+    ping_time = np.datetime64('2020-01-01T00:00:00', 'ns') + \
+        (np.arange(nping) + np.arange(nping) // 4 * 60) * np.timedelta64(1, 's')
+    data = xr.DataArray(np.random.random((nfreq, nping, nrange)),
+                        coords=[('frequency', np.arange(nfreq)),
+                                ('ping_time', ping_time),
+                                ('range_bin', np.arange(nrange))])
+
+    gap_index, gap_interval = find_gaps(ping_time, 30)
+    assert np.array_equal(gap_index, [4, 8])
+    assert gap_interval == np.timedelta64(1, 's')
+
+    gapped = insert_gaps(data, gap_index, gap_interval)
+    assert gapped.shape == (nfreq, nping + 2, nrange)
+    assert np.all(np.isnan(gapped.values[:, [4, 9]]))
+    assert np.array_equal(gapped.values[:, np.r_[0:4, 5:9, 10:12]], data.values)
+    assert gapped.ping_time.values[4] == ping_time[3] + np.timedelta64(1, 's')
+    assert np.all(np.diff(gapped.ping_time.values) > np.timedelta64(0, 's'))
+
+    # Data without gaps are unchanged
+    assert insert_gaps(data, [], gap_interval) is data
+
+
+def test_burst_gaps_window():
+    """Check that gaps between bursts are placed from the first ping of all data in a window starting mid-burst."""
+    nfreq, nping, nrange = 1, 12, 4
+    # Bursts of 4 pings every second, 60 seconds apart
+    ping_time = np.datetime64('2020-01-01T00:00:00', 'ns') + \
+        (np.arange(nping) + np.arange(nping) // 4 * 60) * np.timedelta64(1, 's')
+    data = xr.DataArray(np.random.random((nfreq, nping, nrange)),
+                        coords=[('frequency', np.arange(nfreq)),
+                                ('ping_time', ping_time),
+                                ('range_bin', np.arange(nrange))])
+    depth = xr.DataArray(np.ones((nfreq, nrange)), coords=[data.frequency, data.range_bin])
+    level_2 = xr.Dataset({'Sv': data[:, ::2, ::2], 'Sv_max': data[:, ::2, ::2]})
+
+    class Echo:
+        def _get_pyramid(self, form):
+            return {2: level_2}
+    echogram = EchoGram(Echo())
+
+    # Window starting at the 3rd ping of the 2nd burst
+    time_window = (ping_time[6], ping_time[-1])
+    window, _, factor, ping_offset = echogram._select_window('Sv', data, depth, time_window, level=None,
+                                                             ping_per_profile=4)
+    assert (factor, ping_offset) == (1, 6)
+    gap_index = burst_gaps(ping_offset, window.sizes['ping_time'], 4, factor)
+    assert np.array_equal(window.ping_time.values[gap_index], ping_time[[8]])
+
+    window, _, factor, ping_offset = echogram._select_window('Sv', data, depth, time_window, level=2,
+                                                             ping_per_profile=4)
+    assert (factor, ping_offset) == (2, 6)
+    gap_index = burst_gaps(ping_offset, window.sizes['ping_time'], 4, factor)
+    assert np.array_equal(window.ping_time.values[gap_index], ping_time[[8]])
@@ -0,0 +1,187 @@
+"""
+echopype utilities for averaging echo data over tiles along ping_time and range_bin
+"""
+import numpy as np
+
+
+def get_bin_index(values, bin_size, origin=None):
+    """Assign values to consecutive bins of ``bin_size``.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        non-decreasing values along the last axis, e.g. ping time in seconds or range in meters
+    bin_size : float or np.ndarray
+        size of each bin, can be different for each row of ``values``
+    origin : float, optional
+        start of the first bin, defaults to the first value of each row
+
+    Returns
+    -------
+    Index of the bin of each value
+    """
+    values = np.asarray(values, dtype='float64')
+    bin_size = np.asarray(bin_size, dtype='float64')
+    if values.ndim > 1 and bin_size.ndim == 1:
+        bin_size = bin_size[:, None]
+    if origin is None:
+        origin = values[..., :1]
+    return np.floor((values - origin) / bin_size).astype(np.int64)
+
+
+def bin_sum(data, ping_bin, range_bin, block_size=None):
+    """Sum data and count valid (not NaN) samples over tiles defined by bin indices along ping_time and range_bin.
+
+    All frequency channels are summed together, so that tiles along range can differ
+    between channels. Tiles are summed using ``np.add.reduceat``, which requires
+    bin indices to be non-decreasing along each dimension.
+
+    Parameters
+    ----------
+    data : np.ndarray or dask.array.Array
+        data with dimensions [frequency x ping_time x range_bin]
+    ping_bin : np.ndarray
+        bin index of each ping [ping_time]
+    range_bin : np.ndarray
+        bin index of each sample along range for each channel [frequency x range_bin]
+    block_size : int, optional
+        approximate number of pings loaded at once, all pings are loaded if ``None``
+
+    Returns
+    -------
+    tile_sum : np.ndarray
+        sum of the valid samples of each tile [frequency x ping tiles x range tiles]
+    tile_cnt : np.ndarray
+        number of valid samples of each tile [frequency x ping tiles x range tiles]
+    ping_start : np.ndarray
+        index of the first ping of each ping tile
+    """
+    n_freq, n_ping, n_range = data.shape
+    ping_bin = np.asarray(ping_bin)
+    range_bin = np.broadcast_to(range_bin, (n_freq, n_range))
+
+    # Position of the first element of each tile
+    ping_start = np.flatnonzero(np.r_[True, ping_bin[1:] != ping_bin[:-1]]) if n_ping else np.zeros(0, int)
+    range_new = np.ones((n_freq, n_range), dtype=bool)
+    range_new[:, 1:] = range_bin[:, 1:] != range_bin[:, :-1]
+    range_start = np.flatnonzero(range_new)     # in the flattened [frequency x range_bin] samples
+    out_freq, out_range = range_start // n_range, range_bin.ravel()[range_start]
+
+    n_range_tiles = range_bin.max() + 1 if range_bin.size else 0
+
+    # Tiles of the same number of samples in all channels are summed by reshaping,
+    # which also keeps the pairwise summation of numpy
+    tile_len = np.count_nonzero(range_bin[0] == range_bin[0, 0]) if range_bin.size else 1
+    regular = np.array_equal(range_bin, np.broadcast_to(np.arange(n_range) // tile_len, (n_freq, n_range)))
+
+    def reduce_range(x):
+        if regular:
+            x = x.reshape(x.shape[0], n_freq, n_range)
+            if n_range_tiles * tile_len > n_range:
+                x = np.pad(x, ((0, 0), (0, 0), (0, n_range_tiles * tile_len - n_range)))
+            return x.reshape(x.shape[0], n_freq, n_range_tiles, tile_len).sum(axis=-1).reshape(x.shape[0], -1)
+        return np.add.reduceat(x, range_start, axis=1)
+    tile_sum = np.zeros((n_freq, ping_start.size, n_range_tiles))
+    tile_cnt = np.zeros((n_freq, ping_start.size, n_range_tiles), dtype=np.int64)
+
+    # Reduce blocks made of whole ping tiles so that tiles are never split across blocks
+    tile_edge = np.r_[ping_start, n_ping]
+    block_size = n_ping if block_size is None else block_size
+    t0 = 0
+    while t0 < ping_start.size:
+        t1 = max(t0 + 1, np.searchsorted(tile_edge, tile_edge[t0] + block_size, side='right') - 1)
+        p0, p1 = tile_edge[t0], tile_edge[t1]
+        # [ping_time x (frequency, range_bin)] so that all channels are reduced at once
+        x = np.moveaxis(np.asarray(data[:, p0:p1, :], dtype='float64'), 0, 1).reshape(p1 - p0, -1)
+        valid = ~np.isnan(x)
+        x = np.where(valid, x, 0)
+        starts = ping_start[t0:t1] - p0
+        tile_sum[out_freq, t0:t1, out_range] = np.add.reduceat(reduce_range(x), starts, axis=0).T
+        tile_cnt[out_freq, t0:t1, out_range] = np.add.reduceat(reduce_range(valid.astype(np.int64)),
+                                                               starts, axis=0).T
+        t0 = t1
+
+    return tile_sum, tile_cnt, ping_start
+
+
+def bin_mean(data, ping_bin, range_bin, block_size=None):
+    """Average data over tiles defined by bin indices along ping_time and range_bin.
+
+    The averages are obtained from the sums and counts of valid (not NaN) samples
+    in each tile, see ``bin_sum``. Bins without any sample are filled with NaN.
+
+    Parameters
+    ----------
+    data : np.ndarray or dask.array.Array
+        data with dimensions [frequency x ping_time x range_bin]
+    ping_bin : np.ndarray
+        bin index of each ping [ping_time]
+    range_bin : np.ndarray
+        bin index of each sample along range for each channel [frequency x range_bin]
+    block_size : int, optional
+        approximate number of pings loaded at once, all pings are loaded if ``None``
+
+    Returns
+    -------
+    tile_mean : np.ndarray
+        mean of each tile [frequency x ping tiles x range tiles]
+    ping_start : np.ndarray
+        index of the first ping of each ping tile
+    """
+    tile_sum, tile_cnt, ping_start = bin_sum(data, ping_bin, range_bin, block_size=block_size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return tile_sum / tile_cnt, ping_start
+
+
+def _pool(x, ufunc, fill):
+    """Reduce tiles of 2 x 2 [ping_time x range_bin] samples with ``ufunc``, padding odd dimensions with ``fill``.
+    """
+    n_freq, n_ping, n_range = x.shape
+    x = np.pad(x, ((0, 0), (0, n_ping % 2), (0, n_range % 2)), constant_values=fill)
+    x = x.reshape(n_freq, x.shape[1] // 2, 2, x.shape[2] // 2, 2)
+    return ufunc.reduce(ufunc.reduce(x, axis=4), axis=2)
+
+
+def pyramid_levels(data, n_levels, block_size=None):
+    """Downsample data by factors of 2, 4, ..., 2 ** n_levels along both ping_time and range_bin.
+
+    Each level is obtained from the sums, counts of valid (not NaN) samples and maxima
+    of the previous level, so that all levels are computed in one pass over the data
+    and the means of each level are those of the valid samples of the tiles.
+    Tiles at the end of ping_time and range_bin can be smaller than the others.
+
+    Parameters
+    ----------
+    data : np.ndarray or dask.array.Array
+        data in the linear domain with dimensions [frequency x ping_time x range_bin]
+    n_levels : int
+        number of levels
+    block_size : int, optional
+        approximate number of pings loaded at once, all pings are loaded if ``None``
+
+    Returns
+    -------
+    List of ``(tile_mean, tile_max)`` for each level,
+    with dimensions [frequency x ping_time / factor x range_bin / factor]
+    """
+    n_ping = data.shape[1]
+    top = 2 ** n_levels
+    # Blocks made of whole tiles of the coarsest level so that tiles are never split across blocks
+    block_size = n_ping if block_size is None else block_size
+    block_size = max(int(np.ceil(block_size / top)), 1) * top
+
+    levels = [([], []) for _ in range(n_levels)]
+    for p0 in range(0, n_ping, block_size):
+        x = np.asarray(data[:, p0:p0 + block_size, :], dtype='float64')
+        valid = ~np.isnan(x)
+        tile_sum, tile_cnt, tile_max = np.where(valid, x, 0), valid.astype(np.int64), x
+        for level_mean, level_max in levels:
+            tile_sum = _pool(tile_sum, np.add, 0)
+            tile_cnt = _pool(tile_cnt, np.add, 0)
+            tile_max = _pool(tile_max, np.fmax, np.nan)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                level_mean.append(tile_sum / tile_cnt)
+            level_max.append(tile_max)
+
+    return [(np.concatenate(level_mean, axis=1), np.concatenate(level_max, axis=1))
+            for level_mean, level_max in levels]
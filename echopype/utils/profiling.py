@@ -0,0 +1,246 @@
+"""
+Stage-level profiling of conversion and processing.
+
+Conversion and processing are instrumented with named stages. When a ``Profiler``
+is active, each stage records its duration, bytes read and written, datagrams
+and pings handled, and optionally peak memory. The records can be passed to
+callbacks as they finish, logged as JSON lines, or exported as a JSON report::
+
+    from echopype.utils.profiling import Profiler
+
+    with Profiler(trace_memory=True) as prof:
+        Convert('file.raw').raw2nc()
+        Process('file.nc').calibrate()
+    prof.to_json('profile.json')
+
+Stages of conversion are ``convert`` (one raw file), ``parse``, ``split_by_range_group``,
+``set_groups.<group>`` and ``combine`` (appending to an existing output file).
+Stages of processing are ``open``, ``calibrate``, ``pulse_compression``, ``noise`` and ``MVBS``.
+Stages in the worker processes of parallel conversion are not recorded,
+and lazy (dask) results are computed outside of the stage that created them.
+Without an active ``Profiler`` stages are not recorded and cost next to nothing.
+"""
+import os
+import json
+import time
+import logging
+import functools
+import contextlib
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+_profiler = None   # the active Profiler
+
+COUNTS = ('n_bytes_read', 'n_bytes_written', 'n_datagrams', 'n_pings')
+
+
+class StageRecord:
+    """Metrics of one run of a stage.
+
+    Counts are added with ``add`` while the stage runs, e.g. ``record.add(n_pings=10)``.
+    """
+    def __init__(self, name, depth=0, **info):
+        self.name = name
+        self.depth = depth        # number of enclosing stages
+        self.info = info          # e.g. the file being processed
+        self.counts = dict.fromkeys(COUNTS, 0)
+        self.start = None
+        self.duration = None
+        self.peak_memory = None   # peak of memory allocations traced by tracemalloc [bytes]
+
+    def add(self, **counts):
+        for k, v in counts.items():
+            self.counts[k] = self.counts.get(k, 0) + v
+
+    def to_dict(self):
+        """Return the metrics as a dict, with rates per second of the non-zero counts."""
+        out = dict(stage=self.name, depth=self.depth, **self.info,
+                   duration=self.duration, peak_memory=self.peak_memory)
+        out.update({k: v for k, v in self.counts.items() if v})
+        out.update(_rates(self.counts, self.duration))
+        return out
+
+
+class _NullRecord:
+    """Record returned when no profiler is active, counts are discarded."""
+    def add(self, **counts):
+        pass
+
+
+_NULL_RECORD = _NullRecord()
+
+
+def _rates(counts, duration):
+    if not duration:
+        return {}
+    rates = {}
+    for k, v in counts.items():
+        if not v:
+            continue
+        if k.startswith('n_bytes_'):
+            rates['MB_%s_per_s' % k[len('n_bytes_'):]] = v / 1e6 / duration
+        else:
+            rates['%s_per_s' % k[len('n_'):]] = v / duration
+    return rates
+
+
+class Profiler:
+    """Record the stages of conversion and processing run within a ``with`` block.
+
+    Parameters
+    ----------
+    trace_memory : bool
+        Whether to record the peak memory of each stage with ``tracemalloc``.
+        Tracing slows down Python code, so it is off by default.
+    callbacks : list of callable, optional
+        Functions called with the dict of metrics of each stage when it finishes
+    log : bool
+        Whether to log the metrics of each stage as a JSON line
+        to the ``echopype.utils.profiling`` logger at INFO level
+    """
+    def __init__(self, trace_memory=False, callbacks=None, log=False):
+        self.trace_memory = trace_memory
+        self.callbacks = list(callbacks) if callbacks is not None else []
+        if log:
+            self.callbacks.append(log_stage)
+        self.records = []
+        self._stack = []      # records of the running stages
+        self._previous = None
+        self._started_tracing = False
+
+    def __enter__(self):
+        global _profiler
+        self._previous, _profiler = _profiler, self
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        return self
+
+    def __exit__(self, *args):
+        global _profiler
+        _profiler = self._previous
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextlib.contextmanager
+    def stage(self, name, **info):
+        """Record a stage run within the ``with`` block of this context manager.
+
+        Yields
+        ------
+        The ``StageRecord`` of the stage, to add counts to
+        """
+        record = StageRecord(name, depth=len(self._stack), **info)
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            # Keep the peak reached so far by the enclosing stage before resetting it
+            if self._stack:
+                parent = self._stack[-1]
+                parent.peak_memory = max(parent.peak_memory or 0, tracemalloc.get_traced_memory()[1])
+            if hasattr(tracemalloc, 'reset_peak'):   # python>=3.9, otherwise the peak includes earlier stages
+                tracemalloc.reset_peak()
+        self._stack.append(record)
+        record.start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.duration = time.perf_counter() - record.start
+            self._stack.pop()
+            if tracing:
+                record.peak_memory = max(record.peak_memory or 0, tracemalloc.get_traced_memory()[1])
+                if self._stack:
+                    parent = self._stack[-1]
+                    parent.peak_memory = max(parent.peak_memory or 0, record.peak_memory)
+            self.records.append(record)
+            metrics = record.to_dict()
+            for callback in self.callbacks:
+                callback(metrics)
+
+    def summary(self):
+        """Aggregate the metrics of all runs of each stage.
+
+        Returns
+        -------
+        A dict keyed on stage name of the number of runs, total duration, maximum peak memory,
+        total counts and the rates of the total counts
+        """
+        out = {}
+        for record in self.records:
+            s = out.setdefault(record.name, dict(n_runs=0, duration=0., peak_memory=None,
+                                                 **dict.fromkeys(COUNTS, 0)))
+            s['n_runs'] += 1
+            s['duration'] += record.duration
+            if record.peak_memory is not None:
+                s['peak_memory'] = max(s['peak_memory'] or 0, record.peak_memory)
+            for k, v in record.counts.items():
+                s[k] = s.get(k, 0) + v
+        for s in out.values():
+            s.update(_rates({k: s[k] for k in COUNTS}, s['duration']))
+        return out
+
+    def report(self):
+        """Return the metrics of all stages, in the order they finished, and their summary."""
+        return dict(stages=[r.to_dict() for r in self.records], summary=self.summary())
+
+    def to_json(self, path):
+        """Save the ``report`` as a JSON file."""
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2, default=str)
+
+
+def get_profiler():
+    """Return the active ``Profiler``, or None."""
+    return _profiler
+
+
+def stage(name, **info):
+    """Record a stage with the active ``Profiler``.
+
+    Used as ``with stage('parse', file=path) as record: ...``.
+    The stage is not recorded and the yielded record discards counts if no profiler is active.
+    """
+    if _profiler is None:
+        return contextlib.nullcontext(_NULL_RECORD)
+    return _profiler.stage(name, **info)
+
+
+def profiled(name, counts=None):
+    """Decorator recording each call of a method as a stage.
+
+    Parameters
+    ----------
+    name : str
+        name of the stage
+    counts : callable, optional
+        called with the arguments of the method after it returns,
+        returning a dict of counts to add to the stage record
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return func(*args, **kwargs)
+            with _profiler.stage(name) as record:
+                result = func(*args, **kwargs)
+                if counts is not None:
+                    record.add(**counts(*args, **kwargs))
+            return result
+        return wrapper
+    return decorator
+
+
+def get_path_size(path):
+    """Return the size in bytes of a file or of all files in a directory such as a .zarr store."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    size = 0
+    for root, _, files in os.walk(path):
+        size += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return size
+
+
+def log_stage(metrics):
+    """Callback logging the metrics of a stage as a JSON line."""
+    logger.info(json.dumps(metrics, default=str))
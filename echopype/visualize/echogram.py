@@ -5,11 +5,156 @@ from echopype.model import EchoData
 from echopype.convert import Convert
 
 
+def find_gaps(ping_time, max_interval):
+    """Find the gaps between pings further apart than ``max_interval``.
+
+    Parameters
+    ----------
+    ping_time : np.ndarray
+        increasing ping times
+    max_interval : float or np.timedelta64
+        longest interval between pings in seconds that is not a gap
+
+    Returns
+    -------
+    gap_index : np.ndarray
+        index of the ping after each gap
+    gap_interval : np.timedelta64
+        median interval between pings
+    """
+    if not isinstance(max_interval, np.timedelta64):
+        max_interval = np.timedelta64(int(max_interval * 1e9), 'ns')
+    interval = np.diff(ping_time)
+    gap_interval = np.median(interval) if interval.size else None
+    return np.flatnonzero(interval > max_interval) + 1, gap_interval
+
+
+def burst_gaps(ping_offset, n_ping, ping_per_profile, factor=1):
+    """Find the gaps between bursts of ``ping_per_profile`` pings, counted from the first ping of all data.
+
+    Parameters
+    ----------
+    ping_offset : int
+        index of the first ping among all pings, e.g. when plotting a time window
+    n_ping : int
+        number of pings, or of pyramid tiles
+    ping_per_profile : int
+        number of pings in each burst
+    factor : int
+        number of pings in each pyramid tile, which divides ``ping_per_profile``
+
+    Returns
+    -------
+    Index of the ping or tile after each gap
+    """
+    ping_index = ping_offset + np.arange(n_ping) * factor
+    return np.flatnonzero(ping_index[1:] % ping_per_profile == 0) + 1
+
+
+def insert_gaps(data, gap_index, gap_interval):
+    """Insert a ping of NaN before each ping of ``gap_index``, so that gaps are plotted in white.
+
+    All pings are copied at once into a preallocated array at their shifted positions.
+
+    Parameters
+    ----------
+    data : xr.DataArray
+        data with a ping_time dimension
+    gap_index : np.ndarray
+        increasing index of the ping after each gap
+    gap_interval : np.timedelta64
+        time of each inserted ping after the ping before the gap
+
+    Returns
+    -------
+    DataArray with ``len(gap_index)`` more pings
+    """
+    gap_index = np.asarray(gap_index, dtype=int)
+    if not gap_index.size:
+        return data
+    axis = data.get_axis_num('ping_time')
+    ping_time = data.ping_time.values
+    n_ping = ping_time.size
+
+    # Position of each ping and each gap in the output
+    ping_pos = np.arange(n_ping) + np.searchsorted(gap_index, np.arange(n_ping), side='right')
+    gap_pos = gap_index + np.arange(gap_index.size)
+
+    out_time = np.empty(n_ping + gap_index.size, dtype=ping_time.dtype)
+    out_time[ping_pos] = ping_time
+    out_time[gap_pos] = ping_time[gap_index - 1] + gap_interval
+    shape = list(data.shape)
+    shape[axis] = out_time.size
+    var = np.full(shape, np.nan, dtype=np.result_type(data.dtype, np.float32))
+    index = [slice(None)] * data.ndim
+    index[axis] = ping_pos
+    var[tuple(index)] = data.values
+
+    coords = {k: v for k, v in data.coords.items() if 'ping_time' not in v.dims}
+    coords['ping_time'] = out_time
+    return xr.DataArray(var, coords=coords, dims=data.dims, name=data.name, attrs=data.attrs)
+
+
 class EchoGram:
     def __init__(self, _echo_data):
         self.echo_data = _echo_data
 
-    def plot(self, form, frequency=None, plot_ping_number=False, infer_burst=False, col_wrap=2, **kwargs):
+    @staticmethod
+    def _choose_level(factors, n_ping, n_range, figsize=None, dpi=None):
+        """Return the largest pyramid factor leaving at least one cell per pixel of the figure, or 1.
+        """
+        figsize = plt.rcParams['figure.figsize'] if figsize is None else figsize
+        dpi = plt.rcParams['figure.dpi'] if dpi is None else dpi
+        width, height = figsize[0] * dpi, figsize[1] * dpi
+        fits = [f for f in factors if n_ping / f >= width and n_range / f >= height]
+        return max(fits, default=1)
+
+    def _select_window(self, form, data, depth, time_window=None, depth_window=None, level='auto',
+                       aggregation='mean', figsize=None, dpi=None, ping_per_profile=None):
+        """Select the time and depth window of the data, from the pyramid level
+        chosen for the figure size if the echo data have one.
+
+        Only levels whose factor divides ``ping_per_profile`` are used, so that tiles do not straddle bursts.
+
+        Returns
+        -------
+        data, depth, pyramid factor of the data and index of the first ping of the data among all pings
+        """
+        all_ping_time = data.ping_time.values
+        if time_window is not None:
+            data = data.sel(ping_time=slice(*time_window))
+        if depth_window is not None:
+            in_window = ((depth >= depth_window[0]) & (depth <= depth_window[1])).any(dim='frequency')
+            range_bin = depth['range_bin'].values[in_window.values]
+            data = data.sel(range_bin=slice(range_bin.min(), range_bin.max()))
+
+        pyramid = self.echo_data._get_pyramid(form) if hasattr(self.echo_data, '_get_pyramid') else {}
+        if ping_per_profile is not None and ping_per_profile > 1:
+            pyramid = {f: level_ds for f, level_ds in pyramid.items()
+                       if ping_per_profile % f == 0 and f < ping_per_profile}
+        if level == 'auto':
+            level = self._choose_level(pyramid, data.ping_time.size, data.range_bin.size, figsize, dpi)
+        if level in (None, 1):
+            ping_offset = np.searchsorted(all_ping_time, data.ping_time.values[0]) if data.ping_time.size else 0
+            return data, depth.sel(range_bin=data.range_bin), 1, ping_offset
+        if level not in pyramid:
+            raise ValueError(f"No pyramid level with factor {level} fitting the data, compute it with get_pyramid()")
+
+        # Tiles starting within the window
+        var = form if aggregation == 'mean' else form + '_max'
+        level_data = pyramid[level][var]
+        if data.ping_time.size:
+            level_data = level_data.sel(ping_time=slice(data.ping_time.values[0], data.ping_time.values[-1]))
+        if data.range_bin.size:
+            level_data = level_data.sel(range_bin=slice(data.range_bin.values[0], data.range_bin.values[-1]))
+        level_data.name = form
+        ping_offset = np.searchsorted(all_ping_time, level_data.ping_time.values[0]) \
+            if level_data.ping_time.size else 0
+        return level_data, depth.sel(range_bin=level_data.range_bin), level, ping_offset
+
+    def plot(self, form, frequency=None, plot_ping_number=False, infer_burst=False, col_wrap=2,
+             time_window=None, depth_window=None, level='auto', aggregation='mean', max_ping_interval=None,
+             **kwargs):
         """ Plots an echogram
 
         Parameters
@@ -25,11 +170,37 @@ class EchoGram:
         infer burst : bool
             ``True`` will infer intervals between bursts. ``False`` will fill space with white
             default to ``False``
+        time_window : tuple, optional
+            start and end ping_time of Sv or TS to plot
+        depth_window : tuple, optional
+            minimum and maximum depth of Sv or TS to plot
+        level : 'auto', int or None
+            pyramid factor of the Sv or TS to plot, see ``get_pyramid``. ``auto`` picks the coarsest level
+            leaving at least one cell per pixel of the figure and ``None`` plots the full resolution.
+            default to ``auto``
+        aggregation : str
+            ``mean`` or ``max`` values of the pyramid tiles to plot, default to ``mean``
+        max_ping_interval : float, optional
+            fill with white the intervals longer than this number of seconds between pings of Sv or TS,
+            instead of the intervals between AZFP bursts
         **kwargs optional
             additional keyword arguments to matplotlib
         """
         data = getattr(self.echo_data, form)
         depth = self.echo_data.calc_range()
+        if form != 'MVBS':
+            if isinstance(data, xr.Dataset):
+                data = data[form]
+            # Intervals between bursts are filled with white when plotting by ping time
+            ping_per_profile = None
+            if not infer_burst and not plot_ping_number and max_ping_interval is None:
+                with xr.open_dataset(self.echo_data.file_path, group='Vendor') as ds_vend:
+                    ping_per_profile = int(ds_vend.ping_per_profile)  # 60 (pings) for test dataset
+                    ping_period = ds_vend.ping_period  # 3 (seconds) for test dataset
+                    # burst_int = ds_vend.burst_interval  # 900 (seconds) for test dataset
+            data, depth, factor, ping_offset = self._select_window(form, data, depth, time_window, depth_window,
+                                                                   level, aggregation, kwargs.get('figsize'),
+                                                                   ping_per_profile=ping_per_profile)
 
         # Plot MVBS
         if form == 'MVBS':
@@ -88,51 +259,32 @@ class EchoGram:
         # Plot ping time on x axis
         else:
             # Fill interval between bursts with white
-            if not infer_burst:
+            if not infer_burst or max_ping_interval is not None:
                 if plot_ping_number:
                     raise ValueError("Plotting with ping number cannot be done unless infer_burst = True")
 
-                with xr.open_dataset(self.echo_data.file_path, group='Vendor') as ds_vend:
-                    ping_per_profile = ds_vend.ping_per_profile  # 60 (pings) for test dataset
-                    ping_period = ds_vend.ping_period  # 3 (seconds) for test dataset
-                    # burst_int = ds_vend.burst_interval  # 900 (seconds) for test dataset
+                if max_ping_interval is not None:
+                    # Gaps where pings are further apart than max_ping_interval, or their tiles in a pyramid level
+                    gap_index, gap_interval = find_gaps(data.ping_time.values, max_ping_interval * factor)
+                elif ping_per_profile != 1:
+                    # Gaps follow every ping_per_profile pings of all data, or their tiles in a pyramid level
+                    gap_index = burst_gaps(ping_offset, data.sizes['ping_time'], ping_per_profile, factor)
+                    gap_interval = np.timedelta64(int(float(ping_period) * factor * 1e9), 'ns')
+                else:
+                    # Data is not collected in bursts
+                    gap_index, gap_interval = np.zeros(0, dtype=int), None
+                to_plot = insert_gaps(data, gap_index, gap_interval)
 
-                if ping_per_profile != 1:
-                    total_pings = len(data.ping_time)
-                    pt = data.ping_time.values
-                    var = data.values
-                    ping = ping_per_profile
-                    count = 0
-
-                    while ping < total_pings:
-                        pt = np.insert(pt, ping + count, pt[ping - 1 + count] + np.timedelta64(ping_period, 's'))
-                        # If only 1 frequency, insert on the 0 axis. If multiple frequencies, insert on 1 axis
-                        if data.ndim == 2:
-                            var = np.insert(var, ping + count, np.nan, axis=0)
-                        else:
-                            var = np.insert(var, ping + count, np.nan, axis=1)
-                        ping += ping_per_profile
-                        count += 1
-
-                    # If only 1 frequency, frequency is not a dimension (ndim = 2)
-                    if data.ndim == 2:
-                        to_plot = xr.DataArray(var, coords={'ping_time': pt, 'depth': data.depth},
-                                               dims=['ping_time', 'depth'])
-                        to_plot.plot(infer_intervals=False, x='ping_time', y='depth', **kwargs)
-                        plt.ylabel('Depth (m)')
-                        plt.xlabel('Ping time')
-                        return
-                    else:
-                        to_plot = xr.DataArray(var, coords={'frequency': data.frequency, 'ping_time': pt,
-                                                            'range_bin': data.range_bin, 'depth': data.depth},
-                                               dims=['frequency', 'ping_time', 'range_bin'])
-                        to_plot.plot(col='frequency', col_wrap=col_wrap, infer_intervals=False,
-                                     x='ping_time', y='depth',
-                                     **kwargs).set_xlabels('Ping time').set_ylabels('Depth (m)')
-                        return
-
-                # Data is not collected in bursts
+                # If only 1 frequency, frequency is not a dimension (ndim = 2)
+                if to_plot.ndim == 2:
+                    to_plot.plot(infer_intervals=False, x='ping_time', y='depth', **kwargs)
+                    plt.ylabel('Depth (m)')
+                    plt.xlabel('Ping time')
+                    return
                 else:
+                    to_plot.plot(col='frequency', col_wrap=col_wrap, infer_intervals=False,
+                                 x='ping_time', y='depth',
+                                 **kwargs).set_xlabels('Ping time').set_ylabels('Depth (m)')
                     return
             # Default interpolation for intervals between bursts
             else:
@@ -33,7 +33,7 @@ opts = dict(name='echopype',
             platforms='OS Independent',
             version=versioneer.get_version(),
             cmdclass=versioneer.get_cmdclass(),
-            packages=find_packages(),
+            packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
             package_dir={'': '.'},
             package_data={'echopype': [pjoin('data', '*')]},
             install_requires=INSTALL_REQUIRES,